@@ -7,8 +7,33 @@ class Settings(BaseSettings):
     icv6_host: str = "10.0.2.116"
     icv6_port: int = 80
     icv6_device_id: str = "R5S2A000188"
+    icv6_persistent_session: bool = True
+    icv6_idle_timeout_seconds: float = 30.0
+    icv6_timeout_seconds: float = 2.0
+    icv6_min_timeout_seconds: float = 0.5
+    icv6_breaker_failure_threshold: int = 3
+    icv6_breaker_reset_seconds: float = 10.0
+    icv6_frame_log_path: str = ""
+    icv6_frame_log_max_bytes: int = 10_000_000
+    icv6_frame_log_backups: int = 5
     database_path: str = "./portal.db"
     validation_interval_seconds: int = 60
+    validation_retention_days: int = 90
+    validation_retention_max_rows: int = 100_000
+    validation_downsample_after_hours: int = 24
+    validation_sample_interval_minutes: int = 60
+    validation_compaction_interval_seconds: int = 3600
+    validation_fast_interval_seconds: float = 30.0
+    validation_max_interval_minutes: int = 60
+    validation_auto_heal_enabled: bool = False
+    validation_heal_interval_seconds: float = 300.0
+    validation_heal_max_attempts: int = 3
+    state_cache_ttl_seconds: float = 5.0
+    state_stream_interval_seconds: float = 5.0
+    preview_max_rate_hz: float = 10.0
+    fleet_concurrency: int = 4
+    request_trace_log: bool = False
+    program_sync_enabled: bool = False
 
 
 settings = Settings()
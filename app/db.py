@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
-from datetime import UTC, datetime
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
 from typing import Any
 
 import aiosqlite
 
 from app.config import settings
+from app.metrics import timed_db
 
 MIGRATIONS: list[tuple[int, str]] = [
     (
@@ -41,11 +46,139 @@ MIGRATIONS: list[tuple[int, str]] = [
         );
         """,
     ),
+    (
+        2,
+        """
+        CREATE TABLE IF NOT EXISTS devices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            host TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            device_id TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (host, port, device_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS device_targets (
+            device_pk INTEGER PRIMARY KEY REFERENCES devices(id) ON DELETE CASCADE,
+            mode TEXT NOT NULL,
+            intensity_json TEXT,
+            program_json TEXT,
+            updated_at TEXT NOT NULL
+        );
+        """,
+    ),
+    (
+        3,
+        """
+        CREATE TABLE IF NOT EXISTS validation_payloads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            digest TEXT NOT NULL UNIQUE,
+            details_json TEXT NOT NULL
+        );
+
+        -- Rows written from here on reference a shared payload; the inline
+        -- details_json column only holds data for rows written before this migration.
+        ALTER TABLE validation_runs
+            ADD COLUMN payload_id INTEGER REFERENCES validation_payloads(id);
+
+        CREATE INDEX IF NOT EXISTS idx_validation_runs_checked_at
+            ON validation_runs (checked_at);
+        CREATE INDEX IF NOT EXISTS idx_validation_runs_status_checked_at
+            ON validation_runs (status, checked_at);
+        CREATE INDEX IF NOT EXISTS idx_validation_runs_payload_id
+            ON validation_runs (payload_id);
+        """,
+    ),
+    (
+        4,
+        """
+        -- Keyset pagination: newest-first pages, optionally filtered by status.
+        CREATE INDEX IF NOT EXISTS idx_validation_runs_status_id
+            ON validation_runs (status, id);
+        """,
+    ),
 ]
 
 
-def _connect() -> aiosqlite.Connection:
-    return aiosqlite.connect(settings.database_path)
+class _Connections:
+    """Long-lived connections shared by every query in the process.
+
+    One writer connection behind a lock serializes write transactions; a separate reader
+    connection serves SELECTs, which in WAL mode never wait on the writer. Each
+    connection keeps its own prepared-statement cache across calls.
+    """
+
+    def __init__(self) -> None:
+        self.path: str | None = None
+        self.writer: aiosqlite.Connection | None = None
+        self.reader: aiosqlite.Connection | None = None
+        self.write_lock = asyncio.Lock()
+        self.open_lock = asyncio.Lock()
+
+
+_pool = _Connections()
+
+
+async def _open_connection(path: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path, cached_statements=256)
+    conn.row_factory = aiosqlite.Row
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute("PRAGMA foreign_keys=ON")
+    await conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+async def open_db() -> None:
+    """Open the shared connections for ``settings.database_path`` if not already open."""
+    async with _pool.open_lock:
+        path = settings.database_path
+        if _pool.path == path and _pool.writer is not None:
+            return
+        await _close_connections()
+        _pool.writer = await _open_connection(path)
+        _pool.reader = await _open_connection(path)
+        _pool.path = path
+        _pool.write_lock = asyncio.Lock()
+
+
+async def close_db() -> None:
+    async with _pool.open_lock:
+        await _close_connections()
+
+
+async def _close_connections() -> None:
+    for conn in (_pool.writer, _pool.reader):
+        if conn is not None:
+            await conn.close()
+    _pool.writer = None
+    _pool.reader = None
+    _pool.path = None
+
+
+@asynccontextmanager
+async def _writing() -> AsyncIterator[aiosqlite.Connection]:
+    """Run one write transaction on the shared writer, committing on success."""
+    await open_db()
+    conn = _pool.writer
+    if conn is None:
+        raise RuntimeError("database connection closed")
+    async with _pool.write_lock:
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
+
+
+@asynccontextmanager
+async def _reading() -> AsyncIterator[aiosqlite.Connection]:
+    await open_db()
+    if _pool.reader is None:
+        raise RuntimeError("database connection closed")
+    yield _pool.reader
 
 
 async def _ensure_migration_table(conn: aiosqlite.Connection) -> None:
@@ -58,14 +191,14 @@ async def _ensure_migration_table(conn: aiosqlite.Connection) -> None:
 
 
 async def _applied_versions(conn: aiosqlite.Connection) -> set[int]:
-    conn.row_factory = aiosqlite.Row
     cur = await conn.execute("SELECT version FROM schema_migrations")
     rows = await cur.fetchall()
     return {int(row["version"]) for row in rows}
 
 
+@timed_db
 async def init_db() -> None:
-    async with _connect() as conn:
+    async with _writing() as conn:
         await _ensure_migration_table(conn)
         applied = await _applied_versions(conn)
         for version, sql in MIGRATIONS:
@@ -76,36 +209,54 @@ async def init_db() -> None:
                 "INSERT INTO schema_migrations (version, applied_at) VALUES (?, ?)",
                 (version, datetime.now(UTC).isoformat()),
             )
-        await conn.commit()
 
 
-async def upsert_active_target(mode: str, intensity: dict | None, program: dict | None) -> None:
+@timed_db
+async def upsert_active_target(
+    mode: str, intensity: dict | None, program: dict | None, device: int | None = None
+) -> None:
+    """Persist the active target of the configured device, or of registry ``device``."""
     now = datetime.now(UTC).isoformat()
-    async with _connect() as conn:
-        await conn.execute(
-            """
+    if device is None:
+        sql = """
             INSERT INTO active_target (id, mode, intensity_json, program_json, updated_at)
-            VALUES (1, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(id) DO UPDATE SET
               mode=excluded.mode,
               intensity_json=excluded.intensity_json,
               program_json=excluded.program_json,
               updated_at=excluded.updated_at
-            """,
+            """
+    else:
+        sql = """
+            INSERT INTO device_targets (device_pk, mode, intensity_json, program_json, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(device_pk) DO UPDATE SET
+              mode=excluded.mode,
+              intensity_json=excluded.intensity_json,
+              program_json=excluded.program_json,
+              updated_at=excluded.updated_at
+            """
+    async with _writing() as conn:
+        await conn.execute(
+            sql,
             (
+                1 if device is None else device,
                 mode,
                 json.dumps(intensity) if intensity is not None else None,
                 json.dumps(program) if program is not None else None,
                 now,
             ),
         )
-        await conn.commit()
 
 
-async def get_active_target() -> dict[str, Any] | None:
-    async with _connect() as conn:
-        conn.row_factory = aiosqlite.Row
-        cur = await conn.execute("SELECT * FROM active_target WHERE id = 1")
+@timed_db
+async def get_active_target(device: int | None = None) -> dict[str, Any] | None:
+    async with _reading() as conn:
+        if device is None:
+            cur = await conn.execute("SELECT * FROM active_target WHERE id = 1")
+        else:
+            cur = await conn.execute("SELECT * FROM device_targets WHERE device_pk = ?", (device,))
         row = await cur.fetchone()
         if not row:
             return None
@@ -117,22 +268,22 @@ async def get_active_target() -> dict[str, Any] | None:
         }
 
 
+@timed_db
 async def create_preset(name: str, mode: str, payload: dict[str, Any]) -> int:
     now = datetime.now(UTC).isoformat()
-    async with _connect() as conn:
+    async with _writing() as conn:
         cur = await conn.execute(
             "INSERT INTO presets (name, mode, payload_json, created_at) VALUES (?, ?, ?, ?)",
             (name, mode, json.dumps(payload), now),
         )
-        await conn.commit()
         if cur.lastrowid is None:
             raise RuntimeError("failed to persist preset")
         return int(cur.lastrowid)
 
 
+@timed_db
 async def list_presets() -> list[dict[str, Any]]:
-    async with _connect() as conn:
-        conn.row_factory = aiosqlite.Row
+    async with _reading() as conn:
         cur = await conn.execute("SELECT * FROM presets ORDER BY id DESC")
         rows = await cur.fetchall()
         out = []
@@ -151,9 +302,9 @@ async def list_presets() -> list[dict[str, Any]]:
         return out
 
 
+@timed_db
 async def get_preset(preset_id: int) -> dict[str, Any] | None:
-    async with _connect() as conn:
-        conn.row_factory = aiosqlite.Row
+    async with _reading() as conn:
         cur = await conn.execute("SELECT * FROM presets WHERE id = ?", (preset_id,))
         row = await cur.fetchone()
         if not row:
@@ -169,34 +320,97 @@ async def get_preset(preset_id: int) -> dict[str, Any] | None:
         }
 
 
+@timed_db
 async def rename_preset(preset_id: int, new_name: str) -> bool:
-    async with _connect() as conn:
+    async with _writing() as conn:
         cur = await conn.execute("UPDATE presets SET name = ? WHERE id = ?", (new_name, preset_id))
-        await conn.commit()
         return cur.rowcount > 0
 
 
+@timed_db
 async def delete_preset(preset_id: int) -> bool:
-    async with _connect() as conn:
+    async with _writing() as conn:
         cur = await conn.execute("DELETE FROM presets WHERE id = ?", (preset_id,))
-        await conn.commit()
         return cur.rowcount > 0
 
 
+def _device_row(row: aiosqlite.Row) -> dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "host": row["host"],
+        "port": row["port"],
+        "device_id": row["device_id"],
+        "created_at": row["created_at"],
+    }
+
+
+@timed_db
+async def create_device(name: str, host: str, port: int, device_id: str) -> dict[str, Any]:
+    now = datetime.now(UTC).isoformat()
+    async with _writing() as conn:
+        cur = await conn.execute(
+            "INSERT INTO devices (name, host, port, device_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            (name, host, port, device_id, now),
+        )
+        if cur.lastrowid is None:
+            raise RuntimeError("failed to persist device")
+        return {
+            "id": int(cur.lastrowid),
+            "name": name,
+            "host": host,
+            "port": port,
+            "device_id": device_id,
+            "created_at": now,
+        }
+
+
+@timed_db
+async def list_devices() -> list[dict[str, Any]]:
+    async with _reading() as conn:
+        cur = await conn.execute("SELECT * FROM devices ORDER BY id")
+        rows = await cur.fetchall()
+        return [_device_row(row) for row in rows]
+
+
+@timed_db
+async def delete_device(device_pk: int) -> bool:
+    async with _writing() as conn:
+        cur = await conn.execute("DELETE FROM devices WHERE id = ?", (device_pk,))
+        return cur.rowcount > 0
+
+
+@timed_db
 async def insert_validation_run(status: str, details: dict[str, Any]) -> None:
     now = datetime.now(UTC).isoformat()
-    async with _connect() as conn:
+    details_json = json.dumps(details, sort_keys=True)
+    digest = hashlib.sha256(details_json.encode()).hexdigest()
+    async with _writing() as conn:
+        # Identical payloads (e.g. the same program reported ok every poll) are stored once.
         await conn.execute(
-            "INSERT INTO validation_runs (checked_at, status, details_json) VALUES (?, ?, ?)",
-            (now, status, json.dumps(details)),
+            "INSERT OR IGNORE INTO validation_payloads (digest, details_json) VALUES (?, ?)",
+            (digest, details_json),
         )
-        await conn.commit()
+        await conn.execute(
+            """
+            INSERT INTO validation_runs (checked_at, status, details_json, payload_id)
+            SELECT ?, ?, '', id FROM validation_payloads WHERE digest = ?
+            """,
+            (now, status, digest),
+        )
+
+
+_VALIDATION_RUN_COLUMNS = """
+    r.id, r.checked_at, r.status, COALESCE(p.details_json, r.details_json) AS details_json
+    FROM validation_runs r
+    LEFT JOIN validation_payloads p ON p.id = r.payload_id
+"""
 
 
+@timed_db
 async def latest_validation_run() -> dict[str, Any] | None:
-    async with _connect() as conn:
-        conn.row_factory = aiosqlite.Row
-        cur = await conn.execute("SELECT * FROM validation_runs ORDER BY id DESC LIMIT 1")
+    async with _reading() as conn:
+        cur = await conn.execute(f"SELECT {_VALIDATION_RUN_COLUMNS} ORDER BY r.id DESC LIMIT 1")
         row = await cur.fetchone()
         if not row:
             return None
@@ -208,30 +422,169 @@ async def latest_validation_run() -> dict[str, Any] | None:
         }
 
 
+@timed_db
+async def list_validation_runs(
+    limit: int,
+    before_id: int | None = None,
+    statuses: list[str] | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    include_details: bool = True,
+) -> list[dict[str, Any]]:
+    """Newest-first page of validation runs with ``id < before_id``.
+
+    Without ``include_details`` the payload table is not touched at all.
+    """
+    clauses: list[str] = []
+    params: list[Any] = []
+    if before_id is not None:
+        clauses.append("r.id < ?")
+        params.append(before_id)
+    if statuses:
+        clauses.append(f"r.status IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if since is not None:
+        clauses.append("r.checked_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("r.checked_at < ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    columns = (
+        _VALIDATION_RUN_COLUMNS
+        if include_details
+        else "r.id, r.checked_at, r.status FROM validation_runs r"
+    )
+    params.append(limit)
+
+    async with _reading() as conn:
+        cur = await conn.execute(f"SELECT {columns} {where} ORDER BY r.id DESC LIMIT ?", params)
+        rows = await cur.fetchall()
+        return [
+            {
+                "id": row["id"],
+                "checked_at": row["checked_at"],
+                "status": row["status"],
+                "details": json.loads(row["details_json"]) if include_details else None,
+            }
+            for row in rows
+        ]
+
+
+@timed_db
+async def compact_validation_runs(
+    max_age_days: int | None = None,
+    max_rows: int | None = None,
+    downsample_after_hours: int | None = None,
+    sample_interval_minutes: int | None = None,
+) -> dict[str, int]:
+    """Apply the validation history retention policy; returns rows removed per step.
+
+    Rows older than ``max_age_days`` are dropped. Past ``downsample_after_hours`` only
+    status transitions and the first run of every ``sample_interval_minutes`` bucket are
+    kept. The newest ``max_rows`` rows survive the row cap, and payloads no longer
+    referenced are garbage collected.
+    """
+    max_age_days = settings.validation_retention_days if max_age_days is None else max_age_days
+    max_rows = settings.validation_retention_max_rows if max_rows is None else max_rows
+    if downsample_after_hours is None:
+        downsample_after_hours = settings.validation_downsample_after_hours
+    if sample_interval_minutes is None:
+        sample_interval_minutes = settings.validation_sample_interval_minutes
+
+    now = datetime.now(UTC)
+    expire_before = (now - timedelta(days=max_age_days)).isoformat()
+    downsample_before = (now - timedelta(hours=downsample_after_hours)).isoformat()
+    removed: dict[str, int] = {}
+    async with _writing() as conn:
+        cur = await conn.execute(
+            "DELETE FROM validation_runs WHERE checked_at < ?", (expire_before,)
+        )
+        removed["expired"] = cur.rowcount
+
+        cur = await conn.execute(
+            """
+            DELETE FROM validation_runs WHERE id IN (
+                SELECT id FROM (
+                    SELECT
+                        id,
+                        status,
+                        LAG(status) OVER (ORDER BY id) AS prev_status,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY CAST(strftime('%s', checked_at) AS INTEGER) / ?
+                            ORDER BY id
+                        ) AS bucket_rank
+                    FROM validation_runs
+                    WHERE checked_at < ?
+                )
+                WHERE status = prev_status AND bucket_rank > 1
+            )
+            """,
+            (max(1, sample_interval_minutes) * 60, downsample_before),
+        )
+        removed["downsampled"] = cur.rowcount
+
+        cur = await conn.execute(
+            """
+            DELETE FROM validation_runs WHERE id <= (
+                SELECT id FROM validation_runs ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+            """,
+            (max(0, max_rows),),
+        )
+        removed["trimmed"] = cur.rowcount
+
+        cur = await conn.execute("""
+            DELETE FROM validation_payloads WHERE NOT EXISTS (
+                SELECT 1 FROM validation_runs r WHERE r.payload_id = validation_payloads.id
+            )
+            """)
+        removed["payloads"] = cur.rowcount
+    return removed
+
+
+@timed_db
 async def set_setting(key: str, value: str) -> None:
-    async with _connect() as conn:
-        await conn.execute(
+    await set_settings({key: value})
+
+
+@timed_db
+async def set_settings(values: dict[str, str]) -> None:
+    async with _writing() as conn:
+        await conn.executemany(
             """
             INSERT INTO app_settings (key, value)
             VALUES (?, ?)
             ON CONFLICT(key) DO UPDATE SET value=excluded.value
             """,
-            (key, value),
+            list(values.items()),
         )
-        await conn.commit()
 
 
+@timed_db
 async def get_setting(key: str) -> str | None:
-    async with _connect() as conn:
-        conn.row_factory = aiosqlite.Row
+    async with _reading() as conn:
         cur = await conn.execute("SELECT value FROM app_settings WHERE key = ?", (key,))
         row = await cur.fetchone()
         return row["value"] if row else None
 
 
+@timed_db
+async def get_settings(*keys: str) -> dict[str, str]:
+    placeholders = ", ".join("?" for _ in keys)
+    async with _reading() as conn:
+        cur = await conn.execute(
+            f"SELECT key, value FROM app_settings WHERE key IN ({placeholders})", keys
+        )
+        rows = await cur.fetchall()
+        return {row["key"]: row["value"] for row in rows}
+
+
+@timed_db
 async def get_validation_polling_config() -> dict[str, Any]:
-    raw_enabled = await get_setting("validation_polling_enabled")
-    raw_interval_seconds = await get_setting("validation_polling_interval_seconds")
+    raw = await get_settings("validation_polling_enabled", "validation_polling_interval_seconds")
+    raw_enabled = raw.get("validation_polling_enabled")
+    raw_interval_seconds = raw.get("validation_polling_interval_seconds")
     enabled = True if raw_enabled is None else raw_enabled == "1"
     try:
         interval_seconds = (
@@ -247,10 +600,15 @@ async def get_validation_polling_config() -> dict[str, Any]:
     }
 
 
+@timed_db
 async def set_validation_polling_config(enabled: bool, interval_minutes: int) -> dict[str, Any]:
     minutes = max(1, int(interval_minutes))
-    await set_setting("validation_polling_enabled", "1" if enabled else "0")
-    await set_setting("validation_polling_interval_seconds", str(minutes * 60))
+    await set_settings(
+        {
+            "validation_polling_enabled": "1" if enabled else "0",
+            "validation_polling_interval_seconds": str(minutes * 60),
+        }
+    )
     return {
         "enabled": bool(enabled),
         "interval_minutes": minutes,
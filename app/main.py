@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import json
 import logging
+import time
+from collections.abc import Awaitable, Callable
 from contextlib import asynccontextmanager
-from typing import Literal, cast
+from datetime import datetime
+from typing import Annotated, Literal, cast
 
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -13,8 +17,17 @@ from app import db
 from app.config import settings
 from app.errors import AppError
 from app.logging_config import configure_logging
+from app.metrics import registry as metrics_registry
+from app.metrics import stats_samples
 from app.models import (
+    BatchRequest,
+    BatchResponse,
+    BreakerStatus,
+    DeviceCreateRequest,
+    DeviceRecord,
     DeviceState,
+    FleetResponse,
+    FleetResult,
     GenericOkResponse,
     HealthzResponse,
     Intensity,
@@ -28,46 +41,171 @@ from app.models import (
     PresetRecord,
     PresetRenameRequest,
     Program,
+    ProgramAnalytics,
+    ProgramCurveResponse,
     ProgramSetRequest,
     ProgramSetResponse,
     ValidationPollingConfig,
     ValidationPollingConfigRequest,
+    ValidationRunPage,
     ValidationRunRecord,
     ValidationRunResult,
 )
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.device_registry import DeviceRegistry
 from app.services.device_service import DeviceService
-from app.services.icv6_client import ICV6Client
+from app.services.frame_log import FrameLog
+from app.services.icv6_client import ICV6Client, ICV6SessionPool
 from app.services.preset_service import PresetService
+from app.services.preview_stream import PreviewStreamer
+from app.services.program_curve import program_digest, sample_day
+from app.services.state_stream import StateBroadcaster
 from app.services.validation_service import ValidationService
 from app.services.validator import ProgramValidator
+from app.tracing import TracedRoute, end_trace, server_timing, start_trace
 
 configure_logging()
 logger = logging.getLogger(__name__)
 
-client = ICV6Client(settings.icv6_host, settings.icv6_port, settings.icv6_device_id)
-validator = ProgramValidator(client)
-device_service = DeviceService(client)
+# One log for every device, so the replay sees requests in the order they were sent.
+frame_log = (
+    FrameLog(
+        settings.icv6_frame_log_path,
+        max_bytes=settings.icv6_frame_log_max_bytes,
+        backups=settings.icv6_frame_log_backups,
+    )
+    if settings.icv6_frame_log_path
+    else None
+)
+
+session_pool = ICV6SessionPool(
+    timeout=settings.icv6_timeout_seconds,
+    idle_timeout=settings.icv6_idle_timeout_seconds,
+    frame_log=frame_log,
+)
+
+
+def _build_client(host: str, port: int, device_id: str) -> ICV6Client:
+    # Devices behind the same ICV6 share one pipelined TCP session.
+    session = session_pool.get(host, port) if settings.icv6_persistent_session else None
+    breaker = CircuitBreaker(
+        device_id,
+        failure_threshold=settings.icv6_breaker_failure_threshold,
+        reset_timeout=settings.icv6_breaker_reset_seconds,
+        min_timeout=settings.icv6_min_timeout_seconds,
+        max_timeout=settings.icv6_timeout_seconds,
+    )
+    return ICV6Client(
+        host,
+        port,
+        device_id,
+        timeout=settings.icv6_timeout_seconds,
+        session=session,
+        breaker=breaker,
+        frame_log=frame_log,
+    )
+
+
+client = _build_client(settings.icv6_host, settings.icv6_port, settings.icv6_device_id)
+device_service = DeviceService(
+    client,
+    state_ttl=settings.state_cache_ttl_seconds,
+    sync_programs=settings.program_sync_enabled,
+)
+validator = ProgramValidator(
+    client,
+    device_service,
+    compaction_interval=settings.validation_compaction_interval_seconds,
+    fast_interval=settings.validation_fast_interval_seconds,
+    max_interval=settings.validation_max_interval_minutes * 60,
+    auto_heal=settings.validation_auto_heal_enabled,
+    heal_interval=settings.validation_heal_interval_seconds,
+    heal_max_attempts=settings.validation_heal_max_attempts,
+)
 preset_service = PresetService()
 validation_service = ValidationService(validator)
+broadcaster = StateBroadcaster(device_service, interval=settings.state_stream_interval_seconds)
+device_service.add_write_listener(broadcaster.poke)
+device_service.add_write_listener(validator.notify_write)
+preview_streamer = PreviewStreamer(client, max_rate=settings.preview_max_rate_hz)
+
+
+def _build_device_service(record: dict) -> DeviceService:
+    device_client = _build_client(record["host"], record["port"], record["device_id"])
+    return DeviceService(
+        device_client,
+        state_ttl=settings.state_cache_ttl_seconds,
+        device=record["id"],
+        sync_programs=settings.program_sync_enabled,
+    )
+
+
+registry = DeviceRegistry(
+    device_service, _build_device_service, concurrency=settings.fleet_concurrency
+)
+# Devices sharing a session share its decoder stats; count each stats object once.
+metrics_registry.add_collector(
+    lambda: stats_samples(
+        {id(s.client.stats): s.client.stats for _, s in registry.services()}.values()
+    )
+)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    await db.open_db()
     await db.init_db()
+    await registry.load()
     validator.start()
     logger.info("application started")
     try:
         yield
     finally:
+        await broadcaster.stop()
+        await preview_streamer.stop()
         await validator.stop()
+        await registry.close()
+        await session_pool.close()
+        if frame_log is not None:
+            frame_log.close()
+        await db.close_db()
         logger.info("application stopped")
 
 
 app = FastAPI(title="ICV6 Portal", lifespan=lifespan)
+app.router.route_class = TracedRoute
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 
+@app.middleware("http")
+async def trace_requests(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    trace, token = start_trace()
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace(token)
+    breakdown = trace.breakdown(time.perf_counter())
+    response.headers["Server-Timing"] = server_timing(breakdown)
+    if settings.request_trace_log:
+        logger.info(
+            "request trace %s",
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": response.status_code,
+                    "device_calls": trace.device_calls,
+                    "db_calls": trace.db_calls,
+                    **{f"{name}_ms": ms for name, ms in breakdown.items()},
+                }
+            ),
+        )
+    return response
+
+
 @app.exception_handler(AppError)
 async def handle_app_error(_: Request, exc: AppError) -> JSONResponse:
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.message})
@@ -105,7 +243,7 @@ async def healthz() -> HealthzResponse:
         result["db"] = f"error:{exc}"
 
     try:
-        await client.query_mode()
+        await device_service.get_state()
     except Exception as exc:  # noqa: BLE001
         result["status"] = "degraded"
         result["icv6"] = f"error:{exc}"
@@ -114,12 +252,29 @@ async def healthz() -> HealthzResponse:
         status=cast(Literal["ok", "degraded"], result["status"]),
         db=result["db"],
         icv6=result["icv6"],
+        breakers={name: BreakerStatus(**b) for name, b in registry.breakers().items()},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
     )
 
 
 @app.get("/api/state", response_model=DeviceState)
-async def get_state() -> DeviceState:
-    return await device_service.get_state()
+async def get_state(max_age: float | None = Query(default=None, ge=0)) -> DeviceState:
+    return await device_service.get_state(max_age=max_age)
+
+
+@app.get("/api/events")
+async def stream_events() -> StreamingResponse:
+    return StreamingResponse(
+        broadcaster.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/mode", response_model=ModeSetResponse)
@@ -135,16 +290,49 @@ async def set_manual_intensity(payload: IntensitySetRequest) -> GenericOkRespons
     return GenericOkResponse(status="ok")
 
 
+@app.post("/api/preview", response_model=GenericOkResponse)
+async def preview_intensity(payload: IntensitySetRequest) -> GenericOkResponse:
+    preview_streamer.submit(Intensity(**payload.model_dump()))
+    return GenericOkResponse(status="ok")
+
+
 @app.post("/api/program", response_model=ProgramSetResponse)
-async def set_program(payload: ProgramSetRequest) -> ProgramSetResponse:
+async def set_program(payload: ProgramSetRequest, sync: bool | None = None) -> ProgramSetResponse:
+    program = Program(**payload.model_dump())
+    ack = await device_service.set_program(program, sync=sync)
+    return ProgramSetResponse(status="ok", ack=ack, skipped=ack is None)
+
+
+@app.post("/api/batch", response_model=BatchResponse)
+async def apply_batch(payload: BatchRequest) -> BatchResponse:
+    state = await device_service.apply_batch(payload.mode, payload.intensity, payload.program)
+    return BatchResponse(status="ok", state=state)
+
+
+@app.post("/api/program/curve", response_model=ProgramCurveResponse)
+async def get_program_curve(
+    payload: ProgramSetRequest,
+    resolution_minutes: float = Query(default=15.0, gt=0, le=1440),
+) -> ProgramCurveResponse:
     program = Program(**payload.model_dump())
-    ack = await device_service.set_program(program)
-    return ProgramSetResponse(status="ok", ack=ack)
+    curve = sample_day(program, resolution_minutes)
+    return ProgramCurveResponse(
+        digest=program_digest(program),
+        resolution_minutes=curve.resolution_minutes,
+        minutes=list(curve.minutes),
+        **{ch: list(values) for ch, values in curve.values.items()},
+    )
+
+
+@app.get("/api/analytics/active", response_model=ProgramAnalytics | None)
+async def get_active_target_analytics() -> ProgramAnalytics | None:
+    analytics = await device_service.active_target_analytics()
+    return ProgramAnalytics(**analytics) if analytics else None
 
 
 @app.get("/api/presets", response_model=list[PresetRecord])
-async def list_presets() -> list[PresetRecord]:
-    presets = await preset_service.list_presets()
+async def list_presets(include_analytics: bool = False) -> list[PresetRecord]:
+    presets = await preset_service.list_presets(include_analytics=include_analytics)
     return [PresetRecord(**p) for p in presets]
 
 
@@ -174,7 +362,9 @@ async def delete_preset(preset_id: int) -> PresetDeleteResponse:
 
 @app.post("/api/validation/run", response_model=ValidationRunResult)
 async def run_validation_now() -> ValidationRunResult:
-    return ValidationRunResult(**(await validation_service.run_now()))
+    result = ValidationRunResult(**(await validation_service.run_now()))
+    broadcaster.poke()
+    return result
 
 
 @app.get("/api/validation/latest", response_model=ValidationRunRecord | None)
@@ -183,6 +373,26 @@ async def get_latest_validation() -> ValidationRunRecord | None:
     return ValidationRunRecord(**latest) if latest else None
 
 
+@app.get("/api/validation/runs", response_model=ValidationRunPage)
+async def list_validation_runs(
+    limit: int = Query(default=100, ge=1, le=1000),
+    before_id: int | None = Query(default=None, ge=1),
+    status: Annotated[list[str] | None, Query()] = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    include_details: bool = True,
+) -> ValidationRunPage:
+    page = await validation_service.list_runs(
+        limit,
+        before_id=before_id,
+        statuses=status,
+        since=since,
+        until=until,
+        include_details=include_details,
+    )
+    return ValidationRunPage(**page)
+
+
 @app.get("/api/validation/polling", response_model=ValidationPollingConfig)
 async def get_validation_polling_config() -> ValidationPollingConfig:
     return ValidationPollingConfig(**(await validation_service.get_polling_config()))
@@ -193,3 +403,78 @@ async def set_validation_polling_config(
     payload: ValidationPollingConfigRequest,
 ) -> ValidationPollingConfig:
     return ValidationPollingConfig(**(await validation_service.set_polling_config(payload)))
+
+
+@app.get("/api/devices", response_model=list[DeviceRecord])
+async def list_devices() -> list[DeviceRecord]:
+    return [DeviceRecord(**d) for d in registry.list_devices()]
+
+
+@app.post("/api/devices", response_model=DeviceRecord)
+async def create_device(payload: DeviceCreateRequest) -> DeviceRecord:
+    return DeviceRecord(**(await registry.add(payload)))
+
+
+@app.delete("/api/devices/{device_pk}", response_model=GenericOkResponse)
+async def delete_device(device_pk: int) -> GenericOkResponse:
+    await registry.remove(device_pk)
+    return GenericOkResponse(status="ok")
+
+
+@app.get("/api/devices/{device_pk}/state", response_model=DeviceState)
+async def get_device_state(
+    device_pk: int, max_age: float | None = Query(default=None, ge=0)
+) -> DeviceState:
+    return await registry.get(device_pk).get_state(max_age=max_age)
+
+
+@app.get("/api/devices/{device_pk}/analytics", response_model=ProgramAnalytics | None)
+async def get_device_analytics(device_pk: int) -> ProgramAnalytics | None:
+    analytics = await registry.get(device_pk).active_target_analytics()
+    return ProgramAnalytics(**analytics) if analytics else None
+
+
+@app.post("/api/devices/{device_pk}/mode", response_model=ModeSetResponse)
+async def set_device_mode(device_pk: int, payload: ModeSetRequest) -> ModeSetResponse:
+    mode = await registry.get(device_pk).set_mode(payload.mode)
+    return ModeSetResponse(status="ok", mode=cast(Literal["manual", "auto"], mode))
+
+
+@app.post("/api/devices/{device_pk}/manual/intensity", response_model=GenericOkResponse)
+async def set_device_manual_intensity(
+    device_pk: int, payload: IntensitySetRequest
+) -> GenericOkResponse:
+    await registry.get(device_pk).set_manual_intensity(Intensity(**payload.model_dump()))
+    return GenericOkResponse(status="ok")
+
+
+@app.post("/api/devices/{device_pk}/program", response_model=ProgramSetResponse)
+async def set_device_program(
+    device_pk: int, payload: ProgramSetRequest, sync: bool | None = None
+) -> ProgramSetResponse:
+    ack = await registry.get(device_pk).set_program(Program(**payload.model_dump()), sync=sync)
+    return ProgramSetResponse(status="ok", ack=ack, skipped=ack is None)
+
+
+@app.post("/api/devices/{device_pk}/batch", response_model=BatchResponse)
+async def apply_device_batch(device_pk: int, payload: BatchRequest) -> BatchResponse:
+    service = registry.get(device_pk)
+    state = await service.apply_batch(payload.mode, payload.intensity, payload.program)
+    return BatchResponse(status="ok", state=state)
+
+
+@app.get("/api/fleet/state", response_model=FleetResponse)
+async def get_fleet_state(max_age: float | None = Query(default=None, ge=0)) -> FleetResponse:
+    results = await registry.fan_out(lambda service: service.get_state(max_age=max_age))
+    return FleetResponse(results=[FleetResult(**r) for r in results])
+
+
+@app.post("/api/fleet/presets/{preset_id}/apply", response_model=FleetResponse)
+async def apply_preset_to_fleet(preset_id: int) -> FleetResponse:
+    preset = await preset_service.apply_preset(preset_id)
+
+    async def apply(service: DeviceService) -> None:
+        await service.apply_preset(preset)
+
+    results = await registry.fan_out(apply)
+    return FleetResponse(results=[FleetResult(**r) for r in results])
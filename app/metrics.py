@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterable
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, ParamSpec, TypeVar
+
+from app.tracing import add_db_time
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+LabelValues = tuple[str, ...]
+# (metric name, type, help, [(labels, value)]) produced at scrape time.
+Family = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+Collector = Callable[[], Iterable[Family]]
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; an observation is one bisect and three additions."""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: [count per bucket (+Inf last)..., sum, count]
+        self._series: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0.0] * (len(self.buckets) + 3)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return int(series[-1]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, series in sorted(self._series.items()):
+            cumulative = 0.0
+            bounds = [*(repr(b) for b in self.buckets), "+Inf"]
+            for bound, hits in zip(bounds, series, strict=False):
+                cumulative += hits
+                labels = _format_labels(self.labels, values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: list[Collector] = []
+
+    def counter(self, name: str, help_text: str, labels: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector) -> None:
+        """Register a callback producing gauge-style samples when metrics are scraped."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    rendered = _format_labels(names, tuple(labels[n] for n in names))
+                    lines.append(f"{name}{rendered} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+ICV6_REQUEST_SECONDS = registry.histogram(
+    "icv6_request_duration_seconds",
+    "Round trip of successful ICV6 requests by command group and id.",
+    ("group", "id"),
+)
+ICV6_CONNECTS = registry.counter("icv6_connects_total", "TCP connections opened to an ICV6.")
+ICV6_RECONNECTS = registry.counter(
+    "icv6_reconnects_total", "Persistent sessions re-established after a stall or drop."
+)
+ICV6_TIMEOUTS = registry.counter(
+    "icv6_request_timeouts_total", "ICV6 requests that timed out.", ("group", "id")
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "SQLite access time by app.db function.", ("function",)
+)
+VALIDATOR_CYCLE_SECONDS = registry.histogram(
+    "validator_cycle_duration_seconds",
+    "Duration of background validation cycles.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+VALIDATOR_RUNS = registry.counter(
+    "validator_runs_total", "Background validation cycles by outcome.", ("status",)
+)
+
+
+# Set while a timed db function runs, so helpers built on other timed ones count once.
+_in_timed_db: ContextVar[bool] = ContextVar("in_timed_db", default=False)
+
+
+def timed_db(fn: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+    """Record the wall time of an ``app.db`` coroutine function (outermost call only)."""
+    name = fn.__name__
+
+    @wraps(fn)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        if _in_timed_db.get():
+            return await fn(*args, **kwargs)
+        token = _in_timed_db.set(True)
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _in_timed_db.reset(token)
+            elapsed = time.perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, name)
+            add_db_time(elapsed)
+
+    return wrapper
+
+
+def label_byte(value: int) -> str:
+    return f"0x{value:02x}"
+
+
+def stats_samples(stats: Iterable[Any]) -> Iterable[Family]:
+    """Counter samples summed over frame decoder stats objects."""
+    totals = {"frames": 0, "keepalives": 0, "bad_checksums": 0, "invalid_frames": 0}
+    discarded = 0.0
+    for item in stats:
+        for key in totals:
+            totals[key] += getattr(item, key)
+        discarded += item.discarded_bytes
+    yield (
+        "icv6_decoder_frames_total",
+        "counter",
+        "Frames seen by the ICV6 stream decoders, by kind.",
+        [({"kind": kind}, float(value)) for kind, value in totals.items()],
+    )
+    yield (
+        "icv6_decoder_discarded_bytes_total",
+        "counter",
+        "Bytes skipped while resynchronising the ICV6 stream.",
+        [({}, discarded)],
+    )
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 Mode = Literal["manual", "auto"]
 
@@ -57,6 +57,19 @@ class PresetRenameRequest(BaseModel):
     name: str = Field(min_length=1, max_length=100)
 
 
+class ChannelAnalytics(BaseModel):
+    daily_dose_percent_hours: float
+    peak_percent: float
+    photoperiod_minutes: float
+    max_ramp_up_percent_per_hour: float
+    max_ramp_down_percent_per_hour: float
+
+
+class ProgramAnalytics(BaseModel):
+    digest: str
+    channels: dict[str, ChannelAnalytics]
+
+
 class PresetRecord(BaseModel):
     id: int
     name: str
@@ -64,6 +77,35 @@ class PresetRecord(BaseModel):
     intensity: Intensity | None = None
     program: Program | None = None
     created_at: str
+    analytics: ProgramAnalytics | None = None
+
+
+class DeviceCreateRequest(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    host: str = Field(min_length=1, max_length=255)
+    port: int = Field(default=80, ge=1, le=65535)
+    # Sent verbatim in every frame, so it must be 11 printable ASCII characters.
+    device_id: str = Field(pattern=r"^[\x21-\x7e]{11}$")
+
+
+class DeviceRecord(BaseModel):
+    id: int
+    name: str
+    host: str
+    port: int
+    device_id: str
+    created_at: str
+
+
+class FleetResult(BaseModel):
+    device: str
+    status: Literal["ok", "error"]
+    state: DeviceState | None = None
+    error: str | None = None
+
+
+class FleetResponse(BaseModel):
+    results: list[FleetResult]
 
 
 class ValidationPollingConfig(BaseModel):
@@ -75,10 +117,36 @@ class ValidationPollingConfigRequest(ValidationPollingConfig):
     pass
 
 
+class BreakerStatus(BaseModel):
+    state: Literal["closed", "open", "half_open"]
+    failures: int
+    retry_in_seconds: float | None = None
+
+
 class HealthzResponse(BaseModel):
     status: Literal["ok", "degraded"]
     db: str
     icv6: str
+    breakers: dict[str, BreakerStatus] = {}
+
+
+class BatchRequest(BaseModel):
+    mode: Mode
+    intensity: Intensity | None = None
+    program: Program | None = None
+
+    @model_validator(mode="after")
+    def _payload_matches_mode(self) -> BatchRequest:
+        if self.mode == "auto" and self.intensity is not None:
+            raise ValueError("intensity is only valid with mode manual")
+        if self.mode == "manual" and self.program is not None:
+            raise ValueError("program is only valid with mode auto")
+        return self
+
+
+class BatchResponse(BaseModel):
+    status: Literal["ok"]
+    state: DeviceState
 
 
 class ModeSetResponse(BaseModel):
@@ -92,7 +160,18 @@ class GenericOkResponse(BaseModel):
 
 class ProgramSetResponse(BaseModel):
     status: Literal["ok"]
-    ack: int
+    ack: int | None = None
+    skipped: bool = False
+
+
+class ProgramCurveResponse(BaseModel):
+    digest: str
+    resolution_minutes: float
+    minutes: list[float]
+    ch1: list[float]
+    ch2: list[float]
+    ch3: list[float]
+    ch4: list[float]
 
 
 class PresetCreateResponse(BaseModel):
@@ -120,6 +199,18 @@ class ValidationRunRecord(BaseModel):
     details: dict[str, Any]
 
 
+class ValidationRunSummary(BaseModel):
+    id: int
+    checked_at: str
+    status: str
+    details: dict[str, Any] | None = None
+
+
+class ValidationRunPage(BaseModel):
+    runs: list[ValidationRunSummary]
+    next_before_id: int | None = None
+
+
 class ValidationRunResult(BaseModel):
     status: str
     reason: str | None = None
@@ -0,0 +1,283 @@
+"""Replay an ICV6 frame log against the simulator (or a real ICV6).
+
+Requests from a log written with ``ICV6_FRAME_LOG_PATH`` are sent again with their
+original spacing, optionally sped up. By default an in-process simulator answers each
+one after the round trip recorded in production and stays silent where the lamp did,
+so latency spikes and timeouts are reproduced offline::
+
+    python -m app.replay frames.log --speed 10 --output replay.jsonl
+
+Against a real ICV6 (``--host``) only queries are resent unless ``--allow-writes`` is
+given, since logged ``set_*`` commands would overwrite the lamp's current settings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import Iterable, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.services.frame_decoder import ParsedFrame, parse_dd_frame
+from app.services.frame_log import RECEIVED, SENT, TIMED_OUT, UNSOLICITED, read_frame_logs
+from app.services.frame_semantics import command_name, is_query
+from app.services.icv6_client import ICV6Session
+from app.simulator import ICV6Simulator
+
+logger = logging.getLogger(__name__)
+
+_OUTCOMES = {RECEIVED: "ok", TIMED_OUT: "timeout"}
+
+RequestKey = tuple[str, int, int]
+
+
+@dataclass(slots=True)
+class LoggedRequest:
+    sent_at: float
+    frame: ParsedFrame
+    # Recorded round trip in seconds; None when the request timed out or failed.
+    latency: float | None
+    outcome: str
+
+
+@dataclass(slots=True)
+class ReplayResult:
+    offset: float
+    device_id: str
+    name: str
+    recorded_outcome: str
+    recorded_ms: float | None
+    replayed_outcome: str
+    replayed_ms: float | None
+
+
+def logged_requests(path: str | Path) -> list[LoggedRequest]:
+    """Pair each logged request with its outcome, in the order they were sent."""
+    pending: dict[int, tuple[float, ParsedFrame]] = {}
+    requests: list[LoggedRequest] = []
+    for record in read_frame_logs(path):
+        if record.kind == SENT:
+            try:
+                pending[record.request_id] = (record.timestamp, parse_dd_frame(record.raw))
+            except RuntimeError:
+                logger.warning("skipping unparseable logged frame %s", record.raw.hex())
+            continue
+        sent = pending.pop(record.request_id, None)
+        if sent is None:
+            continue  # its request was in a backup that has rotated away
+        sent_at, frame = sent
+        latency = record.timestamp - sent_at if record.kind == RECEIVED else None
+        requests.append(
+            LoggedRequest(sent_at, frame, latency, _OUTCOMES.get(record.kind, "failed"))
+        )
+    # Requests still in flight when the log ended.
+    requests += [LoggedRequest(at, frame, None, "unfinished") for at, frame in pending.values()]
+    requests.sort(key=lambda r: r.sent_at)
+    return requests
+
+
+def logged_unsolicited(path: str | Path) -> list[tuple[float, ParsedFrame]]:
+    """Frames the device sent without being asked, with the time they arrived."""
+    frames = []
+    for record in read_frame_logs(path):
+        if record.kind != UNSOLICITED:
+            continue
+        try:
+            frames.append((record.timestamp, parse_dd_frame(record.raw)))
+        except RuntimeError:
+            logger.warning("skipping unparseable logged frame %s", record.raw.hex())
+    return frames
+
+
+def _key(frame: ParsedFrame) -> RequestKey:
+    return frame.device_id, frame.cmd_group, frame.cmd_id
+
+
+class RecordedLatency:
+    """Simulator response delays taken from the log, matched per device and command."""
+
+    def __init__(self, requests: Iterable[LoggedRequest]) -> None:
+        self._delays: dict[RequestKey, deque[float | None]] = {}
+        for request in requests:
+            self._delays.setdefault(_key(request.frame), deque()).append(request.latency)
+
+    def __call__(self, frame: ParsedFrame) -> float | None:
+        delays = self._delays.get(_key(frame))
+        # Frames the log does not know about are answered at once.
+        return delays.popleft() if delays else 0.0
+
+
+async def replay(
+    requests: list[LoggedRequest],
+    speed: float = 1.0,
+    timeout: float = 2.0,
+    host: str | None = None,
+    port: int | None = None,
+    allow_writes: bool = False,
+    unsolicited: Sequence[tuple[float, ParsedFrame]] = (),
+) -> list[ReplayResult]:
+    """Send ``requests`` again and time the responses.
+
+    ``speed`` divides the original gaps between requests (``0`` sends them back to
+    back). Without ``host``/``port`` an in-process simulator answers with the recorded
+    latencies and also sends the ``unsolicited`` frames at their recorded times, once the
+    replay connection is open. With them, write commands are dropped unless
+    ``allow_writes`` is set, and ``unsolicited`` is ignored.
+    """
+    real_device = host is not None and port is not None
+    if real_device and not allow_writes:
+        queries = [r for r in requests if is_query(r.frame)]
+        if len(queries) < len(requests):
+            logger.warning(
+                "skipping %d write commands; pass --allow-writes to resend them to %s",
+                len(requests) - len(queries),
+                host,
+            )
+        requests = queries
+    if not requests:
+        return []
+    simulator: ICV6Simulator | None = None
+    if host is None or port is None:
+        device_ids = sorted({r.frame.device_id for r in requests})
+        simulator = ICV6Simulator(device_ids, response_delay=RecordedLatency(requests))
+        host, port = "127.0.0.1", await simulator.start()
+    session = ICV6Session(host, port, timeout, idle_timeout=0)
+    pushes = list(unsolicited) if simulator is not None else []
+    first = min([requests[0].sent_at, *(at for at, _ in pushes[:1])])
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    async def pace(at: float) -> None:
+        if speed > 0:
+            wait = started + (at - first) / speed - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def push_unsolicited(simulator: ICV6Simulator) -> None:
+        while not session.connected:
+            await asyncio.sleep(0.001)
+        for at, frame in pushes:
+            await pace(at)
+            simulator.push(frame.raw)
+
+    async def send(request: LoggedRequest) -> ReplayResult:
+        frame = request.frame
+        t0 = time.perf_counter()
+        try:
+            await session.request(
+                frame.raw, frame.device_id, frame.cmd_group + 0x50, frame.cmd_id, timeout
+            )
+            outcome, replayed_ms = "ok", round((time.perf_counter() - t0) * 1000, 3)
+        except TimeoutError:
+            outcome, replayed_ms = "timeout", None
+        except (OSError, RuntimeError):
+            outcome, replayed_ms = "failed", None
+        return ReplayResult(
+            offset=round(request.sent_at - first, 6),
+            device_id=frame.device_id,
+            name=command_name(frame.cmd_group, frame.cmd_id),
+            recorded_outcome=request.outcome,
+            recorded_ms=round(request.latency * 1000, 3) if request.latency is not None else None,
+            replayed_outcome=outcome,
+            replayed_ms=replayed_ms,
+        )
+
+    tasks = []
+    pusher = asyncio.create_task(push_unsolicited(simulator)) if simulator and pushes else None
+    try:
+        for request in requests:
+            await pace(request.sent_at)
+            tasks.append(asyncio.create_task(send(request)))
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        if pusher is not None:
+            pusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await pusher
+        await session.close()
+        if simulator is not None:
+            await simulator.stop()
+
+
+def _percentiles(values: list[float]) -> dict[str, float | None]:
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": ordered[-1]}
+
+
+def summarize(results: list[ReplayResult]) -> dict:
+    """Recorded vs replayed latency percentiles and outcome counts."""
+
+    def outcomes(attr: str) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for result in results:
+            counts[getattr(result, attr)] = counts.get(getattr(result, attr), 0) + 1
+        return counts
+
+    return {
+        "requests": len(results),
+        "recorded": {
+            "outcomes": outcomes("recorded_outcome"),
+            **_percentiles([r.recorded_ms for r in results if r.recorded_ms is not None]),
+        },
+        "replayed": {
+            "outcomes": outcomes("replayed_outcome"),
+            **_percentiles([r.replayed_ms for r in results if r.replayed_ms is not None]),
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay an ICV6 frame log.")
+    parser.add_argument("log", type=Path, help="frame log path (rotated backups are included)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale; 0 = no gaps")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--host", help="replay against this ICV6 instead of the simulator")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument(
+        "--allow-writes",
+        action="store_true",
+        help="with --host, also resend set_* commands (overwrites the lamp's settings)",
+    )
+    parser.add_argument("--output", type=Path, help="write one JSON line per request")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    requests = logged_requests(args.log)
+    unsolicited = [] if args.host else logged_unsolicited(args.log)
+    results = asyncio.run(
+        replay(
+            requests,
+            speed=args.speed,
+            timeout=args.timeout,
+            host=args.host,
+            port=args.port if args.host else None,
+            allow_writes=args.allow_writes,
+            unsolicited=unsolicited,
+        )
+    )
+    if args.output:
+        with args.output.open("w", encoding="utf-8") as out:
+            for result in results:
+                out.write(json.dumps(asdict(result)) + "\n")
+    summary = summarize(results)
+    if unsolicited:
+        summary["unsolicited_frames"] = len(unsolicited)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import socket
+import struct
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from typing import BinaryIO
+
+from app.services.frame_decoder import FrameDecoder, KeepaliveFrame, ParsedFrame
+
+PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+_PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+_TCP_FIN = 0x01
+_TCP_SYN = 0x02
+_TCP_RST = 0x04
+
+# Out-of-order data held per direction before giving up on the gap and skipping it.
+MAX_PENDING_BYTES = 256 * 1024
+
+
+class CaptureFormatError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class Packet:
+    number: int
+    timestamp: float
+    linktype: int
+    data: bytes
+
+
+@dataclass(slots=True)
+class TcpSegment:
+    number: int
+    timestamp: float
+    src: str
+    sport: int
+    dst: str
+    dport: int
+    seq: int
+    flags: int
+    payload: bytes
+
+
+@dataclass(slots=True)
+class CapturedFrame:
+    """A frame decoded from a reassembled TCP stream, with where and when it completed."""
+
+    number: int
+    timestamp: float
+    src: str
+    sport: int
+    dst: str
+    dport: int
+    frame: ParsedFrame | KeepaliveFrame
+
+
+def read_packets(stream: BinaryIO) -> Iterator[Packet]:
+    """Yield packets from a pcap or pcapng stream, one block at a time."""
+    head = stream.read(4)
+    if len(head) < 4:
+        return
+    if struct.unpack("<I", head)[0] == PCAPNG_SHB:
+        yield from _read_pcapng(stream, head)
+    elif head in _PCAP_MAGICS:
+        yield from _read_pcap(stream, *_PCAP_MAGICS[head])
+    else:
+        raise CaptureFormatError(f"not a pcap/pcapng file (magic {head.hex()})")
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise CaptureFormatError("truncated capture")
+    return data
+
+
+def _read_pcap(stream: BinaryIO, endian: str, resolution: float) -> Iterator[Packet]:
+    header = _read_exact(stream, 20)
+    linktype = struct.unpack(endian + "I", header[16:20])[0] & 0x0FFFFFFF
+    record = struct.Struct(endian + "IIII")
+    number = 0
+    while True:
+        raw = stream.read(record.size)
+        if len(raw) < record.size:
+            return
+        seconds, fraction, captured, _ = record.unpack(raw)
+        number += 1
+        data = stream.read(captured)
+        if len(data) < captured:
+            return  # capture cut off mid-packet, e.g. while still being written
+        yield Packet(number, seconds + fraction * resolution, linktype, data)
+
+
+def _read_pcapng(stream: BinaryIO, head: bytes) -> Iterator[Packet]:
+    endian = "<"
+    # Per section: (linktype, seconds per timestamp unit) of each interface.
+    interfaces: list[tuple[int, float]] = []
+    number = 0
+    block_type_raw = head
+    while True:
+        length_raw = stream.read(4)
+        if len(length_raw) < 4:
+            return
+        if struct.unpack("<I", block_type_raw)[0] == PCAPNG_SHB:
+            # A new section may switch byte order; the byte-order magic follows the length.
+            magic = _read_exact(stream, 4)
+            endian = "<" if struct.unpack("<I", magic)[0] == _PCAPNG_BYTE_ORDER else ">"
+            block_type = PCAPNG_SHB
+            total = struct.unpack(endian + "I", length_raw)[0]
+            body = magic + _read_exact(stream, total - 12)
+            interfaces = []
+        else:
+            block_type = struct.unpack(endian + "I", block_type_raw)[0]
+            total = struct.unpack(endian + "I", length_raw)[0]
+            if total < 12:
+                raise CaptureFormatError(f"invalid pcapng block length {total}")
+            body = _read_exact(stream, total - 8)
+        body = body[:-4]  # trailing copy of the block length
+
+        if block_type == 1:  # interface description
+            linktype = struct.unpack(endian + "H", body[0:2])[0]
+            interfaces.append((linktype, _tsresol(body[8:], endian)))
+        elif block_type == 6:  # enhanced packet
+            iface, high, low, captured = struct.unpack(endian + "IIII", body[0:16])
+            number += 1
+            linktype, unit = interfaces[iface] if iface < len(interfaces) else (1, 1e-6)
+            yield Packet(number, ((high << 32) | low) * unit, linktype, body[20 : 20 + captured])
+        elif block_type == 3:  # simple packet
+            number += 1
+            linktype = interfaces[0][0] if interfaces else LINKTYPE_ETHERNET
+            original = struct.unpack(endian + "I", body[0:4])[0]
+            yield Packet(number, 0.0, linktype, body[4 : 4 + original])
+        elif block_type == 2:  # obsolete packet block
+            iface = struct.unpack(endian + "H", body[0:2])[0]
+            high, low, captured = struct.unpack(endian + "III", body[4:16])
+            number += 1
+            linktype, unit = interfaces[iface] if iface < len(interfaces) else (1, 1e-6)
+            yield Packet(number, ((high << 32) | low) * unit, linktype, body[20 : 20 + captured])
+
+        block_type_raw = stream.read(4)
+        if len(block_type_raw) < 4:
+            return
+
+
+def _tsresol(options: bytes, endian: str) -> float:
+    pos = 0
+    while pos + 4 <= len(options):
+        code, length = struct.unpack(endian + "HH", options[pos : pos + 4])
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = options[pos + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0**-value
+        pos += 4 + (length + 3) // 4 * 4
+    return 1e-6
+
+
+def _network_layer(packet: Packet) -> tuple[int, memoryview] | None:
+    """(ethertype-style protocol, payload) below the link layer, or None if unsupported."""
+    data = memoryview(packet.data)
+    linktype = packet.linktype
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        ethertype = int.from_bytes(data[12:14], "big")
+        offset = 14
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 4:
+            ethertype = int.from_bytes(data[offset + 2 : offset + 4], "big")
+            offset += 4
+        return ethertype, data[offset:]
+    if linktype == LINKTYPE_LINUX_SLL and len(data) >= 16:
+        return int.from_bytes(data[14:16], "big"), data[16:]
+    if linktype == LINKTYPE_LINUX_SLL2 and len(data) >= 20:
+        return int.from_bytes(data[0:2], "big"), data[20:]
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6) and data:
+        return (0x0800 if data[0] >> 4 == 4 else 0x86DD), data
+    if linktype == LINKTYPE_NULL and len(data) >= 4:
+        # The address family is in the capturing host's byte order.
+        ipv4 = 2 in (int.from_bytes(data[0:4], "little"), int.from_bytes(data[0:4], "big"))
+        return (0x0800 if ipv4 else 0x86DD), data[4:]
+    return None
+
+
+_TCP_HEADER = struct.Struct("!HHIxxxxBB")
+
+
+def tcp_segment(packet: Packet, port: int | None = None) -> TcpSegment | None:
+    """The TCP segment carried by ``packet``, or None for anything else.
+
+    With ``port``, segments with that port on neither side are skipped before their
+    addresses are formatted, which is most of the per-packet cost on a busy capture.
+    """
+    network = _network_layer(packet)
+    if network is None:
+        return None
+    ethertype, ip = network
+    if ethertype == 0x0800 and len(ip) >= 20 and ip[9] == 6:
+        if ip[6] & 0x3F or ip[7]:
+            return None  # IP fragments do not occur on this link; skip rather than misparse
+        header_len = (ip[0] & 0x0F) * 4
+        total_len = (ip[2] << 8 | ip[3]) or len(ip)
+        tcp = ip[header_len:total_len]
+        family, src_raw, dst_raw = socket.AF_INET, ip[12:16], ip[16:20]
+    elif ethertype == 0x86DD and len(ip) >= 40 and ip[6] == 6:
+        tcp = ip[40 : 40 + (ip[4] << 8 | ip[5])]
+        family, src_raw, dst_raw = socket.AF_INET6, ip[8:24], ip[24:40]
+    else:
+        return None
+    if len(tcp) < 20:
+        return None
+    sport, dport, seq, offset, flags = _TCP_HEADER.unpack_from(tcp)
+    if port is not None and port != sport and port != dport:
+        return None
+    return TcpSegment(
+        number=packet.number,
+        timestamp=packet.timestamp,
+        src=socket.inet_ntop(family, src_raw),
+        sport=sport,
+        dst=socket.inet_ntop(family, dst_raw),
+        dport=dport,
+        seq=seq,
+        flags=flags,
+        payload=bytes(tcp[(offset >> 4) * 4 :]),
+    )
+
+
+_SEQ_MASK = 0xFFFFFFFF
+_SEQ_HALF = 0x80000000
+
+
+def _seq_after(seq: int, base: int) -> int:
+    """Distance from ``base`` forward to ``seq`` in 32-bit sequence space."""
+    return (seq - base) & _SEQ_MASK
+
+
+@dataclass
+class _Direction:
+    decoder: FrameDecoder
+    next_seq: int
+    pending: dict[int, bytes] = field(default_factory=dict)
+    pending_bytes: int = 0
+    last_number: int = 0
+    last_timestamp: float = 0.0
+
+
+FlowKey = tuple[str, int, str, int]
+
+
+class TcpReassembler:
+    """Per-direction TCP reassembly feeding one :class:`FrameDecoder` per direction.
+
+    Retransmitted bytes are trimmed, out-of-order segments are held until the gap fills
+    (up to ``max_pending_bytes``, then the gap is skipped and the decoder resyncs), and a
+    direction's state is dropped on FIN/RST, so memory stays bounded by the number of
+    concurrently open connections rather than the capture size.
+    """
+
+    def __init__(
+        self, include_keepalive: bool = False, max_pending_bytes: int = MAX_PENDING_BYTES
+    ) -> None:
+        self.include_keepalive = include_keepalive
+        self.max_pending_bytes = max_pending_bytes
+        self.gaps = 0
+        self._flows: dict[FlowKey, _Direction] = {}
+
+    @property
+    def open_flows(self) -> int:
+        return len(self._flows)
+
+    def feed(self, segment: TcpSegment) -> list[CapturedFrame]:
+        key = (segment.src, segment.sport, segment.dst, segment.dport)
+        direction = self._flows.get(key)
+        if segment.flags & _TCP_SYN:
+            # A new connection on a reused port pair starts over.
+            direction = self._flows[key] = self._direction((segment.seq + 1) & _SEQ_MASK)
+        elif direction is None:
+            if not segment.payload:
+                return []
+            # Capture started mid-connection: trust the first data segment we see.
+            direction = self._flows[key] = self._direction(segment.seq)
+        direction.last_number = segment.number
+        direction.last_timestamp = segment.timestamp
+
+        data = self._accept(direction, segment)
+        decoded = direction.decoder.feed(data) if data else []
+        if segment.flags & (_TCP_FIN | _TCP_RST):
+            # Hand over whatever was waiting behind a gap before forgetting the direction.
+            decoded += self._finish(direction)
+            del self._flows[key]
+        return [self._captured(key, direction, frame) for frame in decoded]
+
+    def flush(self) -> Iterator[CapturedFrame]:
+        """Decode what is left in connections still open at the end of the capture."""
+        for key, direction in self._flows.items():
+            for frame in self._finish(direction):
+                yield self._captured(key, direction, frame)
+        self._flows.clear()
+
+    def _direction(self, next_seq: int) -> _Direction:
+        return _Direction(FrameDecoder(include_keepalive=self.include_keepalive), next_seq)
+
+    @staticmethod
+    def _finish(direction: _Direction) -> list[ParsedFrame | KeepaliveFrame]:
+        tail = b"".join(
+            direction.pending[s]
+            for s in sorted(direction.pending, key=lambda s: _seq_after(s, direction.next_seq))
+        )
+        direction.pending.clear()
+        return direction.decoder.feed(tail) + direction.decoder.flush()
+
+    def _accept(self, direction: _Direction, segment: TcpSegment) -> bytes:
+        payload = segment.payload
+        if not payload:
+            return b""
+        ahead = _seq_after(segment.seq, direction.next_seq)
+        if ahead >= _SEQ_HALF:
+            # Starts before what we already have: a retransmission, possibly overlapping.
+            overlap = _seq_after(direction.next_seq, segment.seq)
+            if overlap >= len(payload):
+                return b""
+            payload = payload[overlap:]
+        elif ahead > 0:
+            if segment.seq not in direction.pending:
+                direction.pending[segment.seq] = payload
+                direction.pending_bytes += len(payload)
+            if direction.pending_bytes <= self.max_pending_bytes:
+                return b""
+            # The gap is not going to be filled; continue from the earliest held segment.
+            self.gaps += 1
+            base = direction.next_seq
+            direction.next_seq = min(direction.pending, key=lambda s: _seq_after(s, base))
+            return self._drain_pending(direction)
+
+        direction.next_seq = (direction.next_seq + len(payload)) & _SEQ_MASK
+        return payload + self._drain_pending(direction) if direction.pending else payload
+
+    @staticmethod
+    def _drain_pending(direction: _Direction) -> bytes:
+        parts = []
+        while direction.pending:
+            base = direction.next_seq
+            if base in direction.pending:
+                seq = base
+            else:
+                # A held segment may start before ``base`` when segments overlapped.
+                seq = next((s for s in direction.pending if _seq_after(base, s) < _SEQ_HALF), -1)
+                if seq < 0:
+                    break
+            data = direction.pending.pop(seq)
+            direction.pending_bytes -= len(data)
+            overlap = _seq_after(base, seq)
+            if overlap < len(data):
+                parts.append(data[overlap:])
+                direction.next_seq = (seq + len(data)) & _SEQ_MASK
+        return b"".join(parts)
+
+    @staticmethod
+    def _captured(
+        key: FlowKey, direction: _Direction, frame: ParsedFrame | KeepaliveFrame
+    ) -> CapturedFrame:
+        src, sport, dst, dport = key
+        return CapturedFrame(
+            direction.last_number, direction.last_timestamp, src, sport, dst, dport, frame
+        )
+
+
+def decode_capture(
+    stream: BinaryIO,
+    port: int | None = None,
+    include_keepalive: bool = False,
+    reassembler: TcpReassembler | None = None,
+) -> Iterator[CapturedFrame]:
+    """Stream every frame in a capture, decoded from reassembled TCP connections.
+
+    Only connections with ``port`` on either side are considered when it is given.
+    """
+    reassembler = reassembler or TcpReassembler(include_keepalive=include_keepalive)
+    for packet in read_packets(stream):
+        segment = tcp_segment(packet, port)
+        if segment is None:
+            continue
+        yield from reassembler.feed(segment)
+    yield from reassembler.flush()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Literal
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of touching the network while a device's breaker is open."""
+
+
+@dataclass
+class _RttEstimate:
+    # Smoothed RTT and its mean deviation, as in TCP's retransmission timer (RFC 6298).
+    srtt: float
+    rttvar: float
+
+    def update(self, rtt: float) -> None:
+        self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+        self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+
+class CircuitBreaker:
+    """Per-device breaker plus an RTT-driven request timeout.
+
+    ``failure_threshold`` consecutive failures open the breaker; calls then fail fast with
+    :class:`CircuitOpenError` for ``reset_timeout`` seconds, after which a single probe is
+    let through (half-open). A successful probe closes the breaker, a failed one re-opens
+    it. Timeouts are tracked per command, since a program upload takes far longer than a
+    mode query, and stay within ``[min_timeout, max_timeout]``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 10.0,
+        min_timeout: float = 0.5,
+        max_timeout: float = 2.0,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.max_timeout = max_timeout
+        self.failures = 0
+        self._state: BreakerState = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self._rtt: dict[int, _RttEstimate] = {}
+
+    @property
+    def state(self) -> BreakerState:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return self._state
+
+    def before_call(self) -> None:
+        """Admit a call or raise :class:`CircuitOpenError`."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._state = "half_open"
+            self._probing = True
+            return
+        retry_in = max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+        raise CircuitOpenError(
+            f"device {self.name} is unreachable (circuit open, retry in {retry_in:.1f}s)"
+        )
+
+    def timeout_for(self, command: int) -> float:
+        estimate = self._rtt.get(command)
+        if estimate is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, estimate.srtt + 4 * estimate.rttvar))
+
+    def observe_rtt(self, command: int, rtt: float) -> None:
+        """Feed a round trip into ``command``'s timeout without settling a call."""
+        estimate = self._rtt.get(command)
+        if estimate is None:
+            self._rtt[command] = _RttEstimate(srtt=rtt, rttvar=rtt / 2)
+        else:
+            estimate.update(rtt)
+
+    def observe_timeout(self, command: int) -> None:
+        """Back ``command``'s timer off so a device that merely got slower is not cut short."""
+        estimate = self._rtt.get(command)
+        if estimate is not None:
+            estimate.srtt = min(self.max_timeout, estimate.srtt * 2)
+
+    def record_success(self, command: int | None, rtt: float = 0.0) -> None:
+        """Settle an admitted call as ok; ``command=None`` records no RTT sample."""
+        if command is not None:
+            self.observe_rtt(command, rtt)
+        self.failures = 0
+        self._probing = False
+        self._state = "closed"
+
+    def record_failure(self, command: int | None, timed_out: bool = False) -> None:
+        if timed_out and command is not None:
+            self.observe_timeout(command)
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self._state = "open"
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self) -> None:
+        """Forget a call that was cancelled before it succeeded or failed."""
+        self._probing = False
+
+    def snapshot(self) -> dict[str, Any]:
+        state = self.state
+        retry_in = (
+            round(max(0.0, self._opened_at + self.reset_timeout - time.monotonic()), 3)
+            if state == "open"
+            else None
+        )
+        return {"state": state, "failures": self.failures, "retry_in_seconds": retry_in}
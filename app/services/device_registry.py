@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app import db
+from app.errors import AppError, NotFoundError, ValidationError
+from app.models import DeviceCreateRequest, DeviceState
+from app.services.device_service import DeviceService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE_NAME = "default"
+
+ServiceFactory = Callable[[dict[str, Any]], DeviceService]
+
+
+class DeviceRegistry:
+    """Registered devices from SQLite, each with its own DeviceService and client.
+
+    The device configured through settings is always part of the fleet under the name
+    ``default``; fleet operations fan out to every device with bounded concurrency.
+    """
+
+    def __init__(
+        self, default: DeviceService, factory: ServiceFactory, concurrency: int = 4
+    ) -> None:
+        self.default = default
+        self.factory = factory
+        self.concurrency = max(1, concurrency)
+        self._records: dict[int, dict[str, Any]] = {}
+        self._services: dict[int, DeviceService] = {}
+
+    async def load(self) -> None:
+        for record in await db.list_devices():
+            self._register(record)
+
+    async def close(self) -> None:
+        for service in self._services.values():
+            await service.client.close()
+        self._services.clear()
+        self._records.clear()
+
+    def list_devices(self) -> list[dict[str, Any]]:
+        return list(self._records.values())
+
+    def get(self, device_pk: int) -> DeviceService:
+        service = self._services.get(device_pk)
+        if service is None:
+            raise NotFoundError("device not found")
+        return service
+
+    async def add(self, payload: DeviceCreateRequest) -> dict[str, Any]:
+        if payload.name == DEFAULT_DEVICE_NAME:
+            raise ValidationError(f"device name '{DEFAULT_DEVICE_NAME}' is reserved")
+        try:
+            record = await db.create_device(
+                payload.name, payload.host, payload.port, payload.device_id
+            )
+        except sqlite3.IntegrityError as exc:
+            raise ValidationError("device already registered") from exc
+        self._register(record)
+        return record
+
+    async def remove(self, device_pk: int) -> None:
+        if not await db.delete_device(device_pk):
+            raise NotFoundError("device not found")
+        self._records.pop(device_pk, None)
+        service = self._services.pop(device_pk, None)
+        if service is not None:
+            await service.client.close()
+
+    def services(self) -> list[tuple[str, DeviceService]]:
+        """Every device service, the default one first, with its device name."""
+        return [(DEFAULT_DEVICE_NAME, self.default)] + [
+            (self._records[pk]["name"], service) for pk, service in self._services.items()
+        ]
+
+    def breakers(self) -> dict[str, dict[str, Any]]:
+        """Circuit breaker state of every device, keyed by device name."""
+        return {name: service.client.breaker.snapshot() for name, service in self.services()}
+
+    async def fan_out(
+        self, operation: Callable[[DeviceService], Awaitable[DeviceState | None]]
+    ) -> list[dict[str, Any]]:
+        """Run ``operation`` on every device concurrently, collecting per-device outcomes."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(name: str, service: DeviceService) -> dict[str, Any]:
+            async with semaphore:
+                try:
+                    state = await operation(service)
+                except AppError as exc:
+                    return {"device": name, "status": "error", "error": exc.message}
+                except Exception as exc:  # noqa: BLE001
+                    logger.exception("fleet operation failed", extra={"device": name})
+                    return {"device": name, "status": "error", "error": str(exc)}
+                return {"device": name, "status": "ok", "state": state}
+
+        return list(await asyncio.gather(*(run(name, svc) for name, svc in self.services())))
+
+    def _register(self, record: dict[str, Any]) -> None:
+        self._records[record["id"]] = record
+        self._services[record["id"]] = self.factory(record)
@@ -1,21 +1,112 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, cast
 
 from app import db
-from app.errors import DeviceCommunicationError
-from app.models import DeviceState, Intensity, Program
+from app.errors import DeviceCommunicationError, ValidationError
+from app.models import DeviceState, Intensity, Mode, Program
 from app.services.icv6_client import ICV6Client
+from app.services.program_analytics import target_analytics
+from app.services.program_curve import program_digest
 
 logger = logging.getLogger(__name__)
 
+# The only ack byte ever observed for a successful set_program.
+PROGRAM_ACK_OK = 0x01
+
 
 class DeviceService:
-    def __init__(self, client: ICV6Client) -> None:
+    def __init__(
+        self,
+        client: ICV6Client,
+        state_ttl: float = 0.0,
+        device: int | None = None,
+        sync_programs: bool = False,
+    ) -> None:
         self.client = client
+        self.state_ttl = state_ttl
+        # Registry primary key whose active target this service persists; None is the
+        # device configured through settings.
+        self.device = device
+        self.sync_programs = sync_programs
+        self.skipped_program_uploads = 0
+        # Content digest of the program last seen on (or written to) the device, and when.
+        self._program_digest: str | None = None
+        self._program_digest_at = 0.0
+        self._program_lock = asyncio.Lock()
+        self._state: DeviceState | None = None
+        self._state_at = 0.0
+        self._state_version = 0
+        self._state_fetch: asyncio.Task[DeviceState] | None = None
+        self._write_listeners: list[Callable[[], None]] = []
+
+    def add_write_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` after every successful device write."""
+        self._write_listeners.append(callback)
+
+    def _notify_write(self) -> None:
+        for callback in self._write_listeners:
+            try:
+                callback()
+            except Exception:  # noqa: BLE001
+                logger.exception("device write listener failed")
+
+    async def get_state(self, max_age: float | None = None) -> DeviceState:
+        """Return the device state, served from cache when younger than ``max_age``.
+
+        ``max_age`` defaults to the configured TTL. Concurrent callers that miss the cache
+        share one in-flight device fetch.
+        """
+        limit = self.state_ttl if max_age is None else max_age
+        if self._state is not None and time.monotonic() - self._state_at <= limit:
+            return self._state
+
+        if self._state_fetch is None or self._state_fetch.done():
+            self._state_fetch = asyncio.create_task(self._fetch_state(self._state_version))
+            # Retrieve the exception even if every waiter was cancelled.
+            self._state_fetch.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(self._state_fetch)
+
+    def invalidate_state(self) -> None:
+        self._state = None
+        self._state_version += 1
+        # Fetches started before the write may report the old state; do not join them.
+        self._state_fetch = None
+
+    def _store_state(self, state: DeviceState) -> None:
+        self._state = state
+        self._state_at = time.monotonic()
+
+    async def _fetch_state(self, version: int) -> DeviceState:
+        state = await self._query_state()
+        if version == self._state_version:
+            self._store_state(state)
+            if state.program is not None:
+                self._remember_program(state.program)
+        return state
+
+    def _remember_program(self, program: Program | None) -> None:
+        self._program_digest = None if program is None else program_digest(program)
+        self._program_digest_at = time.monotonic()
 
-    async def get_state(self) -> DeviceState:
+    def observed_program(self, program: Program) -> None:
+        """Record a program read from the device outside this service (e.g. the validator).
+
+        A program that differs from the one this service last saw also drops the cached
+        state, so neither reads nor sync uploads keep relying on the stale copy.
+        """
+        if program_digest(program) != self._program_digest:
+            self.invalidate_state()
+        self._remember_program(program)
+
+    async def _query_state(self) -> DeviceState:
         try:
+            if self.client.pipelined:
+                return await self._get_state_pipelined()
             mode = await self.client.query_mode()
             if mode == "manual":
                 intensity = await self.client.query_intensity()
@@ -26,32 +117,223 @@ class DeviceService:
             logger.exception("failed to fetch device state")
             raise DeviceCommunicationError(f"failed to query device state: {exc}") from exc
 
+    async def _get_state_pipelined(self) -> DeviceState:
+        # All three queries go out back to back on the shared session, so the whole state
+        # costs about one round trip; the result for the inactive mode is discarded. They
+        # count as one call for the circuit breaker.
+        async with self.client.breaker_call():
+            mode, intensity, program = await asyncio.gather(
+                self.client.query_mode(),
+                self.client.query_intensity(),
+                self.client.query_program(),
+                return_exceptions=True,
+            )
+            if isinstance(mode, BaseException):
+                raise mode
+            if mode == "manual":
+                if isinstance(intensity, BaseException):
+                    raise intensity
+                return DeviceState(mode="manual", intensity=intensity, program=None)
+            if isinstance(program, BaseException):
+                raise program
+            return DeviceState(mode="auto", intensity=None, program=program)
+
     async def set_mode(self, mode: str) -> str:
         try:
             await self.client.set_mode(mode)
         except Exception as exc:  # noqa: BLE001
             logger.exception("failed to set mode", extra={"mode": mode})
+            self.invalidate_state()
             raise DeviceCommunicationError(f"failed to set mode: {exc}") from exc
+        self.invalidate_state()
+        self._notify_write()
 
-        target = await db.get_active_target()
+        target = await db.get_active_target(self.device)
         intensity = target["intensity"] if target else None
         program = target["program"] if target else None
-        await db.upsert_active_target(mode, intensity, program)
+        await db.upsert_active_target(mode, intensity, program, self.device)
         return mode
 
+    async def active_target_analytics(self) -> dict[str, Any] | None:
+        target = await db.get_active_target(self.device)
+        if target is None:
+            return None
+        return target_analytics(target["mode"], target["intensity"], target["program"])
+
     async def set_manual_intensity(self, intensity: Intensity) -> None:
         try:
             await self.client.set_intensity(intensity)
         except Exception as exc:  # noqa: BLE001
             logger.exception("failed to set manual intensity")
+            self.invalidate_state()
             raise DeviceCommunicationError(f"failed to set intensity: {exc}") from exc
-        await db.upsert_active_target("manual", intensity.model_dump(), None)
+        self._apply_write("manual", DeviceState(mode="manual", intensity=intensity, program=None))
+        await db.upsert_active_target("manual", intensity.model_dump(), None, self.device)
+
+    async def set_program(self, program: Program, sync: bool | None = None) -> int | None:
+        """Upload ``program`` and return the device ack.
+
+        In sync mode (``sync`` defaults to the service setting) uploads are serialized and
+        skipped, returning ``None``, when the device already holds a program with the same
+        content, so a burst of identical applies costs at most one flash write.
+        """
+        if not (self.sync_programs if sync is None else sync):
+            return await self._upload_program(program)
 
-    async def set_program(self, program: Program) -> int:
+        digest = program_digest(program)
+        async with self._program_lock:
+            if await self._device_program_digest() != digest:
+                return await self._upload_program(program)
+            self.skipped_program_uploads += 1
+            await db.upsert_active_target("auto", None, program.model_dump(), self.device)
+            return None
+
+    async def _device_program_digest(self) -> str | None:
+        # The device can be re-flashed behind our back, so the digest is only trusted for
+        # as long as cached state would be.
+        if (
+            self._program_digest is None
+            or time.monotonic() - self._program_digest_at > self.state_ttl
+        ):
+            try:
+                self._remember_program(await self.client.query_program())
+            except Exception as exc:  # noqa: BLE001
+                # Not knowing what the device holds just means uploading unconditionally.
+                logger.warning("failed to query program before sync: %s", exc)
+                self._remember_program(None)
+        return self._program_digest
+
+    async def _upload_program(self, program: Program) -> int:
         try:
             ack = await self.client.set_program(program)
         except Exception as exc:  # noqa: BLE001
             logger.exception("failed to set program")
+            self.invalidate_state()
+            self._remember_program(None)
             raise DeviceCommunicationError(f"failed to upload program: {exc}") from exc
-        await db.upsert_active_target("auto", None, program.model_dump())
+        self._remember_program(program)
+        self._apply_write("auto", DeviceState(mode="auto", intensity=None, program=program))
+        await db.upsert_active_target("auto", None, program.model_dump(), self.device)
         return ack
+
+    async def apply_preset(self, preset: dict[str, Any]) -> None:
+        """Switch the device to a stored preset's mode and load its payload."""
+        if preset["mode"] == "manual":
+            await self.apply_batch("manual", intensity=Intensity(**preset["intensity"]))
+        else:
+            await self.apply_batch("auto", program=Program(**preset["program"]))
+
+    async def apply_batch(
+        self, mode: str, intensity: Intensity | None = None, program: Program | None = None
+    ) -> DeviceState:
+        """Set mode plus intensity and/or program as one transaction.
+
+        The commands go out back to back (pipelined when the client shares a session) and
+        every ack is checked. If any step fails the device is rolled back to the state known
+        before the batch; on success the active target is persisted once. In sync mode the
+        program step is dropped when the device already holds the same program.
+
+        Pipelined payload frames are sent without waiting for the mode ack, so a rejected
+        mode switch may still be followed by a payload write; the rollback restores both.
+        """
+        if mode == "manual" and (intensity is None or program is not None):
+            raise ValidationError("manual batch requires intensity and no program")
+        if mode == "auto" and (program is None or intensity is not None):
+            raise ValidationError("auto batch requires program and no intensity")
+
+        if program is None or not self.sync_programs:
+            return await self._apply_batch(mode, intensity, program, program)
+        async with self._program_lock:
+            upload: Program | None = program
+            if await self._device_program_digest() == program_digest(program):
+                upload = None
+                self.skipped_program_uploads += 1
+            return await self._apply_batch(mode, intensity, program, upload)
+
+    async def _apply_batch(
+        self,
+        mode: str,
+        intensity: Intensity | None,
+        program: Program | None,
+        upload: Program | None,
+    ) -> DeviceState:
+        previous = await self._last_known_state()
+        try:
+            await self._run_steps(mode, intensity, upload)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("batch failed, rolling back", extra={"mode": mode})
+            self.invalidate_state()
+            self._remember_program(None)
+            if previous is None:
+                outcome = "no prior state to roll back to"
+            elif await self._rollback(previous):
+                outcome = "rolled back"
+            else:
+                outcome = "rollback failed"
+            raise DeviceCommunicationError(f"batch failed ({outcome}): {exc}") from exc
+
+        if program is not None:
+            self._remember_program(program)
+        state = DeviceState(
+            mode=cast(Mode, mode),
+            intensity=intensity if mode == "manual" else None,
+            program=program if mode == "auto" else None,
+        )
+        self.invalidate_state()
+        self._store_state(state)
+        self._notify_write()
+        await db.upsert_active_target(
+            mode,
+            intensity.model_dump() if intensity is not None else None,
+            program.model_dump() if program is not None else None,
+            self.device,
+        )
+        return state
+
+    async def _last_known_state(self) -> DeviceState | None:
+        # Cached state only within the TTL: rolling back to an older snapshot would undo
+        # whatever changed on the device since.
+        try:
+            return await self.get_state()
+        except DeviceCommunicationError:
+            return None
+
+    async def _run_steps(
+        self, mode: str, intensity: Intensity | None, program: Program | None
+    ) -> None:
+        steps: list[Callable[[], Awaitable[Any]]] = [lambda: self.client.set_mode(mode)]
+        if intensity is not None:
+            steps.append(lambda: self.client.set_intensity(intensity))
+        if program is not None:
+            steps.append(lambda: self.client.set_program(program))
+
+        if not self.client.pipelined:
+            results = [await step() for step in steps]
+        else:
+            # Tasks start in order, so the frames hit the wire in order without waiting for
+            # acks; the batch counts as one call for the circuit breaker.
+            async with self.client.breaker_call():
+                results = await asyncio.gather(*(step() for step in steps), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+        # A rejected program is an answer from the device, not a breaker failure.
+        if program is not None and results[-1] != PROGRAM_ACK_OK:
+            raise RuntimeError(f"device rejected program (ack {results[-1]:#04x})")
+
+    async def _rollback(self, previous: DeviceState) -> bool:
+        try:
+            await self._run_steps(previous.mode, previous.intensity, previous.program)
+        except Exception:  # noqa: BLE001
+            logger.exception("batch rollback failed")
+            return False
+        self._notify_write()
+        return True
+
+    def _apply_write(self, mode: str, state: DeviceState) -> None:
+        # A write only changes what the device reports if it is already in that mode.
+        cached = self._state
+        self.invalidate_state()
+        if cached is not None and cached.mode == mode:
+            self._store_state(state)
+        self._notify_write()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+MAGIC_DD = bytes.fromhex("ddeeff")
+MAGIC_FF = bytes.fromhex("ffeeddcc")
+
+KEEPALIVE_LEN = 9
+MIN_FRAME_LEN = 21
+_HEADER_LEN = 5
+
+_SYNC = re.compile(re.escape(MAGIC_DD) + b"|" + re.escape(MAGIC_FF))
+
+
+@dataclass
+class ParsedFrame:
+    raw: bytes
+    cmd_group: int
+    cmd_id: int
+    args: bytes
+    device_id: str
+
+
+@dataclass
+class KeepaliveFrame:
+    raw: bytes
+
+
+@dataclass
+class DecoderStats:
+    frames: int = 0
+    keepalives: int = 0
+    bad_checksums: int = 0
+    invalid_frames: int = 0
+    discarded_bytes: int = 0
+
+
+def _checksum_ok(raw: bytes) -> bool:
+    # Summing a memoryview slice avoids copying the frame body again.
+    with memoryview(raw) as view:
+        return (sum(view[4:-1]) & 0xFF) == raw[-1]
+
+
+def _frame_from_raw(raw: bytes) -> ParsedFrame:
+    return ParsedFrame(
+        raw=raw,
+        cmd_group=raw[18],
+        cmd_id=raw[19],
+        args=raw[20:-1],
+        device_id=raw[6:17].decode("ascii", errors="replace"),
+    )
+
+
+def build_frame(device_id: str, cmd_group: int, cmd_id: int, args: bytes) -> bytes:
+    if len(device_id) != 11:
+        raise ValueError(f"device id must be 11 chars on wire, got {device_id}")
+
+    body = bytes([0xFF]) + device_id.encode("ascii") + bytes([0x01, cmd_group, cmd_id]) + args
+    len_field = len(body) + 1
+    checksum = (len_field + sum(body)) & 0xFF
+    return MAGIC_DD + bytes([0x00, len_field]) + body + bytes([checksum])
+
+
+def parse_dd_frame(raw: bytes) -> ParsedFrame:
+    if len(raw) < MIN_FRAME_LEN or raw[:3] != MAGIC_DD:
+        raise RuntimeError("invalid frame header")
+    if len(raw) != _HEADER_LEN + raw[4]:
+        raise RuntimeError("invalid frame length")
+    if not _checksum_ok(raw):
+        raise RuntimeError("bad checksum")
+    return _frame_from_raw(raw)
+
+
+class FrameDecoder:
+    """Incremental decoder for the ``dd ee ff`` / ``ff ee dd cc`` byte stream.
+
+    Chunks are appended to one buffer and scanned from a moving offset, so each byte is
+    inspected a bounded number of times no matter how the stream is split. Corrupt frames
+    (bad length or checksum) are counted and the scan resumes one byte past their magic,
+    so a valid frame hidden behind garbage is still found. Used by the live client and by
+    offline capture decoding.
+    """
+
+    def __init__(self, include_keepalive: bool = False, stats: DecoderStats | None = None):
+        self.include_keepalive = include_keepalive
+        self.stats = stats if stats is not None else DecoderStats()
+        self._buf = bytearray()
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf)
+
+    def feed(self, data: bytes) -> list[ParsedFrame | KeepaliveFrame]:
+        """Append ``data`` and return every frame it completes."""
+        self._buf.extend(data)
+        return self._drain(final=False)
+
+    def flush(self) -> list[ParsedFrame | KeepaliveFrame]:
+        """Decode what is left at end of stream, giving up on truncated candidates."""
+        frames = self._drain(final=True)
+        self.stats.discarded_bytes += len(self._buf)
+        self._buf.clear()
+        return frames
+
+    def _drain(self, final: bool) -> list[ParsedFrame | KeepaliveFrame]:
+        buf = self._buf
+        end = len(buf)
+        pos = 0
+        out: list[ParsedFrame | KeepaliveFrame] = []
+        stats = self.stats
+        while True:
+            match = _SYNC.search(buf, pos)
+            if match is None:
+                # Keep a tail that may be the start of a magic split across chunks.
+                keep_from = max(pos, end - (len(MAGIC_FF) - 1))
+                stats.discarded_bytes += keep_from - pos
+                pos = keep_from
+                break
+
+            start = match.start()
+            stats.discarded_bytes += start - pos
+            available = end - start
+
+            if buf[start] == MAGIC_FF[0]:
+                if available < KEEPALIVE_LEN:
+                    if final:
+                        pos = start + 1
+                        stats.discarded_bytes += 1
+                        continue
+                    pos = start
+                    break
+                stats.keepalives += 1
+                if self.include_keepalive:
+                    out.append(KeepaliveFrame(raw=bytes(buf[start : start + KEEPALIVE_LEN])))
+                pos = start + KEEPALIVE_LEN
+                continue
+
+            total = _HEADER_LEN + buf[start + 4] if available >= _HEADER_LEN else 0
+            if total and total < MIN_FRAME_LEN:
+                stats.invalid_frames += 1
+                stats.discarded_bytes += 1
+                pos = start + 1
+                continue
+            if not total or available < total:
+                if final:
+                    pos = start + 1
+                    stats.discarded_bytes += 1
+                    continue
+                pos = start
+                break
+
+            with memoryview(buf) as view:
+                raw = bytes(view[start : start + total])
+            if not _checksum_ok(raw):
+                stats.bad_checksums += 1
+                stats.discarded_bytes += 1
+                pos = start + 1
+                continue
+
+            stats.frames += 1
+            out.append(_frame_from_raw(raw))
+            pos = start + total
+
+        # Deleting from the front of a bytearray only moves its start offset.
+        del buf[:pos]
+        return out
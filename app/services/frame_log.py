@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+from app.services.frame_decoder import ParsedFrame
+
+logger = logging.getLogger(__name__)
+
+FILE_MAGIC = b"ICV6FLG\x01"
+
+SENT = 1
+RECEIVED = 2
+TIMED_OUT = 3
+FAILED = 4
+# A frame the device sent that no request was waiting for; logged under request id 0.
+UNSOLICITED = 5
+
+# kind, request id, wall-clock timestamp, frame length; the raw frame follows.
+_RECORD = struct.Struct("<BIdH")
+
+
+@dataclass(slots=True)
+class FrameLogRecord:
+    kind: int
+    request_id: int
+    timestamp: float
+    raw: bytes
+
+
+class FrameLog:
+    """Append-only binary log of ICV6 request frames and their responses.
+
+    Each record is a 15-byte header plus the raw frame: a request and its outcome share
+    a request id, so round trips can be paired even when pipelined requests complete
+    out of order. Frames the device sends on its own are logged as ``UNSOLICITED``. When the file would grow past ``max_bytes`` it is rotated to
+    ``<path>.1`` (shifting older files up to ``<path>.<backups>``). Write errors are
+    logged once and disable the log instead of failing device requests.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 10_000_000, backups: int = 5) -> None:
+        self.path = Path(path)
+        self.max_bytes = max(max_bytes, len(FILE_MAGIC) + _RECORD.size + 512)
+        self.backups = max(0, backups)
+        self._file: BinaryIO | None = None
+        self._size = 0
+        # Random start so ids from a restarted process don't pair with stale records.
+        self._next_id = int.from_bytes(os.urandom(4), "little")
+        self._disabled = False
+
+    def sent(self, frame: bytes) -> int:
+        """Record an outgoing frame and return the id to report its outcome under."""
+        # Id 0 is reserved for unsolicited frames.
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        self._write(SENT, self._next_id, frame)
+        return self._next_id
+
+    def received(self, request_id: int, frame: ParsedFrame) -> None:
+        self._write(RECEIVED, request_id, frame.raw)
+
+    def failed(self, request_id: int, timed_out: bool) -> None:
+        self._write(TIMED_OUT if timed_out else FAILED, request_id, b"")
+
+    def unsolicited(self, frame: ParsedFrame) -> None:
+        self._write(UNSOLICITED, 0, frame.raw)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, kind: int, request_id: int, raw: bytes) -> None:
+        if self._disabled:
+            return
+        record = _RECORD.pack(kind, request_id, time.time(), len(raw)) + raw
+        try:
+            if self._file is None:
+                self._open()
+            elif self._size + len(record) > self.max_bytes:
+                self._rotate()
+            assert self._file is not None
+            self._file.write(record)
+            self._size += len(record)
+        except OSError:
+            logger.warning("frame log %s disabled after write error", self.path, exc_info=True)
+            self._disabled = True
+            self.close()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Unbuffered: one write per record, so a reader or a crash never sees half of one.
+        self._file = self.path.open("ab", buffering=0)
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(FILE_MAGIC)
+            self._size = len(FILE_MAGIC)
+            return
+        complete = _complete_length(self.path)
+        if complete < self._size:
+            # Drop a record torn by an earlier crash so new ones stay readable.
+            self._file.truncate(complete)
+            self._size = complete
+
+    def _rotate(self) -> None:
+        self.close()
+        if self.backups == 0:
+            self.path.unlink(missing_ok=True)
+        else:
+            for index in range(self.backups - 1, 0, -1):
+                older = self.path.with_name(f"{self.path.name}.{index}")
+                if older.exists():
+                    os.replace(older, self.path.with_name(f"{self.path.name}.{index + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        self._open()
+
+
+def _complete_length(path: Path) -> int:
+    """Length of the prefix of ``path`` that holds only whole records."""
+    size = path.stat().st_size
+    with path.open("rb") as stream:
+        if stream.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise OSError(f"{path} exists but is not an ICV6 frame log")
+        pos = len(FILE_MAGIC)
+        while pos + _RECORD.size <= size:
+            stream.seek(pos)
+            length = _RECORD.unpack(stream.read(_RECORD.size))[3]
+            if pos + _RECORD.size + length > size:
+                break
+            pos += _RECORD.size + length
+    return pos
+
+
+def frame_log_files(path: str | Path) -> list[Path]:
+    """The log and its rotated backups, oldest first."""
+    path = Path(path)
+    backups = sorted(
+        (p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    return [*backups, path] if path.exists() else backups
+
+
+def read_frame_log(path: str | Path) -> Iterator[FrameLogRecord]:
+    """Stream the records of one log file; a record cut off by a crash ends the file."""
+    with Path(path).open("rb") as stream:
+        if stream.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not an ICV6 frame log")
+        while True:
+            header = stream.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            kind, request_id, timestamp, length = _RECORD.unpack(header)
+            raw = stream.read(length)
+            if len(raw) < length:
+                return
+            yield FrameLogRecord(kind, request_id, timestamp, raw)
+
+
+def read_frame_logs(path: str | Path) -> Iterator[FrameLogRecord]:
+    """Stream records across the log and its rotated backups, oldest first."""
+    for file in frame_log_files(path):
+        yield from read_frame_log(file)
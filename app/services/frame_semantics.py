@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from typing import Any
+
+from app.services.frame_decoder import KeepaliveFrame, ParsedFrame
+
+# Names from protocol.md; responses use the request group + 0x50.
+COMMAND_NAMES: dict[tuple[int, int], str] = {
+    (0x01, 0x04): "query_vendor_tag",
+    (0x51, 0x04): "report_vendor_tag",
+    (0x04, 0x01): "query_device_info",
+    (0x54, 0x01): "report_device_info",
+    (0x05, 0x01): "query_runtime_status",
+    (0x55, 0x01): "report_runtime_status",
+    (0x0F, 0x01): "query_mode",
+    (0x5F, 0x01): "report_mode",
+    (0x0F, 0x02): "set_mode",
+    (0x5F, 0x02): "ack_mode",
+    (0x0F, 0x0B): "set_preview_intensity",
+    (0x5F, 0x0B): "ack_preview_intensity",
+    (0x0F, 0x0C): "set_intensity",
+    (0x5F, 0x0C): "ack_intensity",
+    (0x0F, 0x0D): "query_intensity",
+    (0x5F, 0x0D): "report_intensity",
+    (0x0F, 0x0E): "set_program",
+    (0x5F, 0x0E): "ack_set_program",
+    (0x0F, 0x0F): "query_program",
+    (0x5F, 0x0F): "report_program",
+}
+
+ACK_COMMANDS = frozenset(key for key, name in COMMAND_NAMES.items() if name.startswith("ack_"))
+QUERY_COMMANDS = frozenset(key for key, name in COMMAND_NAMES.items() if name.startswith("query_"))
+
+_MODES = {0x01: "manual", 0x02: "auto"}
+_CHANNELS = ("ch1", "ch2", "ch3", "ch4")
+
+
+def command_name(cmd_group: int, cmd_id: int) -> str:
+    return COMMAND_NAMES.get((cmd_group, cmd_id), f"unknown_{cmd_group:02x}_{cmd_id:02x}")
+
+
+def is_ack(frame: ParsedFrame) -> bool:
+    return (frame.cmd_group, frame.cmd_id) in ACK_COMMANDS
+
+
+def is_query(frame: ParsedFrame) -> bool:
+    """True for known read-only requests; unknown commands are not assumed safe."""
+    return (frame.cmd_group, frame.cmd_id) in QUERY_COMMANDS
+
+
+def decode_args(frame: ParsedFrame) -> dict[str, Any]:
+    """Best-effort meaning of a frame's args; empty when unknown or malformed."""
+    key = (frame.cmd_group & 0x0F, frame.cmd_id)
+    args = frame.args
+    if key in ((0x0F, 0x01), (0x0F, 0x02)) and len(args) == 1:
+        return {"mode": _MODES.get(args[0], f"unknown_{args[0]:02x}")}
+    if key in ((0x0F, 0x0B), (0x0F, 0x0C), (0x0F, 0x0D)) and len(args) == 4:
+        return dict(zip(_CHANNELS, args, strict=True))
+    if key in ((0x0F, 0x0E), (0x0F, 0x0F)):
+        if frame.cmd_group == 0x5F and key == (0x0F, 0x0E):
+            return {"ack": args.hex()}
+        if args and len(args) == 1 + args[0] * 7:
+            points = [
+                {
+                    "index": args[i],
+                    "hour": args[i + 1],
+                    "minute": args[i + 2],
+                    **dict(zip(_CHANNELS, args[i + 3 : i + 7], strict=True)),
+                }
+                for i in range(1, len(args), 7)
+            ]
+            return {"points": points}
+        return {}
+    if key == (0x01, 0x04) and args and len(args) >= 1 + args[0]:
+        return {"vendor_tag": args[1 : 1 + args[0]].decode("ascii", errors="replace")}
+    if key == (0x04, 0x01) and frame.cmd_group == 0x54 and len(args) >= 16:
+        triplet = list(args[13:16])
+        return {
+            "device_number": int.from_bytes(args[0:2], "big"),
+            "device_id": args[2:13].decode("ascii", errors="replace"),
+            "version_triplet_raw": triplet,
+            "software_version_guess": f"{triplet[0]}.{triplet[1]}",
+        }
+    return {}
+
+
+def describe(frame: ParsedFrame | KeepaliveFrame) -> dict[str, Any]:
+    """Flat, JSON-ready description of a decoded frame."""
+    if isinstance(frame, KeepaliveFrame):
+        return {"kind": "keepalive", "name": "keepalive", "raw": frame.raw.hex()}
+    return {
+        "kind": "response" if frame.cmd_group >= 0x50 else "request",
+        "name": command_name(frame.cmd_group, frame.cmd_id),
+        "device_id": frame.device_id,
+        "cmd_group": f"0x{frame.cmd_group:02x}",
+        "cmd_id": f"0x{frame.cmd_id:02x}",
+        "args": frame.args.hex(),
+        "decoded": decode_args(frame),
+    }
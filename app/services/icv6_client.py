@@ -1,29 +1,396 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import dataclass
+import contextlib
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from contextvars import ContextVar
 
+from app.metrics import (
+    ICV6_CONNECTS,
+    ICV6_RECONNECTS,
+    ICV6_REQUEST_SECONDS,
+    ICV6_TIMEOUTS,
+    label_byte,
+)
 from app.models import Intensity, Program, ProgramPoint
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.frame_decoder import (
+    DecoderStats,
+    FrameDecoder,
+    ParsedFrame,
+    build_frame,
+    parse_dd_frame,
+)
+from app.services.frame_log import FrameLog
+from app.tracing import add_device_time
 
-MAGIC_DD = bytes.fromhex("ddeeff")
-MAGIC_FF = bytes.fromhex("ffeeddcc")
+logger = logging.getLogger(__name__)
 
+FrameSubscriber = Callable[[ParsedFrame], None]
+ResponseKey = tuple[str, int, int]
 
-@dataclass
-class ParsedFrame:
-    raw: bytes
-    cmd_group: int
-    cmd_id: int
-    args: bytes
-    device_id: str
+# The breaker whose admission the current task's requests share (see breaker_call).
+_breaker_call: ContextVar[CircuitBreaker | None] = ContextVar("icv6_breaker_call", default=None)
+
+
+class ICV6Session:
+    """Long-lived, pipelined TCP session to one ICV6 endpoint.
+
+    Several requests may be in flight on the socket at once, for any of the devices behind
+    the ICV6. A background reader decodes the stream, drops keepalive frames and resolves
+    the oldest request waiting for each response ``(device_id, group, id)``. Frames nobody
+    is waiting for go to ``frame_log`` and the subscribers. The socket is reopened on demand after EOF, a
+    timeout or an idle close.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout: float,
+        idle_timeout: float,
+        frame_log: FrameLog | None = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        # Responses are logged by the requesting client, which knows their request id.
+        self.frame_log = frame_log
+        self._connect_lock = asyncio.Lock()
+        # Requests that find the socket down all wait on one connect attempt.
+        self._connecting: asyncio.Task[tuple[asyncio.StreamWriter, int]] | None = None
+        self._write_lock = asyncio.Lock()
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        self._generation = 0
+        self._pending: dict[ResponseKey, deque[asyncio.Future[ParsedFrame]]] = {}
+        self._subscribers: list[FrameSubscriber] = []
+        self._in_flight = 0
+        self._idle_handle: asyncio.TimerHandle | None = None
+        # Held so the loop's weak task reference cannot drop an idle close mid-way.
+        self._idle_close_task: asyncio.Task[None] | None = None
+        self._last_used = 0.0
+        self._last_rx = 0.0
+        self.stats = DecoderStats()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not (
+            self._reader_task is None or self._reader_task.done()
+        )
+
+    def subscribe(self, callback: FrameSubscriber) -> Callable[[], None]:
+        """Register a callback for unsolicited frames; returns an unsubscribe function."""
+        self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with contextlib.suppress(ValueError):
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    async def request(
+        self,
+        frame: bytes,
+        device_id: str,
+        expect_group: int,
+        expect_id: int,
+        timeout: float | None = None,
+    ) -> ParsedFrame:
+        self._cancel_idle()
+        self._in_flight += 1
+        try:
+            retried = False
+            while True:
+                reused = self.connected
+                writer, generation = await self._ensure_connected()
+                sent_at = asyncio.get_running_loop().time()
+                try:
+                    return await self._exchange(
+                        writer, frame, (device_id, expect_group, expect_id), timeout
+                    )
+                except TimeoutError:
+                    # If the ICV6 kept talking, only this device is silent; the shared
+                    # socket is healthy and other devices' requests must not be dropped.
+                    if self._last_rx > sent_at and generation == self._generation:
+                        raise
+                    await self._disconnect(generation)
+                    if not reused or retried:
+                        raise
+                    retried = True
+                    ICV6_RECONNECTS.inc()
+                    logger.info("icv6 session stalled, reconnecting to %s:%s", self.host, self.port)
+                except OSError:
+                    await self._disconnect(generation)
+                    # A reused socket may have been dropped by the device while idle;
+                    # retry once on a fresh one. Fresh connect failures are final.
+                    if not reused or retried:
+                        raise
+                    retried = True
+                    ICV6_RECONNECTS.inc()
+                    logger.info("icv6 session lost, reconnecting to %s:%s", self.host, self.port)
+        finally:
+            self._in_flight -= 1
+            self._last_used = asyncio.get_running_loop().time()
+            if self._in_flight == 0:
+                self._schedule_idle()
+
+    async def close(self) -> None:
+        self._cancel_idle()
+        task, self._idle_close_task = self._idle_close_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        async with self._connect_lock:
+            await self._disconnect(self._generation)
+
+    async def _exchange(
+        self,
+        writer: asyncio.StreamWriter,
+        frame: bytes,
+        key: ResponseKey,
+        timeout: float | None = None,
+    ) -> ParsedFrame:
+        future: asyncio.Future[ParsedFrame] = asyncio.get_running_loop().create_future()
+        waiters = self._pending.setdefault(key, deque())
+        waiters.append(future)
+        try:
+            async with asyncio.timeout(self.timeout if timeout is None else timeout):
+                async with self._write_lock:
+                    writer.write(frame)
+                    await writer.drain()
+                return await future
+        finally:
+            # On timeout/cancel, make sure a late response is not routed to a dead waiter.
+            if not future.done():
+                future.cancel()
+            with contextlib.suppress(ValueError):
+                waiters.remove(future)
+            if not waiters and self._pending.get(key) is waiters:
+                del self._pending[key]
+
+    async def _ensure_connected(self) -> tuple[asyncio.StreamWriter, int]:
+        if self.connected and self._writer is not None:
+            return self._writer, self._generation
+        if self._connecting is None or self._connecting.done():
+            self._connecting = asyncio.create_task(self._connect())
+            # Retrieve the exception even if every waiter was cancelled.
+            self._connecting.add_done_callback(lambda t: t.cancelled() or t.exception())
+        # Waiters share the attempt's outcome; a failed connect is not retried per waiter.
+        return await asyncio.shield(self._connecting)
+
+    async def _connect(self) -> tuple[asyncio.StreamWriter, int]:
+        async with self._connect_lock:
+            if self.connected and self._writer is not None:
+                return self._writer, self._generation
+            await self._disconnect(self._generation)
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.timeout
+            )
+            ICV6_CONNECTS.inc()
+            self._generation += 1
+            self._writer = writer
+            self._reader_task = asyncio.create_task(
+                self._read_loop(reader), name="icv6-session-reader"
+            )
+            logger.debug("icv6 session connected to %s:%s", self.host, self.port)
+            return writer, self._generation
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        decoder = FrameDecoder(stats=self.stats)
+        try:
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    break
+                self._last_rx = asyncio.get_running_loop().time()
+                for parsed in decoder.feed(chunk):
+                    if isinstance(parsed, ParsedFrame):
+                        self._dispatch(parsed)
+        except OSError as exc:
+            logger.debug("icv6 session read failed: %s", exc)
+        finally:
+            self._fail_pending(ConnectionError("connection closed before expected response"))
+
+    def _dispatch(self, parsed: ParsedFrame) -> None:
+        waiters = self._pending.get((parsed.device_id, parsed.cmd_group, parsed.cmd_id))
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(parsed)
+                return
+        if self.frame_log is not None:
+            self.frame_log.unsolicited(parsed)
+        for callback in list(self._subscribers):
+            try:
+                callback(parsed)
+            except Exception:  # noqa: BLE001
+                logger.exception("icv6 frame subscriber failed")
+
+    def _fail_pending(self, exc: Exception) -> None:
+        for waiters in self._pending.values():
+            for future in waiters:
+                if not future.done():
+                    future.set_exception(exc)
+        self._pending.clear()
+
+    async def _disconnect(self, generation: int) -> None:
+        # Only tear down the connection the caller was using, not a newer one.
+        if generation != self._generation:
+            return
+        task, writer = self._reader_task, self._writer
+        self._reader_task = None
+        self._writer = None
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._fail_pending(ConnectionError("connection closed before expected response"))
+        if writer is not None:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+    def _schedule_idle(self) -> None:
+        if self.idle_timeout <= 0 or not self.connected:
+            return
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(self.idle_timeout, self._on_idle)
+
+    def _cancel_idle(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _on_idle(self) -> None:
+        self._idle_handle = None
+        self._idle_close_task = asyncio.create_task(self._close_if_idle())
+        self._idle_close_task.add_done_callback(self._idle_close_done)
+
+    @staticmethod
+    def _idle_close_done(task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("idle close of icv6 session failed", exc_info=task.exception())
+
+    async def _close_if_idle(self) -> None:
+        async with self._connect_lock:
+            idle_for = asyncio.get_running_loop().time() - self._last_used
+            if self.connected and self._in_flight == 0 and idle_for >= self.idle_timeout:
+                logger.debug("closing idle icv6 session to %s:%s", self.host, self.port)
+                await self._disconnect(self._generation)
+
+
+class ICV6SessionPool:
+    """One shared session per ICV6 ``host:port``, however many device ids sit behind it."""
+
+    def __init__(
+        self, timeout: float = 2.0, idle_timeout: float = 30.0, frame_log: FrameLog | None = None
+    ) -> None:
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.frame_log = frame_log
+        self._sessions: dict[tuple[str, int], ICV6Session] = {}
+
+    def get(self, host: str, port: int) -> ICV6Session:
+        session = self._sessions.get((host, port))
+        if session is None:
+            session = ICV6Session(host, port, self.timeout, self.idle_timeout, self.frame_log)
+            self._sessions[(host, port)] = session
+        return session
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
 
 
 class ICV6Client:
-    def __init__(self, host: str, port: int, device_id: str, timeout: float = 2.0) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        device_id: str,
+        timeout: float = 2.0,
+        persistent: bool = False,
+        idle_timeout: float = 30.0,
+        session: ICV6Session | None = None,
+        breaker: CircuitBreaker | None = None,
+        frame_log: FrameLog | None = None,
+    ) -> None:
         self.host = host
         self.port = port
         self.device_id = device_id
         self.timeout = timeout
+        # A session passed in is shared with other devices behind the same ICV6 and is
+        # owned (and closed) by whoever created it.
+        self._owns_session = session is None and persistent
+        if session is None and persistent:
+            session = ICV6Session(host, port, timeout, idle_timeout, frame_log)
+        self._session = session
+        self._stats = DecoderStats()
+        if breaker is None:
+            # Requests on a shared session keep honouring that session's timeout.
+            max_timeout = session.timeout if session is not None else timeout
+            breaker = CircuitBreaker(device_id, max_timeout=max_timeout)
+        self.breaker = breaker
+        self.frame_log = frame_log
+
+    @property
+    def stats(self) -> DecoderStats:
+        """Decoder counters for this client's connection(s); shared with a shared session."""
+        return self._session.stats if self._session is not None else self._stats
+
+    @property
+    def pipelined(self) -> bool:
+        """True when concurrent requests share one pipelined session."""
+        return self._session is not None
+
+    def subscribe(self, callback: FrameSubscriber) -> Callable[[], None]:
+        """Receive frames the device sends without a matching in-flight request."""
+        if self._session is None:
+            raise RuntimeError("frame subscriptions require a persistent session")
+
+        def for_this_device(frame: ParsedFrame) -> None:
+            if frame.device_id == self.device_id:
+                callback(frame)
+
+        return self._session.subscribe(for_this_device)
+
+    async def close(self) -> None:
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+
+    @contextlib.asynccontextmanager
+    async def breaker_call(self) -> AsyncIterator[None]:
+        """Count the requests made inside the block as one call for the circuit breaker.
+
+        A pipelined fan-out then takes a single half-open probe and settles as one success
+        or failure (the block raising), instead of one per frame. Each request still feeds
+        its command's RTT estimate.
+        """
+        breaker = self.breaker
+        if _breaker_call.get() is breaker:
+            yield
+            return
+        breaker.before_call()
+        token = _breaker_call.set(breaker)
+        try:
+            yield
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except Exception as exc:
+            breaker.record_failure(None, timed_out=isinstance(exc, TimeoutError))
+            raise
+        else:
+            breaker.record_success(None)
+        finally:
+            _breaker_call.reset(token)
 
     async def query_mode(self) -> str:
         response = await self._request(0x0F, 0x01, b"", expect_group=0x5F, expect_id=0x01)
@@ -65,15 +432,65 @@ class ICV6Client:
     async def _request(
         self, cmd_group: int, cmd_id: int, args: bytes, expect_group: int, expect_id: int
     ) -> ParsedFrame:
+        # Build first: an encoding error must not claim the breaker's half-open probe.
         frame = self._build_frame(cmd_group, cmd_id, args)
+        breaker = self.breaker
+        # Inside breaker_call the block is admitted and settled as a whole.
+        grouped = _breaker_call.get() is breaker
+        if not grouped:
+            breaker.before_call()
+        timeout = breaker.timeout_for(cmd_id)
+        frame_log = self.frame_log
+        log_id = frame_log.sent(frame) if frame_log is not None else 0
+        started = time.monotonic()
+        try:
+            response = await self._send(frame, expect_group, expect_id, timeout)
+        except asyncio.CancelledError:
+            if not grouped:
+                breaker.abandon()
+            if frame_log is not None:
+                frame_log.failed(log_id, timed_out=False)
+            raise
+        except Exception as exc:
+            timed_out = isinstance(exc, TimeoutError)
+            if timed_out:
+                ICV6_TIMEOUTS.inc(label_byte(cmd_group), label_byte(cmd_id))
+            if not grouped:
+                breaker.record_failure(cmd_id, timed_out=timed_out)
+            elif timed_out:
+                breaker.observe_timeout(cmd_id)
+            if frame_log is not None:
+                frame_log.failed(log_id, timed_out=timed_out)
+            raise
+        finally:
+            add_device_time(time.monotonic() - started)
+        elapsed = time.monotonic() - started
+        if grouped:
+            breaker.observe_rtt(cmd_id, elapsed)
+        else:
+            breaker.record_success(cmd_id, elapsed)
+        ICV6_REQUEST_SECONDS.observe(elapsed, label_byte(cmd_group), label_byte(cmd_id))
+        if frame_log is not None:
+            frame_log.received(log_id, response)
+        return response
+
+    async def _send(
+        self, frame: bytes, expect_group: int, expect_id: int, timeout: float
+    ) -> ParsedFrame:
+        if self._session is not None:
+            return await self._session.request(
+                frame, self.device_id, expect_group, expect_id, timeout=timeout
+            )
+
         reader, writer = await asyncio.wait_for(
             asyncio.open_connection(self.host, self.port), timeout=self.timeout
         )
+        ICV6_CONNECTS.inc()
         try:
             writer.write(frame)
             await writer.drain()
             parsed = await asyncio.wait_for(
-                self._read_expected(reader, expect_group, expect_id), timeout=self.timeout
+                self._read_expected(reader, expect_group, expect_id), timeout=timeout
             )
             return parsed
         finally:
@@ -83,77 +500,25 @@ class ICV6Client:
     async def _read_expected(
         self, reader: asyncio.StreamReader, expect_group: int, expect_id: int
     ) -> ParsedFrame:
-        buf = bytearray()
+        decoder = FrameDecoder(stats=self._stats)
         while True:
             chunk = await reader.read(4096)
             if not chunk:
                 raise RuntimeError("connection closed before expected response")
-            buf.extend(chunk)
-
-            while True:
-                if len(buf) < 5:
-                    break
 
-                # Skip keepalive family if it appears.
-                if buf[:4] == MAGIC_FF:
-                    if len(buf) < 9:
-                        break
-                    del buf[:9]
+            for parsed in decoder.feed(chunk):
+                if not isinstance(parsed, ParsedFrame):
                     continue
-
-                start = bytes(buf).find(MAGIC_DD)
-                if start < 0:
-                    buf.clear()
-                    break
-                if start > 0:
-                    del buf[:start]
-                    if len(buf) < 5:
-                        break
-
-                frame_len = buf[4]
-                total_len = 5 + frame_len
-                if len(buf) < total_len:
-                    break
-
-                raw = bytes(buf[:total_len])
-                del buf[:total_len]
-
-                parsed = self._parse_dd_frame(raw)
                 if parsed.cmd_group == expect_group and parsed.cmd_id == expect_id:
                     return parsed
+                if self.frame_log is not None:
+                    self.frame_log.unsolicited(parsed)
 
     def _build_frame(self, cmd_group: int, cmd_id: int, args: bytes) -> bytes:
-        if len(self.device_id) != 11:
-            raise ValueError(f"device id must be 11 chars on wire, got {self.device_id}")
-
-        body = (
-            bytes([0xFF]) + self.device_id.encode("ascii") + bytes([0x01, cmd_group, cmd_id]) + args
-        )
-        len_field = len(body) + 1
-        checksum = (len_field + sum(body)) & 0xFF
-        return MAGIC_DD + bytes([0x00, len_field]) + body + bytes([checksum])
+        return build_frame(self.device_id, cmd_group, cmd_id, args)
 
     def _parse_dd_frame(self, raw: bytes) -> ParsedFrame:
-        if len(raw) < 21 or raw[:3] != MAGIC_DD:
-            raise RuntimeError("invalid frame header")
-
-        expected_len = 5 + raw[4]
-        if len(raw) != expected_len:
-            raise RuntimeError("invalid frame length")
-
-        body = raw[5:-1]
-        checksum = raw[-1]
-        calc = (raw[4] + sum(body)) & 0xFF
-        if checksum != calc:
-            raise RuntimeError("bad checksum")
-
-        cmd_group = raw[18]
-        cmd_id = raw[19]
-        args = raw[20:-1]
-        device_id = raw[6:17].decode("ascii", errors="replace")
-        return ParsedFrame(
-            raw=raw, cmd_group=cmd_group, cmd_id=cmd_id, args=args, device_id=device_id
-        )
+        return parse_dd_frame(raw)
 
     def _decode_program_args(self, args: bytes) -> Program:
         if not args:
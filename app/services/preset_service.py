@@ -5,11 +5,18 @@ import sqlite3
 from app import db
 from app.errors import NotFoundError, ValidationError
 from app.models import PresetCreateRequest
+from app.services.program_analytics import target_analytics
 
 
 class PresetService:
-    async def list_presets(self) -> list[dict]:
-        return await db.list_presets()
+    async def list_presets(self, include_analytics: bool = False) -> list[dict]:
+        presets = await db.list_presets()
+        if include_analytics:
+            for preset in presets:
+                preset["analytics"] = target_analytics(
+                    preset["mode"], preset["intensity"], preset["program"]
+                )
+        return presets
 
     async def create_preset(self, payload: PresetCreateRequest) -> int:
         if payload.mode == "manual" and not payload.intensity:
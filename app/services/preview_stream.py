@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+
+from app.models import Intensity
+from app.services.icv6_client import ICV6Client
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewStreamer:
+    """Forward live preview intensities to the lamp at a bounded frame rate.
+
+    Only the latest submitted value is kept; values that arrive while a frame is waiting
+    for its send slot replace it and are counted as dropped, never queued.
+    """
+
+    def __init__(self, client: ICV6Client, max_rate: float) -> None:
+        self.client = client
+        self.min_interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.sent = 0
+        self.dropped = 0
+        self._pending: Intensity | None = None
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._last_sent_at = 0.0
+
+    def submit(self, intensity: Intensity) -> None:
+        if self._pending is not None:
+            self.dropped += 1
+        self._pending = intensity
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="preview-streamer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+        self._pending = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            delay = self._last_sent_at + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            intensity, self._pending = self._pending, None
+            if intensity is None:
+                continue
+            try:
+                await self.client.set_preview_intensity(intensity)
+                self.sent += 1
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("failed to send preview intensity: %s", exc)
+            self._last_sent_at = time.monotonic()
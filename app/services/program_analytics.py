@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+
+from app.models import Intensity, Program, ProgramPoint
+from app.services.program_curve import (
+    CHANNELS,
+    Knot,
+    program_digest,
+    program_knots,
+    sample_knots,
+)
+
+# Analytics integrate the curve at one-minute steps, the finest resolution a point can have.
+_RESOLUTION_MINUTES = 1.0
+
+
+def program_analytics(program: Program) -> dict[str, Any]:
+    """Per-channel daily dose, peak, photoperiod and ramp rates for an auto program.
+
+    Memoized by program content, so listing the same presets again costs a dict lookup.
+    """
+    return _analytics(program_digest(program), program_knots(program.points))
+
+
+def intensity_analytics(intensity: Intensity) -> dict[str, Any]:
+    """Analytics of a manual setting, i.e. a flat curve at the given levels all day."""
+    return program_analytics(
+        Program(points=[ProgramPoint(index=1, hour=0, minute=0, **intensity.model_dump())])
+    )
+
+
+def target_analytics(
+    mode: str, intensity: dict[str, Any] | None, program: dict[str, Any] | None
+) -> dict[str, Any] | None:
+    """Analytics for a stored preset or active target, ``None`` if it has no payload."""
+    if mode == "manual" and intensity:
+        return intensity_analytics(Intensity(**intensity))
+    if mode == "auto" and program:
+        return program_analytics(Program(**program))
+    return None
+
+
+@lru_cache(maxsize=256)
+def _analytics(digest: str, knots: tuple[Knot, ...]) -> dict[str, Any]:
+    curve = sample_knots(knots, _RESOLUTION_MINUTES)
+    step_hours = _RESOLUTION_MINUTES / 60
+    channels: dict[str, dict[str, float]] = {}
+    for ch in CHANNELS:
+        values = curve.values[ch]
+        dose = 0.0
+        peak = 0.0
+        lit = 0
+        ramp_up = 0.0
+        ramp_down = 0.0
+        prev = values[-1]  # the day wraps, so the first step starts from the last sample
+        for value in values:
+            dose += value
+            if value > peak:
+                peak = value
+            if value > 0:
+                lit += 1
+            delta = value - prev
+            if delta > ramp_up:
+                ramp_up = delta
+            elif delta < ramp_down:
+                ramp_down = delta
+            prev = value
+        channels[ch] = {
+            "daily_dose_percent_hours": round(dose * step_hours, 3),
+            "peak_percent": round(peak, 3),
+            "photoperiod_minutes": lit * _RESOLUTION_MINUTES,
+            "max_ramp_up_percent_per_hour": round(ramp_up / step_hours, 3),
+            "max_ramp_down_percent_per_hour": round(-ramp_down / step_hours, 3),
+        }
+    return {"digest": digest, "channels": channels}
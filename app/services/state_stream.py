@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections.abc import AsyncIterator
+from typing import Any
+
+from app import db
+from app.services.device_service import DeviceService
+
+logger = logging.getLogger(__name__)
+
+StreamEvent = dict[str, Any]
+
+
+def format_sse(event: StreamEvent) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class StateBroadcaster:
+    """Single server-side poller fanning device and validation changes out to subscribers.
+
+    The poll loop only runs while at least one subscriber is connected, reads the device
+    through the shared state cache and publishes an event only when something changed, so
+    the device load does not grow with the number of open dashboards.
+    """
+
+    def __init__(
+        self, device_service: DeviceService, interval: float, queue_size: int = 16
+    ) -> None:
+        self.device_service = device_service
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue[StreamEvent | None]] = set()
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._last: dict[str, StreamEvent] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue[StreamEvent | None]:
+        queue: asyncio.Queue[StreamEvent | None] = asyncio.Queue(maxsize=self.queue_size)
+        # New clients get the last known snapshot straight away.
+        for event in self._last.values():
+            queue.put_nowait(event)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="state-broadcaster")
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[StreamEvent | None]) -> None:
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self._wake.set()
+
+    async def stream(self, keepalive: float = 15.0) -> AsyncIterator[str]:
+        """Yield SSE-formatted events for one client until it disconnects."""
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                yield format_sse(event)
+        finally:
+            self.unsubscribe(queue)
+
+    def poke(self) -> None:
+        """Poll now instead of waiting for the next interval (e.g. after a write)."""
+        self._wake.set()
+
+    async def stop(self) -> None:
+        for queue in list(self._subscribers):
+            self._put(queue, None)
+        self._subscribers.clear()
+        self._wake.set()
+        if self._task is not None:
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+    async def poll_once(self) -> None:
+        try:
+            state = await self.device_service.get_state(max_age=self.interval)
+            self._publish({"event": "state", "data": state.model_dump()})
+        except Exception as exc:  # noqa: BLE001
+            self._publish({"event": "device_error", "data": {"error": str(exc)}})
+
+        try:
+            latest = await db.latest_validation_run()
+        except Exception:  # noqa: BLE001
+            logger.exception("failed to read latest validation run")
+        else:
+            if latest is not None:
+                self._publish({"event": "validation", "data": latest})
+
+    async def _run(self) -> None:
+        while self._subscribers:
+            self._wake.clear()
+            await self.poll_once()
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+
+    def _publish(self, event: StreamEvent) -> None:
+        name = event["event"]
+        # Device errors and state share one slot so a recovery is always re-announced.
+        key = "state" if name == "device_error" else name
+        if self._last.get(key) == event:
+            return
+        self._last[key] = event
+        for queue in self._subscribers:
+            self._put(queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue[StreamEvent | None], event: StreamEvent | None) -> None:
+        # Slow clients lose their oldest pending event rather than stalling the poller.
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
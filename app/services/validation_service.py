@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+from datetime import UTC, datetime
+
 from app import db
+from app.errors import ValidationError
 from app.models import ValidationPollingConfigRequest
 from app.services.validator import ProgramValidator
 
@@ -15,8 +18,42 @@ class ValidationService:
     async def latest(self) -> dict | None:
         return await db.latest_validation_run()
 
+    async def list_runs(
+        self,
+        limit: int,
+        before_id: int | None = None,
+        statuses: list[str] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        include_details: bool = True,
+    ) -> dict:
+        if since is not None and until is not None and since >= until:
+            raise ValidationError("since must be earlier than until")
+        # Fetch one extra row to learn whether another page exists.
+        runs = await db.list_validation_runs(
+            limit + 1,
+            before_id=before_id,
+            statuses=statuses,
+            since=_as_utc_iso(since),
+            until=_as_utc_iso(until),
+            include_details=include_details,
+        )
+        next_before_id = runs[limit - 1]["id"] if len(runs) > limit else None
+        return {"runs": runs[:limit], "next_before_id": next_before_id}
+
     async def get_polling_config(self) -> dict:
         return await db.get_validation_polling_config()
 
     async def set_polling_config(self, payload: ValidationPollingConfigRequest) -> dict:
-        return await db.set_validation_polling_config(payload.enabled, payload.interval_minutes)
+        config = await db.set_validation_polling_config(payload.enabled, payload.interval_minutes)
+        self.validator.update_config(config)
+        return config
+
+
+def _as_utc_iso(value: datetime | None) -> str | None:
+    # checked_at is stored as UTC isoformat, so range bounds must use the same form.
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return value.astimezone(UTC).isoformat()
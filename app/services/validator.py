@@ -1,20 +1,87 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
+import random
+import time
 from typing import Any
 
 from app import db
+from app.metrics import VALIDATOR_CYCLE_SECONDS, VALIDATOR_RUNS
+from app.models import Program
+from app.services.device_service import DeviceService
 from app.services.icv6_client import ICV6Client
 
 logger = logging.getLogger(__name__)
 
+_POINT_FIELDS = ("hour", "minute", "ch1", "ch2", "ch3", "ch4")
+
+
+def mismatched_fields(expected: dict[str, Any], reported: dict[str, Any]) -> list[dict[str, Any]]:
+    """Per-point differences between two program payloads, matched by point index."""
+    want = {p["index"]: p for p in expected.get("points", [])}
+    got = {p["index"]: p for p in reported.get("points", [])}
+    diffs: list[dict[str, Any]] = []
+    for index in sorted(want.keys() | got.keys()):
+        a, b = want.get(index), got.get(index)
+        if a is None or b is None:
+            diffs.append({"index": index, "field": "point", "expected": a, "reported": b})
+            continue
+        diffs.extend(
+            {"index": index, "field": f, "expected": a[f], "reported": b[f]}
+            for f in _POINT_FIELDS
+            if a[f] != b[f]
+        )
+    return diffs
+
 
 class ProgramValidator:
-    def __init__(self, client: ICV6Client) -> None:
+    """Background drift check with an adaptive schedule.
+
+    After a device write or a mismatch the next check comes after ``fast_interval``
+    seconds. While results stay ok (or the device is unreachable) the delay doubles from
+    the configured interval up to ``max_interval``, with random jitter so a fleet of
+    validators does not poll in lockstep. The polling config is cached and the loop is
+    woken by ``update_config`` instead of re-reading it every cycle.
+
+    With ``auto_heal`` a mismatch re-uploads the expected program, at most once per
+    ``heal_interval`` and ``heal_max_attempts`` times until a check comes back ok. Heals
+    go through ``device_service`` and every program read is reported to it, so its state
+    cache, sync digest and write listeners follow what the device actually holds.
+    """
+
+    def __init__(
+        self,
+        client: ICV6Client,
+        device_service: DeviceService | None = None,
+        compaction_interval: float = 3600.0,
+        fast_interval: float = 30.0,
+        max_interval: float = 3600.0,
+        jitter: float = 0.1,
+        auto_heal: bool = False,
+        heal_interval: float = 300.0,
+        heal_max_attempts: int = 3,
+    ) -> None:
         self.client = client
+        self.device_service = device_service or DeviceService(client)
+        self.compaction_interval = compaction_interval
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.auto_heal = auto_heal
+        self.heal_interval = heal_interval
+        self.heal_max_attempts = heal_max_attempts
+        self._heal_attempts = 0
+        self._last_heal_at: float | None = None
         self._task: asyncio.Task | None = None
         self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._last_compaction: float | None = None
+        self._config: dict[str, Any] | None = None
+        self._backoff = 0
+        self._next_run_at = 0.0
+        self._last_write_at = 0.0
 
     def start(self) -> None:
         if self._task and not self._task.done():
@@ -24,10 +91,49 @@ class ProgramValidator:
 
     async def stop(self) -> None:
         self._stop.set()
+        self._wake.set()
         if self._task:
             await self._task
         self._task = None
 
+    def update_config(self, config: dict[str, Any]) -> None:
+        """Apply a new polling config; a shorter interval or re-enabling takes effect now."""
+        was_enabled = self._config is not None and self._config["enabled"]
+        self._config = config
+        self._backoff = 0
+        now = time.monotonic()
+        if config["enabled"] and not was_enabled:
+            self._next_run_at = now
+        else:
+            self._next_run_at = min(self._next_run_at, now + self._base_interval())
+        self._wake.set()
+
+    def notify_write(self) -> None:
+        """Check soon after the device was written, when drift is most likely."""
+        self._backoff = 0
+        self._last_write_at = time.monotonic()
+        self._next_run_at = min(self._next_run_at, self._last_write_at + self.fast_interval)
+        self._wake.set()
+
+    def _base_interval(self) -> float:
+        minutes = (self._config or {}).get("interval_minutes", 1)
+        return max(1, int(minutes)) * 60.0
+
+    def _schedule_after(self, status: str, cycle_started: float) -> None:
+        base = self._base_interval()
+        if status == "mismatch":
+            self._backoff = 0
+            delay = min(self.fast_interval, base)
+        else:
+            delay = min(base * 2**self._backoff, max(base, self.max_interval))
+            self._backoff += 1
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self._next_run_at = time.monotonic() + delay
+        if self._last_write_at >= cycle_started:
+            # A write landed while this check was running; it still deserves a fast look.
+            self._backoff = 0
+            self._next_run_at = min(self._next_run_at, self._last_write_at + self.fast_interval)
+
     async def run_once(self) -> dict[str, Any]:
         target = await db.get_active_target()
         if not target or not target.get("program"):
@@ -46,6 +152,7 @@ class ProgramValidator:
             return result
 
         reported_program = await self.client.query_program()
+        self.device_service.observed_program(reported_program)
         reported = {"points": [p.model_dump() for p in reported_program.points]}
         expected = target["program"]
         matches = reported == expected
@@ -54,26 +161,90 @@ class ProgramValidator:
             "expected": expected,
             "reported": reported,
         }
+        if matches:
+            self._heal_attempts = 0
+        else:
+            result["mismatched"] = mismatched_fields(expected, reported)
+            if self.auto_heal:
+                result["heal"] = await self._heal(expected)
         await db.insert_validation_run("ok" if matches else "mismatch", result)
         return result
 
+    async def _heal(self, expected: dict[str, Any]) -> dict[str, Any]:
+        """Re-upload the expected program, bounded per drift episode and in rate."""
+        now = time.monotonic()
+        if self._heal_attempts >= self.heal_max_attempts:
+            return {"status": "gave_up", "attempts": self._heal_attempts}
+        if self._last_heal_at is not None and now - self._last_heal_at < self.heal_interval:
+            return {"status": "rate_limited", "attempts": self._heal_attempts}
+        self._heal_attempts += 1
+        self._last_heal_at = now
+
+        outcome: dict[str, Any] = {"attempts": self._heal_attempts}
+        try:
+            ack = await self.device_service.set_program(Program(**expected), sync=False)
+            # Only the program needs re-reading; mode was checked moments ago.
+            healed = await self.client.query_program()
+            self.device_service.observed_program(healed)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("auto-heal upload failed: %s", exc)
+            return {**outcome, "status": "failed", "error": str(exc)}
+
+        reported = {"points": [p.model_dump() for p in healed.points]}
+        if reported != expected:
+            return {**outcome, "status": "failed", "ack": ack, "reported": reported}
+        logger.info("auto-healed program drift", extra={"attempts": self._heal_attempts})
+        self._heal_attempts = 0
+        return {**outcome, "status": "healed", "ack": ack}
+
+    async def _maybe_compact(self) -> None:
+        now = time.monotonic()
+        if self._last_compaction is not None and (
+            now - self._last_compaction < self.compaction_interval
+        ):
+            return
+        self._last_compaction = now
+        try:
+            removed = await db.compact_validation_runs()
+        except Exception:  # noqa: BLE001
+            logger.exception("validation history compaction failed")
+            return
+        if any(removed.values()):
+            logger.info("compacted validation history", extra=removed)
+
     async def _run(self) -> None:
+        if self._config is None:
+            self._config = await db.get_validation_polling_config()
+            self._next_run_at = time.monotonic()
         while not self._stop.is_set():
-            config = await db.get_validation_polling_config()
-            enabled = bool(config.get("enabled", True))
-            interval_minutes = max(1, int(config.get("interval_minutes", 1)))
+            # Retention runs on its own schedule, whether or not polling is enabled.
+            await self._maybe_compact()
+            enabled = bool(self._config.get("enabled", True))
+            delay = self._next_run_at - time.monotonic() if enabled else None
+            if delay is None or delay > 0:
+                # Sleep until the next check or compaction, or until update_config (or
+                # stop) wakes the loop.
+                assert self._last_compaction is not None
+                until_compaction = (
+                    self._last_compaction + self.compaction_interval - time.monotonic()
+                )
+                timeout = until_compaction if delay is None else min(delay, until_compaction)
+                self._wake.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, timeout))
+                continue
+
+            cycle_started = time.monotonic()
             try:
-                if enabled:
-                    await self.run_once()
-                else:
-                    logger.debug("validation polling disabled")
+                result = await self.run_once()
+                status = result["status"]
             except Exception as exc:  # noqa: BLE001
                 logger.exception("validation loop error")
+                status = "error"
                 await db.insert_validation_run(
                     "error",
                     {"error": str(exc), "error_type": type(exc).__name__, "error_repr": repr(exc)},
                 )
-            try:
-                await asyncio.wait_for(self._stop.wait(), timeout=interval_minutes * 60)
-            except TimeoutError:
-                pass
+            VALIDATOR_CYCLE_SECONDS.observe(time.monotonic() - cycle_started)
+            VALIDATOR_RUNS.inc(status)
+            self._schedule_after(status, cycle_started)
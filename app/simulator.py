@@ -0,0 +1,319 @@
+"""Local ICV6 simulator speaking the ``dd ee ff`` protocol from ``protocol.md``.
+
+Run ``python -m app.simulator --help`` (or ``just simulate``) and point ``ICV6_HOST`` /
+``ICV6_PORT`` at it, or use :class:`ICV6Simulator` from tests and benchmarks.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from app.services.frame_decoder import MAGIC_FF, FrameDecoder, ParsedFrame, build_frame
+
+logger = logging.getLogger(__name__)
+
+IDLE_KEEPALIVE = MAGIC_FF + bytes(5)
+VENDOR_TAG = b"maxspect"
+PROGRAM_ACK_OK = 0x01
+PROGRAM_ACK_REJECTED = 0x00
+
+
+@dataclass
+class SimulatorConfig:
+    """Network behaviour of the simulated ICV6."""
+
+    rtt: float = 0.0
+    jitter: float = 0.0
+    # Split every response write into chunks of this many bytes (0 keeps frames whole).
+    fragment_size: int = 0
+    drop_rate: float = 0.0
+    keepalive_interval: float = 0.0
+    seed: int | None = None
+
+
+@dataclass
+class SimulatedDevice:
+    """State of one lamp behind the ICV6, addressed by its 11-char device id."""
+
+    device_id: str
+    mode: str = "manual"
+    intensity: bytes = bytes(4)
+    preview: bytes | None = None
+    program: bytes = b"\x00"
+    requests: int = 0
+
+    def handle(self, cmd_group: int, cmd_id: int, args: bytes) -> bytes | None:
+        """Apply one command and return the response args, or ``None`` if unanswered."""
+        self.requests += 1
+        if cmd_group == 0x0F:
+            if cmd_id == 0x01:
+                return bytes([0x01 if self.mode == "manual" else 0x02])
+            if cmd_id == 0x02 and args:
+                self.mode = "manual" if args[0] == 0x01 else "auto"
+                return b""
+            if cmd_id == 0x0B and len(args) == 4:
+                self.preview = args
+                return b""
+            if cmd_id == 0x0C and len(args) == 4:
+                self.intensity = args
+                self.preview = None
+                return b""
+            if cmd_id == 0x0D:
+                return self.intensity
+            if cmd_id == 0x0E:
+                if not args or len(args) != 1 + args[0] * 7:
+                    return bytes([PROGRAM_ACK_REJECTED])
+                self.program = args
+                return bytes([PROGRAM_ACK_OK])
+            if cmd_id == 0x0F:
+                return self.program
+        if cmd_group == 0x01 and cmd_id == 0x04:
+            return bytes([len(VENDOR_TAG)]) + VENDOR_TAG
+        if cmd_group == 0x04 and cmd_id == 0x01:
+            number = int(self.device_id[-3:]) if self.device_id[-3:].isdigit() else 0
+            return (
+                number.to_bytes(2, "big")
+                + self.device_id.encode("ascii")
+                + bytes([0x02, 0x01, 0x01, 0x00, 0x00])
+            )
+        return None
+
+
+@dataclass
+class SimulatorStats:
+    connections: int = 0
+    requests: int = 0
+    responses: int = 0
+    dropped: int = 0
+    unknown_device: int = 0
+    keepalives_received: int = 0
+    keepalives_sent: int = 0
+    bytes_received: int = 0
+
+
+@dataclass
+class _Outgoing:
+    send_at: float
+    data: bytes
+
+
+@dataclass(eq=False)
+class _Connection:
+    writer: asyncio.StreamWriter
+    queue: asyncio.Queue[_Outgoing] = field(default_factory=asyncio.Queue)
+    last_send_at: float = 0.0
+    # Keeps a keepalive from landing between the fragments of a response.
+    write_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ICV6Simulator:
+    """Asyncio TCP server emulating an ICV6 with one or more lamps behind it.
+
+    Responses are delayed by ``rtt`` plus uniform ``jitter``, but leave each connection
+    in request order like the real controller. Responses can be randomly dropped and
+    written in small fragments to exercise the client's stream reassembly.
+
+    ``response_delay`` overrides the delay per request, e.g. to replay recorded round
+    trips; it returns seconds, or ``None`` to drop the response.
+    """
+
+    def __init__(
+        self,
+        device_ids: tuple[str, ...] | list[str] = ("R5S2A000188",),
+        config: SimulatorConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        response_delay: Callable[[ParsedFrame], float | None] | None = None,
+    ) -> None:
+        self.config = config or SimulatorConfig()
+        self.response_delay = response_delay
+        self.devices = {device_id: SimulatedDevice(device_id) for device_id in device_ids}
+        self.host = host
+        self.port = port
+        self.stats = SimulatorStats()
+        self._random = random.Random(self.config.seed)
+        self._server: asyncio.Server | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._connections: set[_Connection] = set()
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("icv6 simulator listening on %s:%s", self.host, self.port)
+        return self.port
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        for task in list(self._tasks):
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        await self._server.serve_forever()
+
+    async def __aenter__(self) -> ICV6Simulator:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.stop()
+
+    def push(self, frame: bytes) -> int:
+        """Send ``frame`` unprompted on every open connection; returns how many got it."""
+        now = time.monotonic()
+        for conn in self._connections:
+            # Queued behind pending responses, which keep their order.
+            conn.last_send_at = max(now, conn.last_send_at)
+            conn.queue.put_nowait(_Outgoing(conn.last_send_at, frame))
+        return len(self._connections)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        conn = _Connection(writer)
+        self._connections.add(conn)
+        sender = self._spawn(self._send_loop(conn))
+        keepalive = (
+            self._spawn(self._keepalive_loop(conn)) if self.config.keepalive_interval > 0 else None
+        )
+        decoder = FrameDecoder(include_keepalive=True)
+        try:
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    break
+                self.stats.bytes_received += len(chunk)
+                for frame in decoder.feed(chunk):
+                    if isinstance(frame, ParsedFrame):
+                        self._respond(conn, frame)
+                    else:
+                        self.stats.keepalives_received += 1
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(conn)
+            sender.cancel()
+            if keepalive is not None:
+                keepalive.cancel()
+            writer.close()
+            with contextlib.suppress(OSError, asyncio.CancelledError):
+                await writer.wait_closed()
+
+    def _respond(self, conn: _Connection, frame: ParsedFrame) -> None:
+        self.stats.requests += 1
+        device = self.devices.get(frame.device_id)
+        if device is None:
+            self.stats.unknown_device += 1
+            return
+        args = device.handle(frame.cmd_group, frame.cmd_id, frame.args)
+        if args is None:
+            return
+        delay = self._delay(frame)
+        if delay is None:
+            self.stats.dropped += 1
+            return
+        # Replies leave in request order, as from the real controller.
+        send_at = max(time.monotonic() + delay, conn.last_send_at)
+        conn.last_send_at = send_at
+        response = build_frame(frame.device_id, frame.cmd_group + 0x50, frame.cmd_id, args)
+        conn.queue.put_nowait(_Outgoing(send_at, response))
+
+    def _delay(self, frame: ParsedFrame) -> float | None:
+        if self.response_delay is not None:
+            return self.response_delay(frame)
+        if self.config.drop_rate > 0 and self._random.random() < self.config.drop_rate:
+            return None
+        delay = self.config.rtt
+        if self.config.jitter > 0:
+            delay = max(0.0, delay + self._random.uniform(-self.config.jitter, self.config.jitter))
+        return delay
+
+    async def _send_loop(self, conn: _Connection) -> None:
+        while True:
+            item = await conn.queue.get()
+            wait = item.send_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._write(conn, item.data)
+            self.stats.responses += 1
+
+    async def _keepalive_loop(self, conn: _Connection) -> None:
+        while True:
+            await asyncio.sleep(self.config.keepalive_interval)
+            await self._write(conn, IDLE_KEEPALIVE)
+            self.stats.keepalives_sent += 1
+
+    async def _write(self, conn: _Connection, data: bytes) -> None:
+        size = self.config.fragment_size
+        writer = conn.writer
+        async with conn.write_lock:
+            if size <= 0:
+                writer.write(data)
+                await writer.drain()
+                return
+            for start in range(0, len(data), size):
+                writer.write(data[start : start + size])
+                await writer.drain()
+                # Yield so each fragment goes out as its own segment.
+                await asyncio.sleep(0)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Simulate an ICV6 controller over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument(
+        "--device-id",
+        action="append",
+        dest="device_ids",
+        help="on-wire device id (repeat for several lamps; default R5S2A000188)",
+    )
+    parser.add_argument("--rtt-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fragment", type=int, default=0, help="bytes per response write")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="0..1 share of replies lost")
+    parser.add_argument("--keepalive", type=float, default=0.0, help="keepalive interval (s)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    simulator = ICV6Simulator(
+        tuple(args.device_ids or ["R5S2A000188"]),
+        SimulatorConfig(
+            rtt=args.rtt_ms / 1000,
+            jitter=args.jitter_ms / 1000,
+            fragment_size=args.fragment,
+            drop_rate=args.drop_rate,
+            keepalive_interval=args.keepalive,
+            seed=args.seed,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(simulator.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
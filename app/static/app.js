@@ -2,6 +2,7 @@ import { channelColors, channelLabels, channelRgb } from "./js/constants.js";
 import { createChartController } from "./js/chart-controller.js";
 import { api, withButtonFeedback } from "./js/http.js";
 import { createModal } from "./js/modal.js";
+import { createPreviewSender } from "./js/preview.js";
 
 let currentState = null;
 let chartController = null;
@@ -35,6 +36,7 @@ const uiModalInput = document.getElementById("ui-modal-input");
 const uiModalCancel = document.getElementById("ui-modal-cancel");
 const uiModalOk = document.getElementById("ui-modal-ok");
 let autoViewMode = "chart";
+const previewSender = createPreviewSender();
 
 function getProgramRowsData() {
   return [...programBody.querySelectorAll("tr")].map((row, idx) => {
@@ -120,6 +122,7 @@ function createSliderRow(label, value, idx) {
 
   range.addEventListener("input", () => {
     applyManualValue(range.value);
+    previewSender.send(collectIntensity());
   });
 
   row.appendChild(left);
@@ -377,6 +380,12 @@ function addProgramRow(p = null) {
         const out = el.closest(".intensity-editor")?.querySelector(".intensity-value");
         if (out) out.textContent = String(v);
         applyIntensityCellStyles(tr);
+        previewSender.send({
+          ch1: Number(tr.querySelector(".ch1")?.value) || 0,
+          ch2: Number(tr.querySelector(".ch2")?.value) || 0,
+          ch3: Number(tr.querySelector(".ch3")?.value) || 0,
+          ch4: Number(tr.querySelector(".ch4")?.value) || 0,
+        });
       }
       setHoveredFromRow();
       drawProgramChart(collectProgram(false).points);
@@ -539,7 +548,11 @@ const askText = modal.askText;
 const askConfirm = modal.askConfirm;
 
 async function refreshState() {
-  currentState = await api("/api/state");
+  renderState(await api("/api/state"));
+}
+
+function renderState(state) {
+  currentState = state;
   renderJSON(stateView, currentState);
   setActiveModeUI(currentState.mode);
   if (currentState.mode === "manual" && currentState.intensity) renderManual(currentState.intensity);
@@ -562,19 +575,23 @@ function setActiveModeUI(reportedMode) {
   }
 }
 
-function updateUnsavedIndicators() {
+function editorDirtyFlags() {
   const mode = String(currentState?.mode || "").toLowerCase();
   const deviceIntensity = canonicalIntensity(currentState?.intensity);
   const editorIntensity = canonicalIntensity(collectIntensity());
   const manualDirty =
-    mode === "manual" && deviceIntensity && JSON.stringify(deviceIntensity) !== JSON.stringify(editorIntensity);
-
-  if (manualUnsaved) manualUnsaved.classList.toggle("is-hidden", !manualDirty);
+    mode === "manual" && !!deviceIntensity && JSON.stringify(deviceIntensity) !== JSON.stringify(editorIntensity);
 
   const deviceProgram = canonicalProgramPoints(currentState?.program?.points || []);
   const editorProgram = canonicalProgramPoints(collectProgram(false).points || []);
   const autoDirty =
     mode === "auto" && deviceProgram.length > 0 && JSON.stringify(deviceProgram) !== JSON.stringify(editorProgram);
+  return { manualDirty, autoDirty };
+}
+
+function updateUnsavedIndicators() {
+  const { manualDirty, autoDirty } = editorDirtyFlags();
+  if (manualUnsaved) manualUnsaved.classList.toggle("is-hidden", !manualDirty);
 
   if (autoUnsaved) autoUnsaved.classList.toggle("is-hidden", !autoDirty);
   if (applyProgramBtn) {
@@ -633,6 +650,27 @@ function renderValidationBanner(latest) {
   validationText.textContent = `Validation status: ${status}`;
 }
 
+function applyPushedState(state) {
+  const { manualDirty, autoDirty } = editorDirtyFlags();
+  if (JSON.stringify(state) === JSON.stringify(currentState)) return;
+  // Never clobber edits in progress; only refresh the view and unsaved markers.
+  const modeChanged = state?.mode !== currentState?.mode;
+  if (modeChanged || (!manualDirty && !autoDirty)) {
+    renderState(state);
+    return;
+  }
+  currentState = state;
+  renderJSON(stateView, currentState);
+  updateUnsavedIndicators();
+}
+
+function connectEventStream() {
+  if (!window.EventSource) return;
+  const source = new EventSource("/api/events");
+  source.addEventListener("state", (ev) => applyPushedState(JSON.parse(ev.data)));
+  source.addEventListener("validation", (ev) => renderValidationBanner(JSON.parse(ev.data)));
+}
+
 for (const btn of document.querySelectorAll(".mode-btn")) {
   btn.addEventListener("click", async () => {
     await withButtonFeedback(btn, async () => {
@@ -791,6 +829,7 @@ modal.bindEvents();
 refreshState().catch((err) => renderJSON(stateView, { error: String(err) }));
 refreshValidation().catch(() => renderValidationBanner({ status: "error" }));
 refreshValidationPollingConfig().catch(() => {});
+connectEventStream();
 renderChartLegend();
 bindProgramChartInteractions();
 setAutoView("chart");
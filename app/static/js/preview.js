@@ -0,0 +1,29 @@
+import { api } from "./http.js";
+
+export function createPreviewSender(path = "/api/preview") {
+  let pending = null;
+  let inFlight = false;
+
+  // Keep at most one request in flight; newer values overwrite the pending one.
+  const pump = async () => {
+    if (inFlight || !pending) return;
+    inFlight = true;
+    const body = pending;
+    pending = null;
+    try {
+      await api(path, { method: "POST", body: JSON.stringify(body) });
+    } catch (_) {
+      // Preview is best effort; the next slider move retries.
+    } finally {
+      inFlight = false;
+      pump();
+    }
+  };
+
+  return {
+    send(values) {
+      pending = values;
+      pump();
+    },
+  };
+}
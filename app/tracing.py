@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import time
+from collections.abc import Callable
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi.routing import APIRoute
+
+
+@dataclass
+class RequestTrace:
+    """Where one HTTP request spent its time.
+
+    ``device`` and ``db`` are summed over every call made on the request's behalf, so
+    pipelined device queries can add up to more than the wall time they took.
+    """
+
+    started: float = field(default_factory=time.perf_counter)
+    device: float = 0.0
+    device_calls: int = 0
+    db: float = 0.0
+    db_calls: int = 0
+    endpoint_done: float | None = None
+
+    def breakdown(self, finished: float) -> dict[str, float]:
+        """Milliseconds per phase; ``serialize`` runs from endpoint return to response."""
+        total = finished - self.started
+        endpoint_done = self.endpoint_done if self.endpoint_done is not None else finished
+        serialize = finished - endpoint_done
+        app = max(0.0, endpoint_done - self.started - self.device - self.db)
+        return {
+            "device": round(self.device * 1000, 3),
+            "db": round(self.db * 1000, 3),
+            "app": round(app * 1000, 3),
+            "serialize": round(serialize * 1000, 3),
+            "total": round(total * 1000, 3),
+        }
+
+
+_current: ContextVar[RequestTrace | None] = ContextVar("request_trace", default=None)
+
+
+def start_trace() -> tuple[RequestTrace, Token[RequestTrace | None]]:
+    trace = RequestTrace()
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token[RequestTrace | None]) -> None:
+    _current.reset(token)
+
+
+def add_device_time(seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.device += seconds
+        trace.device_calls += 1
+
+
+def add_db_time(seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.db += seconds
+        trace.db_calls += 1
+
+
+def server_timing(breakdown: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in breakdown.items())
+
+
+def _mark_endpoint_done() -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.endpoint_done = time.perf_counter()
+
+
+def _traced_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    # FastAPI reads parameters from the signature; resolve it against the endpoint's own
+    # module now, since the wrapper lives here and postponed annotations would not resolve.
+    signature = inspect.signature(endpoint, eval_str=True)
+
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _mark_endpoint_done()
+
+        async_wrapper.__signature__ = signature  # type: ignore[attr-defined]
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _mark_endpoint_done()
+
+    wrapper.__signature__ = signature  # type: ignore[attr-defined]
+    return wrapper
+
+
+class TracedRoute(APIRoute):
+    """Route class that timestamps when the endpoint returns, to split off serialization."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, _traced_endpoint(endpoint), **kwargs)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Decode ICV6 protocol frames from a pcap/pcapng capture into TSV or JSON lines.
+
+Reads the capture block by block, reassembles TCP streams and runs them through the
+same frame decoder as the portal's client, writing one row per frame as it goes, so
+memory use stays flat regardless of capture size. No tshark required.
+
+Examples:
+    python scripts/decode_iot_frames.py capture.pcapng
+    python scripts/decode_iot_frames.py capture.pcapng --format json --pretty --stdout
+    python scripts/decode_iot_frames.py capture.pcapng --src 10.0.2.169 --dst 10.0.2.116
+    python scripts/decode_iot_frames.py capture.pcapng --format payloads --src 10.0.2.169
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, TextIO
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.capture_reader import (
+    CapturedFrame,
+    CaptureFormatError,
+    TcpReassembler,
+    decode_capture,
+    read_packets,
+    tcp_segment,
+)
+from app.services.frame_decoder import ParsedFrame
+from app.services.frame_semantics import describe, is_ack
+
+TSV_COLUMNS = (
+    "packet",
+    "time",
+    "direction",
+    "src",
+    "dst",
+    "name",
+    "device_id",
+    "cmd_group",
+    "cmd_id",
+    "args",
+    "decoded",
+)
+_SUFFIXES = {"tsv": "frames.tsv", "json": "frames.jsonl", "payloads": "payloads.tsv"}
+
+
+def _endpoint(host: str, port: int) -> str:
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+def frame_record(item: CapturedFrame, port: int, json_mode: str) -> dict[str, Any]:
+    record: dict[str, Any] = {
+        "packet": item.number,
+        "time": round(item.timestamp, 6),
+        "direction": "command" if item.dport == port else "response",
+        "src": _endpoint(item.src, item.sport),
+        "dst": _endpoint(item.dst, item.dport),
+    }
+    if json_mode == "raw":
+        record["raw"] = item.frame.raw.hex()
+    else:
+        record.update(describe(item.frame))
+    return record
+
+
+def _matches(item: CapturedFrame, port: int, src: str | None, dst: str | None) -> bool:
+    # --src/--dst name the client and the device; their replies are kept too.
+    client, device = (item.src, item.dst) if item.dport == port else (item.dst, item.src)
+    return (src is None or client == src) and (dst is None or device == dst)
+
+
+def decoded_frames(
+    capture: Path, args: argparse.Namespace, reassembler: TcpReassembler
+) -> Iterator[CapturedFrame]:
+    with capture.open("rb") as stream:
+        for item in decode_capture(stream, port=args.port, reassembler=reassembler):
+            if not _matches(item, args.port, args.src, args.dst):
+                continue
+            if args.exclude_acks and isinstance(item.frame, ParsedFrame) and is_ack(item.frame):
+                continue
+            yield item
+
+
+def write_frames(capture: Path, args: argparse.Namespace, out: TextIO) -> int:
+    reassembler = TcpReassembler(include_keepalive=args.include_keepalive)
+    count = 0
+    if args.format == "tsv":
+        out.write("\t".join(TSV_COLUMNS) + "\n")
+    for item in decoded_frames(capture, args, reassembler):
+        if args.format == "tsv":
+            record = frame_record(item, args.port, "semantic")
+            record["decoded"] = json.dumps(record.get("decoded", {}), separators=(",", ":"))
+            out.write("\t".join(str(record.get(column, "")) for column in TSV_COLUMNS) + "\n")
+        else:
+            record = frame_record(item, args.port, args.json_mode)
+            out.write(json.dumps(record, indent=2 if args.pretty else None) + "\n")
+        count += 1
+    if reassembler.gaps:
+        print(f"warning: skipped {reassembler.gaps} unrecoverable TCP gaps", file=sys.stderr)
+    return count
+
+
+def write_payloads(capture: Path, args: argparse.Namespace, out: TextIO) -> int:
+    """Raw TCP payloads sent from --src to --dst, like ``tshark -e tcp.payload``."""
+    count = 0
+    with capture.open("rb") as stream:
+        for packet in read_packets(stream):
+            segment = tcp_segment(packet)
+            if (
+                segment is None
+                or not segment.payload
+                or args.port not in (segment.sport, segment.dport)
+                or (args.src is not None and segment.src != args.src)
+                or (args.dst is not None and segment.dst != args.dst)
+            ):
+                continue
+            out.write(f"{segment.number}\t{segment.timestamp:.6f}\t{segment.payload.hex()}\n")
+            count += 1
+    return count
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pcap", type=Path)
+    parser.add_argument("--port", type=int, default=80, help="device TCP port")
+    parser.add_argument("--format", choices=("tsv", "json", "payloads"), default="tsv")
+    parser.add_argument(
+        "--json-mode",
+        choices=("semantic", "raw"),
+        default="semantic",
+        help="semantic adds command names and decoded args; raw keeps frame hex only",
+    )
+    parser.add_argument("--src", help="client address (payloads: packet source)")
+    parser.add_argument("--dst", help="device address (payloads: packet destination)")
+    parser.add_argument("--include-keepalive", action="store_true")
+    parser.add_argument("--exclude-acks", action="store_true")
+    parser.add_argument("--pretty", action="store_true", help="indent JSON records")
+    parser.add_argument("--stdout", action="store_true", help="write to stdout, not a file")
+    parser.add_argument(
+        "--output", type=Path, help="output file (default: <capture>_frames.tsv/.jsonl)"
+    )
+    args = parser.parse_args(argv)
+
+    writer = write_payloads if args.format == "payloads" else write_frames
+    output = args.output or Path(f"{args.pcap.stem}_{_SUFFIXES[args.format]}")
+    try:
+        if args.stdout:
+            count = writer(args.pcap, args, sys.stdout)
+        else:
+            with output.open("w", encoding="utf-8") as out:
+                count = writer(args.pcap, args, out)
+            print(f"Wrote {count} rows to {output}", file=sys.stderr)
+    except BrokenPipeError:
+        return 0
+    except (OSError, CaptureFormatError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
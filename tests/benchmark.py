@@ -0,0 +1,382 @@
+"""Latency and throughput benchmarks against the ICV6 simulator.
+
+Runs the HTTP API in-process against :mod:`app.simulator`, plus codec, stream decoder
+and SQLite microbenchmarks, and writes p50/p95/p99 latency and throughput as JSON::
+
+    python tests/benchmark.py --output bench.json
+    python tests/benchmark.py --quick --compare bench.json
+
+Only ``--compare`` output is meant for humans; the JSON is what to keep per commit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from frame_streams import clean_stream, hostile_stream, random_frame
+
+from app import config, db
+from app.models import Program, ProgramPoint
+from app.services.frame_decoder import FrameDecoder
+from app.services.icv6_client import ICV6Client
+from app.simulator import ICV6Simulator, SimulatorConfig
+
+DEVICE_ID = "R5S2A000188"
+
+PROGRAM = Program(
+    points=[
+        ProgramPoint(index=1, hour=7, minute=0, ch1=0, ch2=0, ch3=0, ch4=0),
+        ProgramPoint(index=2, hour=9, minute=30, ch1=40, ch2=60, ch3=30, ch4=10),
+        ProgramPoint(index=3, hour=13, minute=0, ch1=80, ch2=90, ch3=70, ch4=30),
+        ProgramPoint(index=4, hour=18, minute=0, ch1=40, ch2=60, ch3=30, ch4=10),
+        ProgramPoint(index=5, hour=21, minute=0, ch1=0, ch2=0, ch3=0, ch4=0),
+    ]
+)
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(name: str, params: dict[str, Any], samples: list[float], wall: float) -> dict:
+    """Latency percentiles (ms) and throughput (ops/s) of per-operation samples (s)."""
+    ordered = sorted(samples)
+    return {
+        "name": name,
+        "params": params,
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "throughput_per_s": round(len(ordered) / wall, 1) if wall > 0 else 0.0,
+    }
+
+
+async def run_load(
+    call: Callable[[], Awaitable[Any]], requests: int, concurrency: int
+) -> tuple[list[float], float]:
+    """Issue ``requests`` calls from ``concurrency`` workers; return samples and wall time."""
+    samples: list[float] = []
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def bench_codec(iterations: int) -> list[dict]:
+    """Per-operation cost of building, parsing and stream-decoding control frames."""
+    client = ICV6Client("127.0.0.1", 0, DEVICE_ID)
+    program_args = client._encode_program_args(PROGRAM)
+    frame = client._build_frame(0x0F, 0x0E, program_args)
+    reply = client._build_frame(0x5F, 0x0F, program_args)
+    decoder = FrameDecoder()
+
+    cases: list[tuple[str, Callable[[], Any]]] = [
+        ("codec.build_frame", lambda: client._build_frame(0x0F, 0x0E, program_args)),
+        ("codec.parse_frame", lambda: client._parse_dd_frame(frame)),
+        ("codec.encode_program", lambda: client._encode_program_args(PROGRAM)),
+        ("codec.decode_program", lambda: client._decode_program_args(program_args)),
+        ("codec.stream_decode", lambda: decoder.feed(reply)),
+    ]
+    results = []
+    for name, op in cases:
+        samples = []
+        perf_counter = time.perf_counter
+        started = perf_counter()
+        for _ in range(iterations):
+            t0 = perf_counter()
+            op()
+            samples.append(perf_counter() - t0)
+        wall = perf_counter() - started
+        results.append(summarize(name, {"frame_bytes": len(frame)}, samples, wall))
+    return results
+
+
+def _decoder_stream(kind: str, size: int) -> bytes:
+    rng = random.Random(0)
+    if kind == "frames":
+        block = b"".join(random_frame(rng) for _ in range(2000))
+    elif kind == "mixed":
+        block, _ = clean_stream(rng, 4000)
+    else:
+        block = hostile_stream(rng, 4000)
+    return (block * (size // len(block) + 1))[:size]
+
+
+def bench_decoder(megabytes: float, chunk_sizes: list[int]) -> list[dict]:
+    """Stream decoder throughput (MB/s) on clean, noisy and hostile input."""
+    results = []
+    size = int(megabytes * 1_000_000)
+    for kind in ("frames", "mixed", "hostile"):
+        data = _decoder_stream(kind, size)
+        for chunk_size in chunk_sizes:
+            chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+            decoder = FrameDecoder(include_keepalive=True)
+            samples = []
+            frames = 0
+            perf_counter = time.perf_counter
+            started = perf_counter()
+            for chunk in chunks:
+                t0 = perf_counter()
+                frames += len(decoder.feed(chunk))
+                samples.append(perf_counter() - t0)
+            frames += len(decoder.flush())
+            wall = perf_counter() - started
+            result = summarize(
+                "decoder.feed", {"stream": kind, "chunk_bytes": chunk_size}, samples, wall
+            )
+            result["mb_per_s"] = round(len(data) / wall / 1_000_000, 2)
+            result["frames_per_s"] = round(frames / wall, 1)
+            results.append(result)
+    return results
+
+
+async def _timed(op: Callable[[], Awaitable[Any]], iterations: int) -> tuple[list[float], float]:
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await op()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - started
+
+
+async def bench_db(
+    workdir: Path, preset_sizes: list[int], run_sizes: list[int], iterations: int
+) -> list[dict]:
+    """CRUD latency of ``app.db`` on presets and validation_runs tables of several sizes."""
+    results = []
+    for presets, runs in zip(preset_sizes, run_sizes, strict=True):
+        db.settings.database_path = str(workdir / f"bench-{presets}-{runs}.db")
+        await db.open_db()
+        try:
+            await db.init_db()
+            results += await _bench_db_tables(presets, runs, iterations)
+        finally:
+            await db.close_db()
+    return results
+
+
+async def _bench_db_tables(presets: int, runs: int, iterations: int) -> list[dict]:
+    program = PROGRAM.model_dump()
+    for i in range(presets):
+        await db.create_preset(f"seed-{i}", "auto", {"program": program})
+    for i in range(runs):
+        # Mostly identical ok payloads with the odd mismatch, like a real history.
+        if i % 50:
+            await db.insert_validation_run("ok", {"ok": True})
+        else:
+            await db.insert_validation_run("mismatch", {"ok": False, "seq": i})
+    preset_id = (await db.list_presets())[-1]["id"] if presets else 1
+    middle = (await db.list_validation_runs(1))[0]["id"] // 2 if runs else None
+    params = {"presets": presets, "validation_runs": runs}
+    created: list[int] = []
+
+    async def create() -> None:
+        created.append(
+            await db.create_preset(f"bench-{len(created)}", "auto", {"program": program})
+        )
+
+    async def delete() -> None:
+        await db.delete_preset(created.pop())
+
+    cases: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+        ("db.list_presets", db.list_presets),
+        ("db.get_preset", lambda: db.get_preset(preset_id)),
+        ("db.create_preset", create),
+        ("db.delete_preset", delete),
+        ("db.insert_validation_run", lambda: db.insert_validation_run("ok", {"ok": True})),
+        ("db.latest_validation_run", db.latest_validation_run),
+        ("db.list_validation_runs", lambda: db.list_validation_runs(50)),
+        (
+            "db.list_validation_runs_deep_page",
+            lambda: db.list_validation_runs(50, before_id=middle),
+        ),
+    ]
+    results = []
+    for name, op in cases:
+        samples, wall = await _timed(op, iterations)
+        results.append(summarize(name, params, samples, wall))
+    return results
+
+
+async def bench_http(
+    simulator: ICV6Simulator, workdir: Path, concurrency_levels: list[int], requests: int
+) -> list[dict]:
+    """``/api/state``, ``/api/program`` and preset apply through the full app stack.
+
+    Presets are applied through the fleet route, which drives the device; the plain
+    ``/api/presets/{id}/apply`` only loads the preset from the database.
+    """
+    import httpx
+
+    config.settings.icv6_host = "127.0.0.1"
+    config.settings.icv6_port = simulator.port
+    config.settings.icv6_device_id = DEVICE_ID
+    config.settings.database_path = str(workdir / "http.db")
+    import app.main as main
+
+    results = []
+    program_body = PROGRAM.model_dump()
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            created = await http.post(
+                "/api/presets", json={"name": "bench", "mode": "auto", "program": program_body}
+            )
+            created.raise_for_status()
+            preset_id = created.json()["id"]
+
+            async def checked(response: Awaitable[httpx.Response]) -> None:
+                (await response).raise_for_status()
+
+            async def fleet_checked(response: Awaitable[httpx.Response]) -> None:
+                res = await response
+                res.raise_for_status()
+                failed = [r for r in res.json()["results"] if r["status"] != "ok"]
+                if failed:
+                    raise RuntimeError(f"fleet apply failed: {failed}")
+
+            cases: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+                ("http.get_state", lambda: checked(http.get("/api/state?max_age=0"))),
+                ("http.set_program", lambda: checked(http.post("/api/program", json=program_body))),
+                (
+                    "http.fleet_apply_preset",
+                    lambda: fleet_checked(http.post(f"/api/fleet/presets/{preset_id}/apply")),
+                ),
+            ]
+            for name, call in cases:
+                for concurrency in concurrency_levels:
+                    samples, wall = await run_load(call, requests, concurrency)
+                    params = {"concurrency": concurrency, "rtt_ms": simulator.config.rtt * 1000}
+                    results.append(summarize(name, params, samples, wall))
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current: list[dict], baseline: list[dict]) -> list[str]:
+    """One line per benchmark present in both runs: p95 and throughput change."""
+    previous = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in baseline}
+    lines = []
+    for result in current:
+        old = previous.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if old is None:
+            continue
+        p95 = (result["p95_ms"] / old["p95_ms"] - 1) * 100 if old["p95_ms"] else 0.0
+        tput = (
+            (result["throughput_per_s"] / old["throughput_per_s"] - 1) * 100
+            if old["throughput_per_s"]
+            else 0.0
+        )
+        lines.append(f"{result['name']:<36} {result['params']}  p95 {p95:+.1f}%  tput {tput:+.1f}%")
+    return lines
+
+
+async def run(args: argparse.Namespace) -> dict:
+    results: list[dict] = []
+    sim_config = SimulatorConfig(rtt=args.rtt_ms / 1000, jitter=args.jitter_ms / 1000, seed=0)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        if "codec" in args.only:
+            results += bench_codec(args.codec_iterations)
+        if "decoder" in args.only:
+            results += bench_decoder(args.decoder_mb, args.decoder_chunks)
+        if "db" in args.only:
+            results += await bench_db(
+                workdir, args.preset_sizes, args.run_sizes, args.db_iterations
+            )
+        if "http" in args.only:
+            async with ICV6Simulator((DEVICE_ID,), sim_config) as simulator:
+                results += await bench_http(simulator, workdir, args.concurrency, args.requests)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(UTC).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "simulator": {"rtt_ms": args.rtt_ms, "jitter_ms": args.jitter_ms},
+        },
+        "results": results,
+    }
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--compare", type=Path, help="earlier results to diff against")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument(
+        "--only", type=lambda v: set(v.split(",")), default={"codec", "decoder", "db", "http"}
+    )
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=400, help="requests per level")
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.5)
+    parser.add_argument("--preset-sizes", type=_int_list, default=[10, 1000])
+    parser.add_argument("--run-sizes", type=_int_list, default=[100, 10_000])
+    parser.add_argument("--db-iterations", type=int, default=200)
+    parser.add_argument("--codec-iterations", type=int, default=20_000)
+    parser.add_argument("--decoder-mb", type=float, default=8.0, help="stream size per case")
+    parser.add_argument("--decoder-chunks", type=_int_list, default=[64, 4096])
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.requests = min(args.requests, 40)
+        args.preset_sizes = [min(n, 50) for n in args.preset_sizes]
+        args.run_sizes = [min(n, 500) for n in args.run_sizes]
+        args.db_iterations = min(args.db_iterations, 20)
+        args.codec_iterations = min(args.codec_iterations, 2000)
+        args.decoder_mb = min(args.decoder_mb, 0.5)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+        print("\n".join(compare(report["results"], baseline)))
+
+
+if __name__ == "__main__":
+    main()
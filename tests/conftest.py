@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 import importlib
 import sys
+from collections.abc import AsyncIterator, Iterator
 from pathlib import Path
 
 import pytest
@@ -9,14 +11,16 @@ import pytest
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from app import config, db
+from app.simulator import ICV6Simulator, SimulatorConfig
 
 
 @pytest.fixture()
-def isolated_db_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+def isolated_db_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
     db_path = tmp_path / "test.db"
     monkeypatch.setattr(config.settings, "database_path", str(db_path), raising=False)
     monkeypatch.setattr(db.settings, "database_path", str(db_path), raising=False)
-    return db_path
+    yield db_path
+    asyncio.run(db.close_db())
 
 
 @pytest.fixture()
@@ -26,3 +30,11 @@ def main_module(isolated_db_path: Path, monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(main.settings, "database_path", str(isolated_db_path), raising=False)
     monkeypatch.setattr(main.db.settings, "database_path", str(isolated_db_path), raising=False)
     return importlib.reload(main)
+
+
+@pytest.fixture()
+async def icv6_simulator(request: pytest.FixtureRequest) -> AsyncIterator[ICV6Simulator]:
+    """Simulated ICV6 on a free local port; parametrize indirectly with a SimulatorConfig."""
+    sim_config = getattr(request, "param", None) or SimulatorConfig(seed=0)
+    async with ICV6Simulator(config=sim_config) as simulator:
+        yield simulator
@@ -0,0 +1,129 @@
+"""Random ``dd ee ff`` byte streams for the decoder fuzz tests and benchmarks."""
+
+from __future__ import annotations
+
+import random
+
+from app.services.frame_decoder import (
+    KEEPALIVE_LEN,
+    MAGIC_DD,
+    MAGIC_FF,
+    MIN_FRAME_LEN,
+    KeepaliveFrame,
+    ParsedFrame,
+    build_frame,
+)
+
+DEVICE_IDS = ("R5S2A000188", "R5S2A000189")
+# Bytes that cannot start a magic, so noise built from them never fakes a frame boundary.
+_SAFE_BYTES = bytes(b for b in range(256) if b not in (MAGIC_DD[0], MAGIC_FF[0]))
+
+
+def random_frame(rng: random.Random) -> bytes:
+    """A valid frame with random command and safe random args."""
+    args = bytes(rng.choice(_SAFE_BYTES) for _ in range(rng.randint(0, 48)))
+    return build_frame(rng.choice(DEVICE_IDS), rng.randint(0, 0x7F), rng.randint(0, 0x7F), args)
+
+
+def random_keepalive(rng: random.Random) -> bytes:
+    return MAGIC_FF + bytes(rng.choice(_SAFE_BYTES) for _ in range(KEEPALIVE_LEN - 4))
+
+
+def random_noise(rng: random.Random) -> bytes:
+    return bytes(rng.choice(_SAFE_BYTES) for _ in range(rng.randint(1, 24)))
+
+
+def bad_checksum_frame(rng: random.Random) -> bytes:
+    frame = bytearray(random_frame(rng))
+    frame[-1] = (frame[-1] + rng.randint(1, 255)) & 0xFF
+    if frame[-1] in (MAGIC_DD[0], MAGIC_FF[0]):
+        frame[-1] ^= 0x01
+    return bytes(frame)
+
+
+def clean_stream(rng: random.Random, elements: int) -> tuple[bytes, list[bytes]]:
+    """Valid frames and keepalives mixed with noise that cannot be mistaken for a frame.
+
+    Returns the stream and the raw frames (keepalives included) a decoder must recover,
+    in order.
+    """
+    parts: list[bytes] = []
+    expected: list[bytes] = []
+    for _ in range(elements):
+        roll = rng.random()
+        if roll < 0.5:
+            frame = random_frame(rng)
+            expected.append(frame)
+        elif roll < 0.7:
+            frame = random_keepalive(rng)
+            expected.append(frame)
+        elif roll < 0.85:
+            frame = bad_checksum_frame(rng)
+        else:
+            frame = random_noise(rng)
+        parts.append(frame)
+    return b"".join(parts), expected
+
+
+def hostile_stream(rng: random.Random, elements: int) -> bytes:
+    """Anything goes: arbitrary bytes, stray magics, truncated and corrupted frames."""
+    parts: list[bytes] = []
+    for _ in range(elements):
+        roll = rng.random()
+        if roll < 0.3:
+            parts.append(random_frame(rng))
+        elif roll < 0.4:
+            parts.append(random_keepalive(rng)[: rng.randint(1, KEEPALIVE_LEN)])
+        elif roll < 0.6:
+            parts.append(random_frame(rng)[: rng.randint(1, MIN_FRAME_LEN)])
+        elif roll < 0.7:
+            parts.append(MAGIC_DD + bytes([0x00, rng.randint(0, 255)]))
+        else:
+            parts.append(rng.randbytes(rng.randint(1, 32)))
+    return b"".join(parts)
+
+
+def random_chunks(rng: random.Random, data: bytes) -> list[bytes]:
+    """Split ``data`` at random points, from single bytes to whole reads."""
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.choice((1, 2, 3, rng.randint(1, 64), rng.randint(1, 4096)))
+        chunks.append(data[pos : pos + size])
+        pos += size
+    return chunks
+
+
+def reference_decode(data: bytes) -> list[ParsedFrame | KeepaliveFrame]:
+    """Byte-at-a-time whole-buffer decode: the slow, obviously correct specification.
+
+    Written straight from protocol.md rather than with the decoder's helpers, so a bug in
+    its checksum or field slicing cannot pass on both sides.
+    """
+    out: list[ParsedFrame | KeepaliveFrame] = []
+    pos = 0
+    while pos < len(data):
+        # Keepalive: ff ee dd cc plus five bytes.
+        if data[pos : pos + 4] == b"\xff\xee\xdd\xcc" and pos + 9 <= len(data):
+            out.append(KeepaliveFrame(raw=data[pos : pos + 9]))
+            pos += 9
+            continue
+        # Control frame: dd ee ff, one byte, then a length byte counting what follows it.
+        if data[pos : pos + 3] == b"\xdd\xee\xff" and pos + 5 <= len(data):
+            total = 5 + data[pos + 4]
+            raw = data[pos : pos + total]
+            # Checksum: low byte of the sum from the length byte up to the checksum itself.
+            if total >= 21 and len(raw) == total and raw[-1] == sum(raw[4:-1]) & 0xFF:
+                out.append(
+                    ParsedFrame(
+                        raw=raw,
+                        cmd_group=raw[18],
+                        cmd_id=raw[19],
+                        args=raw[20:-1],
+                        device_id=raw[6:17].decode("ascii", errors="replace"),
+                    )
+                )
+                pos += len(raw)
+                continue
+        pos += 1
+    return out
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 from unittest.mock import AsyncMock
 
 from fastapi.testclient import TestClient
 
+from app import db
 from app.models import Intensity, Program, ProgramPoint
+from app.services.frame_decoder import ParsedFrame
 
 
 def _program() -> Program:
@@ -23,6 +26,12 @@ def _disable_validator_lifecycle(main_module, monkeypatch):
 def test_healthz_ok(main_module, monkeypatch):
     _disable_validator_lifecycle(main_module, monkeypatch)
     monkeypatch.setattr(main_module.client, "query_mode", AsyncMock(return_value="manual"))
+    monkeypatch.setattr(
+        main_module.client,
+        "query_intensity",
+        AsyncMock(return_value=Intensity(ch1=10, ch2=20, ch3=30, ch4=40)),
+    )
+    monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
 
     with TestClient(main_module.app) as tc:
         res = tc.get("/healthz")
@@ -31,6 +40,13 @@ def test_healthz_ok(main_module, monkeypatch):
         assert body["status"] == "ok"
         assert body["db"] == "ok"
         assert body["icv6"] == "ok"
+        assert body["breakers"]["default"]["state"] == "closed"
+
+        metrics = tc.get("/metrics")
+        assert metrics.status_code == 200
+        assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'db_query_duration_seconds_count{function="latest_validation_run"}' in metrics.text
+        assert 'icv6_decoder_frames_total{kind="bad_checksums"} 0' in metrics.text
 
 
 def test_state_manual_and_auto(main_module, monkeypatch):
@@ -42,6 +58,7 @@ def test_state_manual_and_auto(main_module, monkeypatch):
             "query_intensity",
             AsyncMock(return_value=Intensity(ch1=10, ch2=20, ch3=30, ch4=40)),
         )
+        monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
         res_manual = tc.get("/api/state")
         assert res_manual.status_code == 200
         assert res_manual.json()["mode"] == "manual"
@@ -49,12 +66,36 @@ def test_state_manual_and_auto(main_module, monkeypatch):
 
         monkeypatch.setattr(main_module.client, "query_mode", AsyncMock(return_value="auto"))
         monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
-        res_auto = tc.get("/api/state")
+        res_auto = tc.get("/api/state", params={"max_age": 0})
         assert res_auto.status_code == 200
         assert res_auto.json()["mode"] == "auto"
         assert len(res_auto.json()["program"]["points"]) == 1
 
 
+def test_server_timing_splits_device_db_and_serialization(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+
+    async def fake_send(frame, expect_group, expect_id, timeout):
+        await asyncio.sleep(0.01)
+        args = {0x01: b"\x01", 0x0D: bytes([1, 2, 3, 4])}.get(expect_id, b"")
+        return ParsedFrame(b"", expect_group, expect_id, args, main_module.client.device_id)
+
+    monkeypatch.setattr(main_module.client, "_send", fake_send)
+
+    with TestClient(main_module.app) as tc:
+        res = tc.get("/api/state", params={"max_age": 0})
+        assert res.status_code == 200
+        timings = dict(part.split(";dur=") for part in res.headers["Server-Timing"].split(", "))
+        assert set(timings) == {"device", "db", "app", "serialize", "total"}
+        assert float(timings["device"]) >= 10
+        assert float(timings["db"]) == 0
+
+        runs = tc.get("/api/validation/runs")
+        db_timing = runs.headers["Server-Timing"].split(", ")[1]
+        assert db_timing.startswith("db;dur=") and float(db_timing[7:]) > 0
+        assert tc.get("/openapi.json").status_code == 200
+
+
 def test_set_mode_and_manual_intensity(main_module, monkeypatch):
     _disable_validator_lifecycle(main_module, monkeypatch)
     monkeypatch.setattr(main_module.client, "set_mode", AsyncMock(return_value=None))
@@ -70,6 +111,47 @@ def test_set_mode_and_manual_intensity(main_module, monkeypatch):
         assert i.json()["status"] == "ok"
 
 
+def test_batch_applies_mode_and_payload(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+    monkeypatch.setattr(main_module.client, "query_mode", AsyncMock(return_value="auto"))
+    monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
+    monkeypatch.setattr(main_module.client, "query_intensity", AsyncMock(side_effect=OSError))
+    monkeypatch.setattr(main_module.client, "set_mode", AsyncMock(return_value=None))
+    monkeypatch.setattr(main_module.client, "set_intensity", AsyncMock(return_value=None))
+
+    with TestClient(main_module.app) as tc:
+        missing = tc.post("/api/batch", json={"mode": "manual"})
+        assert missing.status_code == 400
+
+        intensity = {"ch1": 1, "ch2": 2, "ch3": 3, "ch4": 4}
+        program = _program().model_dump()
+        mixed = [
+            {"mode": "auto", "program": program, "intensity": intensity},
+            {"mode": "manual", "intensity": intensity, "program": program},
+        ]
+        assert [tc.post("/api/batch", json=body).status_code for body in mixed] == [422, 422]
+        main_module.client.set_mode.assert_not_awaited()
+
+        res = tc.post("/api/batch", json={"mode": "manual", "intensity": intensity})
+        assert res.status_code == 200
+        assert res.json()["state"] == {"mode": "manual", "intensity": intensity, "program": None}
+        main_module.client.set_mode.assert_awaited_once_with("manual")
+
+
+def test_preview_is_accepted_and_forwarded(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+    sent = AsyncMock(return_value=None)
+    monkeypatch.setattr(main_module.client, "set_preview_intensity", sent)
+
+    with TestClient(main_module.app) as tc:
+        res = tc.post("/api/preview", json={"ch1": 5, "ch2": 6, "ch3": 7, "ch4": 8})
+        assert res.status_code == 200
+        assert res.json()["status"] == "ok"
+        tc.get("/api/presets")
+
+    sent.assert_awaited_once_with(Intensity(ch1=5, ch2=6, ch3=7, ch4=8))
+
+
 def test_program_and_validation_endpoints(main_module, monkeypatch):
     _disable_validator_lifecycle(main_module, monkeypatch)
     monkeypatch.setattr(main_module.client, "set_program", AsyncMock(return_value=1))
@@ -101,6 +183,57 @@ def test_program_and_validation_endpoints(main_module, monkeypatch):
         assert cfg_set.json() == {"enabled": False, "interval_minutes": 9}
 
 
+def test_validation_runs_are_paged_with_a_cursor(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+
+    with TestClient(main_module.app) as tc:
+        for status in ("ok", "mismatch", "ok"):
+            tc.portal.call(db.insert_validation_run, status, {"status": status})
+
+        page = tc.get("/api/validation/runs", params={"limit": 2, "include_details": False})
+        assert page.status_code == 200
+        body = page.json()
+        assert [r["status"] for r in body["runs"]] == ["ok", "mismatch"]
+        assert body["runs"][0]["details"] is None
+        assert body["next_before_id"] == body["runs"][-1]["id"]
+
+        rest = tc.get(
+            "/api/validation/runs", params={"limit": 2, "before_id": body["next_before_id"]}
+        )
+        assert [r["details"] for r in rest.json()["runs"]] == [{"status": "ok"}]
+        assert rest.json()["next_before_id"] is None
+
+        filtered = tc.get("/api/validation/runs", params=[("status", "mismatch")])
+        assert [r["status"] for r in filtered.json()["runs"]] == ["mismatch"]
+
+        bad = tc.get(
+            "/api/validation/runs",
+            params={"since": "2026-01-02T00:00:00Z", "until": "2026-01-01T00:00:00Z"},
+        )
+        assert bad.status_code == 400
+
+
+def test_program_curve_endpoint(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+
+    with TestClient(main_module.app) as tc:
+        r = tc.post(
+            "/api/program/curve",
+            params={"resolution_minutes": 360},
+            json={
+                "points": [
+                    {"index": 1, "hour": 0, "minute": 0, "ch1": 0, "ch2": 0, "ch3": 0, "ch4": 0},
+                    {"index": 2, "hour": 12, "minute": 0, "ch1": 100, "ch2": 0, "ch3": 0, "ch4": 0},
+                ]
+            },
+        )
+        assert r.status_code == 200
+        body = r.json()
+        assert body["minutes"] == [0, 360, 720, 1080]
+        assert body["ch1"] == [0, 50, 100, 50]
+        assert len(body["digest"]) == 64
+
+
 def test_preset_crud_and_apply(main_module, monkeypatch):
     _disable_validator_lifecycle(main_module, monkeypatch)
     with TestClient(main_module.app) as tc:
@@ -128,6 +261,11 @@ def test_preset_crud_and_apply(main_module, monkeypatch):
         listed = tc.get("/api/presets")
         assert listed.status_code == 200
         assert any(p["id"] == pid for p in listed.json())
+        assert all(p["analytics"] is None for p in listed.json())
+
+        with_analytics = tc.get("/api/presets", params={"include_analytics": True})
+        preset = next(p for p in with_analytics.json() if p["id"] == pid)
+        assert preset["analytics"]["channels"]["ch1"]["daily_dose_percent_hours"] == 0
 
         apply_res = tc.post(f"/api/presets/{pid}/apply")
         assert apply_res.status_code == 200
@@ -157,3 +295,73 @@ def test_duplicate_preset_name_returns_400(main_module, monkeypatch):
         second = tc.post("/api/presets", json=body)
         assert second.status_code == 400
         assert "already exists" in second.json()["detail"]
+
+
+def test_device_registry_and_fleet_fan_out(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+    monkeypatch.setattr(main_module.client, "query_mode", AsyncMock(return_value="auto"))
+    monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
+    monkeypatch.setattr(
+        main_module.client, "query_intensity", AsyncMock(side_effect=RuntimeError("n/a"))
+    )
+
+    with TestClient(main_module.app) as tc:
+        body = {"name": "frag-tank", "host": "127.0.0.1", "port": 9, "device_id": "R5S2A000189"}
+        for bad_id in ("R5S2A00018", "R5S2A00018\u00e9", "R5S2A 00018"):
+            assert tc.post("/api/devices", json={**body, "device_id": bad_id}).status_code == 422
+        created = tc.post("/api/devices", json=body)
+        assert created.status_code == 200
+        pk = created.json()["id"]
+        assert tc.post("/api/devices", json=body).status_code == 400
+        assert tc.post("/api/devices", json={**body, "name": "default"}).status_code == 400
+        assert [d["name"] for d in tc.get("/api/devices").json()] == ["frag-tank"]
+
+        tank = main_module.registry.get(pk).client
+        monkeypatch.setattr(tank, "query_mode", AsyncMock(side_effect=OSError("unreachable")))
+        monkeypatch.setattr(tank, "query_intensity", AsyncMock(side_effect=OSError("unreachable")))
+        monkeypatch.setattr(tank, "query_program", AsyncMock(side_effect=OSError("unreachable")))
+
+        fleet = tc.get("/api/fleet/state")
+        assert fleet.status_code == 200
+        by_name = {r["device"]: r for r in fleet.json()["results"]}
+        assert by_name["default"]["status"] == "ok"
+        assert by_name["default"]["state"]["mode"] == "auto"
+        assert by_name["frag-tank"]["status"] == "error"
+        assert "unreachable" in by_name["frag-tank"]["error"]
+
+        assert tc.get(f"/api/devices/{pk}/state").status_code == 502
+        assert tc.delete(f"/api/devices/{pk}").status_code == 200
+        assert tc.get(f"/api/devices/{pk}/state").status_code == 404
+
+
+def test_fleet_preset_apply_writes_every_device(main_module, monkeypatch):
+    _disable_validator_lifecycle(main_module, monkeypatch)
+    monkeypatch.setattr(main_module.client, "query_mode", AsyncMock(return_value="auto"))
+    monkeypatch.setattr(main_module.client, "query_program", AsyncMock(return_value=_program()))
+    monkeypatch.setattr(main_module.client, "query_intensity", AsyncMock(side_effect=OSError))
+    monkeypatch.setattr(main_module.client, "set_mode", AsyncMock(return_value=None))
+    monkeypatch.setattr(main_module.client, "set_intensity", AsyncMock(return_value=None))
+
+    with TestClient(main_module.app) as tc:
+        created = tc.post(
+            "/api/devices",
+            json={"name": "sump", "host": "127.0.0.1", "port": 9, "device_id": "R5S2A000190"},
+        )
+        sump = main_module.registry.get(created.json()["id"]).client
+        # The sump is unreachable for reads; the batch still applies without a rollback target.
+        monkeypatch.setattr(sump, "set_mode", AsyncMock(return_value=None))
+        monkeypatch.setattr(sump, "set_intensity", AsyncMock(return_value=None))
+        preset = tc.post(
+            "/api/presets",
+            json={
+                "name": "moonlight",
+                "mode": "manual",
+                "intensity": {"ch1": 0, "ch2": 5, "ch3": 5, "ch4": 0},
+            },
+        )
+
+        res = tc.post(f"/api/fleet/presets/{preset.json()['id']}/apply")
+        assert res.status_code == 200
+        assert {r["status"] for r in res.json()["results"]} == {"ok"}
+        sump.set_intensity.assert_awaited_once()
+        main_module.client.set_intensity.assert_awaited_once()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import benchmark
+import pytest
+
+
+def test_summarize_reports_nearest_rank_percentiles():
+    samples = [i / 1000 for i in range(1, 101)]  # 1..100 ms
+
+    result = benchmark.summarize("x", {}, samples, wall=2.0)
+
+    assert (result["p50_ms"], result["p95_ms"], result["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert result["throughput_per_s"] == 50.0
+
+
+def test_compare_matches_results_by_name_and_params():
+    baseline = [benchmark.summarize("x", {"concurrency": 1}, [0.002], 1.0)]
+    current = [
+        benchmark.summarize("x", {"concurrency": 1}, [0.003], 1.0),
+        benchmark.summarize("x", {"concurrency": 4}, [0.003], 1.0),
+    ]
+
+    lines = benchmark.compare(current, baseline)
+
+    assert len(lines) == 1
+    assert "p95 +50.0%" in lines[0]
+
+
+@pytest.mark.usefixtures("isolated_db_path")
+def test_codec_decoder_and_db_benchmarks_write_json(tmp_path: Path):
+    output = tmp_path / "bench.json"
+
+    benchmark.main(
+        [
+            "--only=codec,decoder,db",
+            f"--output={output}",
+            "--preset-sizes=3",
+            "--run-sizes=5",
+            "--db-iterations=2",
+            "--codec-iterations=10",
+            "--decoder-mb=0.01",
+        ]
+    )
+
+    report = json.loads(output.read_text())
+    names = {r["name"] for r in report["results"]}
+    assert {"codec.parse_frame", "decoder.feed", "db.list_validation_runs"} <= names
+    assert all(r["mb_per_s"] > 0 for r in report["results"] if r["name"] == "decoder.feed")
+    assert all(r["count"] > 0 for r in report["results"])
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import io
+import json
+import struct
+import subprocess
+import sys
+from pathlib import Path
+
+from app.services.capture_reader import (
+    CaptureFormatError,
+    TcpReassembler,
+    decode_capture,
+    read_packets,
+    tcp_segment,
+)
+from app.services.frame_decoder import KeepaliveFrame, ParsedFrame, build_frame
+from app.services.frame_semantics import describe
+
+CLIENT = ("10.0.2.169", 50000)
+DEVICE = ("10.0.2.116", 80)
+KEEPALIVE = bytes.fromhex("ffeeddcc0300010102")
+QUERY_MODE = build_frame("R5S2A000188", 0x0F, 0x01, b"")
+REPORT_MODE = build_frame("R5S2A000188", 0x5F, 0x01, b"\x02")
+REPORT_INTENSITY = build_frame("R5S2A000188", 0x5F, 0x0D, bytes([10, 20, 30, 40]))
+
+
+def _ethernet_tcp(src, dst, seq: int, payload: bytes = b"", flags: int = 0x18) -> bytes:
+    tcp = struct.pack("!HHIIBBHHH", src[1], dst[1], seq, 0, 5 << 4, flags, 65535, 0, 0)
+    ip = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        20 + len(tcp) + len(payload),
+        0,
+        0x4000,  # don't fragment
+        64,
+        6,
+        0,
+        bytes(int(p) for p in src[0].split(".")),
+        bytes(int(p) for p in dst[0].split(".")),
+    )
+    return bytes(12) + b"\x08\x00" + ip + tcp + payload
+
+
+def _pcap(packets: list[bytes]) -> bytes:
+    out = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+    for i, data in enumerate(packets):
+        out += struct.pack("<IIII", 1_700_000_000 + i, 500_000, len(data), len(data)) + data
+    return out
+
+
+def _pcapng(packets: list[bytes]) -> bytes:
+    def block(block_type: int, body: bytes) -> bytes:
+        body += bytes(-len(body) % 4)
+        length = 12 + len(body)
+        return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+    shb = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    # if_tsresol = 10^-9
+    idb = block(1, struct.pack("<HHI", 1, 0, 65535) + struct.pack("<HHB3x", 9, 1, 9) + bytes(4))
+    out = shb + idb
+    for i, data in enumerate(packets):
+        ts = (1_700_000_000 + i) * 1_000_000_000
+        epb = struct.pack("<IIIII", 0, ts >> 32, ts & 0xFFFFFFFF, len(data), len(data)) + data
+        out += block(6, epb)
+    return out
+
+
+def _conversation() -> list[bytes]:
+    response = KEEPALIVE + REPORT_MODE + REPORT_INTENSITY
+    return [
+        _ethernet_tcp(CLIENT, DEVICE, 999, flags=0x02),  # SYN
+        _ethernet_tcp(DEVICE, CLIENT, 4999, flags=0x12),  # SYN/ACK
+        _ethernet_tcp(CLIENT, DEVICE, 1000, QUERY_MODE),
+        # Response split in three segments, delivered out of order, one retransmitted.
+        _ethernet_tcp(DEVICE, CLIENT, 5000 + 20, response[20:40]),
+        _ethernet_tcp(DEVICE, CLIENT, 5000, response[:20]),
+        _ethernet_tcp(DEVICE, CLIENT, 5000 + 10, response[10:30]),
+        _ethernet_tcp(DEVICE, CLIENT, 5000 + 40, response[40:]),
+        _ethernet_tcp(DEVICE, CLIENT, 5000 + len(response), flags=0x11),  # FIN
+    ]
+
+
+def test_decode_capture_reassembles_out_of_order_and_retransmitted_segments():
+    frames = list(decode_capture(io.BytesIO(_pcap(_conversation())), port=80))
+
+    parsed = [f.frame for f in frames if isinstance(f.frame, ParsedFrame)]
+    assert [p.raw for p in parsed] == [QUERY_MODE, REPORT_MODE, REPORT_INTENSITY]
+    assert frames[0].src == CLIENT[0] and frames[0].dport == 80
+    # Each frame is stamped with the packet that completed it.
+    assert [f.number for f in frames] == [3, 5, 7]
+    assert describe(parsed[2])["decoded"] == {"ch1": 10, "ch2": 20, "ch3": 30, "ch4": 40}
+
+
+def test_pcapng_matches_pcap_and_uses_interface_timestamp_resolution():
+    from_pcap = list(decode_capture(io.BytesIO(_pcap(_conversation())), include_keepalive=True))
+    from_ng = list(decode_capture(io.BytesIO(_pcapng(_conversation())), include_keepalive=True))
+
+    assert [f.frame.raw for f in from_ng] == [f.frame.raw for f in from_pcap]
+    assert isinstance(from_ng[1].frame, KeepaliveFrame)
+    packets = list(read_packets(io.BytesIO(_pcapng(_conversation()))))
+    assert packets[2].timestamp == 1_700_000_002.0
+
+
+def test_reassembler_skips_unfillable_gap_and_forgets_closed_flows():
+    reassembler = TcpReassembler(max_pending_bytes=len(REPORT_INTENSITY))
+    after_gap = 100 + 2 * len(REPORT_MODE)  # the segment in between was never captured
+    end = after_gap + len(REPORT_INTENSITY) + len(REPORT_MODE)
+    packets = [
+        _ethernet_tcp(DEVICE, CLIENT, 100, REPORT_MODE),
+        _ethernet_tcp(DEVICE, CLIENT, after_gap, REPORT_INTENSITY),
+        _ethernet_tcp(DEVICE, CLIENT, after_gap + len(REPORT_INTENSITY), REPORT_MODE),
+    ]
+    out = []
+    for packet in read_packets(io.BytesIO(_pcap(packets))):
+        segment = tcp_segment(packet)
+        assert segment is not None
+        out += reassembler.feed(segment)
+
+    assert [f.frame.raw for f in out] == [REPORT_MODE, REPORT_INTENSITY, REPORT_MODE]
+    assert reassembler.gaps == 1
+    fin = _ethernet_tcp(DEVICE, CLIENT, end, flags=0x11)
+    segment = tcp_segment(next(read_packets(io.BytesIO(_pcap([fin])))))
+    assert segment is not None
+    reassembler.feed(segment)
+    assert reassembler.open_flows == 0
+
+
+def test_read_packets_rejects_unknown_format():
+    try:
+        list(read_packets(io.BytesIO(b"not a capture")))
+    except CaptureFormatError:
+        pass
+    else:
+        raise AssertionError("expected CaptureFormatError")
+
+
+def test_decode_script_writes_json_lines(tmp_path: Path):
+    capture = tmp_path / "switchmode.pcapng"
+    capture.write_bytes(_pcapng(_conversation()))
+    script = Path(__file__).resolve().parents[1] / "scripts" / "decode_iot_frames.py"
+
+    result = subprocess.run(
+        [sys.executable, str(script), str(capture), "--format", "json", "--stdout"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [(r["direction"], r["name"]) for r in records] == [
+        ("command", "query_mode"),
+        ("response", "report_mode"),
+        ("response", "report_intensity"),
+    ]
+    assert records[1]["decoded"] == {"mode": "auto"}
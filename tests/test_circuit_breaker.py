@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.errors import DeviceCommunicationError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.device_service import DeviceService
+from app.services.icv6_client import ICV6Client, ICV6Session
+from app.simulator import ICV6Simulator
+
+
+def test_breaker_opens_fails_fast_and_probes_once_half_open():
+    breaker = CircuitBreaker("R5S2A000188", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(0x01)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError, match="circuit open"):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.snapshot()["state"] == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe at a time
+    breaker.record_success(0x01, 0.01)
+    assert breaker.snapshot() == {"state": "closed", "failures": 0, "retry_in_seconds": None}
+
+
+def test_timeout_tracks_rtt_per_command_within_bounds():
+    breaker = CircuitBreaker("R5S2A000188", min_timeout=0.1, max_timeout=2.0)
+    assert breaker.timeout_for(0x01) == 2.0
+
+    for _ in range(20):
+        breaker.record_success(0x01, 0.02)
+    assert breaker.timeout_for(0x01) == pytest.approx(0.1)
+    assert breaker.timeout_for(0x0E) == 2.0
+
+    for _ in range(20):
+        breaker.record_success(0x0E, 0.5)
+    assert 0.5 <= breaker.timeout_for(0x0E) < 1.0
+    breaker.record_failure(0x0E, timed_out=True)
+    assert breaker.timeout_for(0x0E) >= 1.0
+
+
+async def test_unencodable_frame_does_not_take_the_half_open_probe():
+    breaker = CircuitBreaker("R5S2A00018\u00e9", failure_threshold=1, reset_timeout=0.01)
+    breaker.before_call()
+    breaker.record_failure(0x01)
+    await asyncio.sleep(0.02)
+    client = ICV6Client("127.0.0.1", 1, "R5S2A00018\u00e9", breaker=breaker)
+
+    with pytest.raises(UnicodeEncodeError):
+        await client.query_mode()
+    assert breaker.state == "half_open"
+    breaker.before_call()  # the probe is still available
+
+
+async def test_client_stops_connecting_once_the_circuit_is_open():
+    attempts = 0
+
+    async def refuse(reader, writer):
+        nonlocal attempts
+        attempts += 1
+        writer.close()
+
+    server = await asyncio.start_server(refuse, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = ICV6Client(
+        "127.0.0.1", port, "R5S2A000188", breaker=CircuitBreaker("R5S2A000188", 2, 60)
+    )
+    try:
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await client.query_mode()
+        with pytest.raises(CircuitOpenError):
+            await client.query_mode()
+        assert attempts == 2
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def test_pipelined_state_poll_is_one_breaker_call(icv6_simulator: ICV6Simulator):
+    breaker = CircuitBreaker(
+        "R5S2A000188", failure_threshold=3, reset_timeout=0.05, max_timeout=0.1
+    )
+    session = ICV6Session("127.0.0.1", icv6_simulator.port, timeout=0.1, idle_timeout=0)
+    client = ICV6Client("127.0.0.1", 0, "R5S2A000188", session=session, breaker=breaker)
+    service = DeviceService(client)
+    try:
+        # One failed poll of a dead device is one failure, not one per pipelined query.
+        icv6_simulator.config.drop_rate = 1.0
+        with pytest.raises(DeviceCommunicationError):
+            await service.get_state()
+        assert (breaker.state, breaker.failures) == ("closed", 1)
+        for _ in range(2):
+            with pytest.raises(DeviceCommunicationError):
+                await service.get_state()
+        assert breaker.state == "open"
+
+        # After recovery the first poll is the half-open probe, for all three queries.
+        icv6_simulator.config.drop_rate = 0.0
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        assert (await service.get_state()).mode == "manual"
+        assert breaker.snapshot()["state"] == "closed"
+    finally:
+        await session.close()
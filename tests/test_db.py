@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import UTC, datetime, timedelta
+
 from app import db
 
 
@@ -60,6 +62,25 @@ async def test_validation_runs_roundtrip(isolated_db_path):
     assert latest["details"]["reason"] == "x"
 
 
+async def test_list_validation_runs_pages_by_id_with_filters(isolated_db_path):
+    await db.init_db()
+    for i in range(5):
+        await db.insert_validation_run("ok" if i % 2 else "mismatch", {"n": i})
+
+    first = await db.list_validation_runs(2)
+    assert [r["details"]["n"] for r in first] == [4, 3]
+    second = await db.list_validation_runs(2, before_id=first[-1]["id"])
+    assert [r["details"]["n"] for r in second] == [2, 1]
+
+    mismatches = await db.list_validation_runs(10, statuses=["mismatch"], include_details=False)
+    assert [r["status"] for r in mismatches] == ["mismatch"] * 3
+    assert all(r["details"] is None for r in mismatches)
+
+    future = (datetime.now(UTC) + timedelta(days=1)).isoformat()
+    assert await db.list_validation_runs(10, since=future) == []
+    assert len(await db.list_validation_runs(10, until=future)) == 5
+
+
 async def test_validation_polling_config_roundtrip(isolated_db_path):
     await db.init_db()
 
@@ -72,3 +93,75 @@ async def test_validation_polling_config_roundtrip(isolated_db_path):
 
     loaded = await db.get_validation_polling_config()
     assert loaded == {"enabled": False, "interval_minutes": 7}
+
+
+async def test_devices_and_per_device_targets(isolated_db_path):
+    await db.init_db()
+    device = await db.create_device("frag-tank", "10.0.2.117", 80, "R5S2A000189")
+    assert [d["name"] for d in await db.list_devices()] == ["frag-tank"]
+
+    await db.upsert_active_target("manual", {"ch1": 1, "ch2": 2, "ch3": 3, "ch4": 4}, None)
+    await db.upsert_active_target("auto", None, {"points": []}, device=device["id"])
+    default_target = await db.get_active_target()
+    device_target = await db.get_active_target(device["id"])
+    assert default_target is not None and default_target["mode"] == "manual"
+    assert device_target is not None and device_target["program"] == {"points": []}
+
+    assert await db.delete_device(device["id"])
+    assert await db.get_active_target(device["id"]) is None
+    assert await db.list_devices() == []
+
+
+async def test_shared_connections_use_wal_and_survive_many_calls(isolated_db_path):
+    await db.init_db()
+    async with db._reading() as conn:
+        cur = await conn.execute("PRAGMA journal_mode")
+        assert (await cur.fetchone())[0] == "wal"
+
+    for i in range(20):
+        await db.set_validation_polling_config(i % 2 == 0, i + 1)
+    writer = db._pool.writer
+    assert await db.get_validation_polling_config() == {"enabled": False, "interval_minutes": 20}
+    assert db._pool.writer is writer
+
+    await db.close_db()
+    assert db._pool.writer is None
+    assert await db.latest_validation_run() is None  # reopens on demand
+
+
+async def test_validation_payloads_are_deduplicated_and_history_compacted(isolated_db_path):
+    await db.init_db()
+    statuses = ["ok", "ok", "ok", "mismatch", "mismatch", "ok", "ok", "ok"]
+    for status in statuses:
+        await db.insert_validation_run(status, {"status": status})
+
+    base = (datetime.now(UTC) - timedelta(hours=48)).replace(minute=5, second=0, microsecond=0)
+    async with db._writing() as conn:
+        cur = await conn.execute("SELECT COUNT(*) FROM validation_payloads")
+        assert (await cur.fetchone())[0] == 2
+        # Backdate all but the newest run; the first one falls outside retention.
+        for i in range(1, len(statuses)):
+            await conn.execute(
+                "UPDATE validation_runs SET checked_at = ? WHERE id = ?",
+                ((base + timedelta(minutes=i)).isoformat(), i),
+            )
+        await conn.execute(
+            "UPDATE validation_runs SET checked_at = ? WHERE id = 1",
+            ((base - timedelta(days=100)).isoformat(),),
+        )
+
+    removed = await db.compact_validation_runs(
+        max_age_days=90, max_rows=1000, downsample_after_hours=24, sample_interval_minutes=60
+    )
+    assert removed["expired"] == 1
+    async with db._reading() as conn:
+        cur = await conn.execute("SELECT id, status FROM validation_runs ORDER BY id")
+        kept = [tuple(row) for row in await cur.fetchall()]
+    # Status transitions, the first run of the hour and the recent run survive.
+    assert kept == [(2, "ok"), (4, "mismatch"), (6, "ok"), (8, "ok")]
+
+    removed = await db.compact_validation_runs(max_rows=1)
+    assert removed["trimmed"] == 3
+    assert removed["payloads"] == 1
+    latest = await db.latest_validation_run()
+    assert latest is not None and latest["id"] == 8 and latest["details"] == {"status": "ok"}
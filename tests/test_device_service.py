@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app import db
+from app.errors import DeviceCommunicationError
+from app.models import Intensity, Program, ProgramPoint
+from app.services.device_service import DeviceService
+
+
+class CountingClient:
+    pipelined = False
+
+    def __init__(self) -> None:
+        self.mode = "manual"
+        self.intensity = Intensity(ch1=1, ch2=2, ch3=3, ch4=4)
+        self.program = Program(points=[])
+        self.queries = 0
+        self.uploads = 0
+        self.program_ack = 1
+        self.writes: list[tuple[str, object]] = []
+
+    async def query_mode(self) -> str:
+        self.queries += 1
+        await asyncio.sleep(0.01)
+        return self.mode
+
+    async def query_intensity(self) -> Intensity:
+        return self.intensity
+
+    async def query_program(self) -> Program:
+        return self.program
+
+    async def set_mode(self, mode: str) -> None:
+        self.writes.append(("mode", mode))
+        self.mode = mode
+
+    async def set_intensity(self, intensity: Intensity) -> None:
+        self.writes.append(("intensity", intensity))
+        self.intensity = intensity
+
+    async def set_program(self, program: Program) -> int:
+        self.uploads += 1
+        await asyncio.sleep(0.01)
+        self.writes.append(("program", program))
+        self.program = program
+        return self.program_ack
+
+
+async def test_concurrent_reads_share_one_fetch_and_cache_honours_max_age():
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=60)
+
+    states = await asyncio.gather(*(service.get_state() for _ in range(5)))
+    assert client.queries == 1
+    assert all(s.mode == "manual" for s in states)
+
+    await service.get_state()
+    assert client.queries == 1
+
+    await service.get_state(max_age=0)
+    assert client.queries == 2
+
+
+async def test_writes_update_or_invalidate_cached_state(isolated_db_path):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=60)
+    await service.get_state()
+
+    await service.set_manual_intensity(Intensity(ch1=9, ch2=9, ch3=9, ch4=9))
+    cached = await service.get_state()
+    assert client.queries == 1
+    assert cached.intensity is not None and cached.intensity.ch1 == 9
+
+    await service.set_mode("auto")
+    refreshed = await service.get_state()
+    assert client.queries == 2
+    assert refreshed.mode == "auto"
+
+
+async def test_sync_mode_skips_uploads_the_device_already_has(isolated_db_path):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, sync_programs=True)
+    program = Program(
+        points=[ProgramPoint(index=1, hour=8, minute=0, ch1=10, ch2=20, ch3=30, ch4=40)]
+    )
+
+    acks = await asyncio.gather(*(service.set_program(program) for _ in range(5)))
+    assert client.uploads == 1
+    assert sorted(acks, key=str) == [1, None, None, None, None]
+    assert service.skipped_program_uploads == 4
+
+    # The device was re-flashed behind our back: a fresh read reveals it and sync re-uploads.
+    client.program = Program(points=[])
+    client.mode = "auto"
+    await service.get_state(max_age=0)
+    await service.set_program(program)
+    assert client.uploads == 2
+
+    # Without sync every apply is written.
+    assert await service.set_program(program, sync=False) == 1
+    assert client.uploads == 3
+
+
+async def test_sync_mode_reuploads_after_out_of_band_drift(isolated_db_path):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=0.05, sync_programs=True)
+    program = Program(
+        points=[ProgramPoint(index=1, hour=8, minute=0, ch1=10, ch2=20, ch3=30, ch4=40)]
+    )
+    assert await service.set_program(program) == 1
+    assert await service.set_program(program) is None
+
+    # Another app replaces the program; once the remembered digest expires it is re-read.
+    client.program = Program(points=[])
+    await asyncio.sleep(0.06)
+    assert await service.set_program(program) == 1
+    assert client.program == program
+    assert client.uploads == 2
+
+    # Drift reported by the validator takes effect immediately.
+    client.program = Program(points=[])
+    service.observed_program(client.program)
+    assert await service.set_program(program) == 1
+    assert client.uploads == 3
+
+
+async def test_batch_persists_once_and_rolls_back_on_a_rejected_step(isolated_db_path, monkeypatch):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=60)
+    upserts = []
+    real_upsert = db.upsert_active_target
+
+    async def counting_upsert(*args, **kwargs):
+        upserts.append(args)
+        await real_upsert(*args, **kwargs)
+
+    monkeypatch.setattr(db, "upsert_active_target", counting_upsert)
+    dim = Intensity(ch1=5, ch2=5, ch3=5, ch4=5)
+
+    state = await service.apply_batch("manual", intensity=dim)
+    assert state.intensity == dim
+    assert [name for name, _ in client.writes] == ["mode", "intensity"]
+    assert len(upserts) == 1
+
+    client.writes.clear()
+    client.program_ack = 0
+    program = Program(points=[ProgramPoint(index=1, hour=9, minute=0, ch1=1, ch2=1, ch3=1, ch4=1)])
+    with pytest.raises(DeviceCommunicationError, match="rolled back"):
+        await service.apply_batch("auto", program=program)
+
+    assert [name for name, _ in client.writes] == ["mode", "program", "mode", "intensity"]
+    assert client.writes[-2:] == [("mode", "manual"), ("intensity", dim)]
+    assert len(upserts) == 1
+
+
+async def test_sync_mode_dedupes_batch_program_uploads(isolated_db_path):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=60, sync_programs=True)
+    preset = {
+        "mode": "auto",
+        "program": {
+            "points": [{"index": 1, "hour": 8, "minute": 0, "ch1": 1, "ch2": 2, "ch3": 3, "ch4": 4}]
+        },
+    }
+
+    await asyncio.gather(*(service.apply_preset(preset) for _ in range(3)))
+    assert client.uploads == 1
+    assert service.skipped_program_uploads == 2
+    assert [name for name, _ in client.writes] == ["mode", "program", "mode", "mode"]
+
+
+async def test_batch_rollback_does_not_use_expired_cached_state(isolated_db_path):
+    await db.init_db()
+    client = CountingClient()
+    service = DeviceService(client, state_ttl=0.05)
+    await service.get_state()
+
+    # Changed behind the service's back after the cached read expired.
+    bright = Intensity(ch1=90, ch2=90, ch3=90, ch4=90)
+    client.intensity = bright
+    await asyncio.sleep(0.06)
+
+    client.program_ack = 0
+    program = Program(points=[ProgramPoint(index=1, hour=9, minute=0, ch1=1, ch2=1, ch3=1, ch4=1)])
+    with pytest.raises(DeviceCommunicationError, match="rolled back"):
+        await service.apply_batch("auto", program=program)
+    assert client.writes[-2:] == [("mode", "manual"), ("intensity", bright)]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from app.services.frame_decoder import FrameDecoder, KeepaliveFrame, ParsedFrame
+from app.services.icv6_client import ICV6Client
+
+KEEPALIVE = bytes.fromhex("ffeeddcc0300010102")
+
+
+def _frame(cmd_id: int, args: bytes = b"") -> bytes:
+    return ICV6Client("127.0.0.1", 80, "R5S2A000188")._build_frame(0x5F, cmd_id, args)
+
+
+def test_decoder_handles_byte_by_byte_stream_with_keepalives():
+    stream = KEEPALIVE + _frame(0x01, b"\x01") + KEEPALIVE + _frame(0x0D, bytes([1, 2, 3, 4]))
+    decoder = FrameDecoder(include_keepalive=True)
+
+    out = []
+    for i in range(len(stream)):
+        out.extend(decoder.feed(stream[i : i + 1]))
+
+    assert [type(f) for f in out] == [KeepaliveFrame, ParsedFrame, KeepaliveFrame, ParsedFrame]
+    assert out[3].args == bytes([1, 2, 3, 4])
+    assert decoder.stats.frames == 2
+    assert decoder.stats.keepalives == 2
+    assert decoder.buffered == 0
+
+
+def test_decoder_resyncs_after_bad_checksum_and_garbage():
+    good = _frame(0x01, b"\x02")
+    corrupt = bytearray(_frame(0x0F, b"\x00"))
+    corrupt[-1] ^= 0xFF
+    decoder = FrameDecoder()
+
+    out = decoder.feed(b"\x00\x13garbage" + bytes(corrupt) + b"\xdd\xee" + good)
+
+    assert [(f.cmd_group, f.cmd_id) for f in out if isinstance(f, ParsedFrame)] == [(0x5F, 0x01)]
+    assert decoder.stats.bad_checksums == 1
+    assert decoder.stats.discarded_bytes > 0
+
+
+def test_decoder_flush_recovers_frame_hidden_behind_truncated_candidate():
+    good = _frame(0x01, b"\x01")
+    decoder = FrameDecoder()
+
+    # A fake header claiming a long frame swallows the real one until end of stream.
+    assert decoder.feed(bytes.fromhex("ddeeff00ff") + good) == []
+    flushed = decoder.flush()
+
+    assert [f.cmd_id for f in flushed if isinstance(f, ParsedFrame)] == [0x01]
+    assert decoder.buffered == 0
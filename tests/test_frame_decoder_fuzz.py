@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+import random
+
+import pytest
+from frame_streams import (
+    DEVICE_IDS,
+    clean_stream,
+    hostile_stream,
+    random_chunks,
+    random_frame,
+    reference_decode,
+)
+
+from app.services.frame_decoder import FrameDecoder, build_frame
+from app.services.icv6_client import ICV6Client
+
+
+def _decode(chunks: list[bytes]) -> list[bytes]:
+    decoder = FrameDecoder(include_keepalive=True)
+    out = []
+    for chunk in chunks:
+        out.extend(decoder.feed(chunk))
+    out.extend(decoder.flush())
+    assert decoder.buffered == 0
+    return [frame.raw for frame in out]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_decoder_recovers_every_valid_frame_from_noisy_split_stream(seed: int):
+    rng = random.Random(seed)
+    stream, expected = clean_stream(rng, elements=60)
+
+    assert _decode(random_chunks(rng, stream)) == expected
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_decoder_matches_reference_on_hostile_stream_however_split(seed: int):
+    rng = random.Random(1000 + seed)
+    stream = hostile_stream(rng, elements=60)
+    expected = [frame.raw for frame in reference_decode(stream)]
+
+    assert _decode([stream]) == expected
+    assert _decode(random_chunks(rng, stream)) == expected
+    assert _decode([stream[i : i + 1] for i in range(len(stream))]) == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+async def test_read_expected_finds_reply_among_unsolicited_frames(seed: int):
+    rng = random.Random(2000 + seed)
+    noise, _ = clean_stream(rng, elements=30)
+    reply = build_frame(DEVICE_IDS[0], 0x5F, 0x01, b"\x02")
+    # Unsolicited frames before the reply must not be mistaken for it.
+    unsolicited = b"".join(random_frame(rng) for _ in range(5)).replace(reply, b"")
+    reader = asyncio.StreamReader()
+    for chunk in random_chunks(rng, noise + unsolicited + reply + noise):
+        reader.feed_data(chunk)
+    reader.feed_eof()
+    client = ICV6Client("127.0.0.1", 80, DEVICE_IDS[0])
+
+    parsed = await client._read_expected(reader, 0x5F, 0x01)
+
+    assert parsed.raw == reply
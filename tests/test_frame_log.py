@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+from app.replay import logged_requests, logged_unsolicited, replay, summarize
+from app.services.frame_decoder import build_frame, parse_dd_frame
+from app.services.frame_log import (
+    RECEIVED,
+    SENT,
+    TIMED_OUT,
+    UNSOLICITED,
+    FrameLog,
+    frame_log_files,
+    read_frame_log,
+    read_frame_logs,
+)
+from app.services.icv6_client import ICV6Client
+from app.simulator import ICV6Simulator, SimulatorConfig
+
+DEVICE_ID = "R5S2A000188"
+QUERY_MODE = build_frame(DEVICE_ID, 0x0F, 0x01, b"")
+REPORT_MODE = parse_dd_frame(build_frame(DEVICE_ID, 0x5F, 0x01, b"\x02"))
+
+
+def test_frame_log_rotates_by_size_and_reads_oldest_first(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path, max_bytes=1024, backups=2)
+    ids = []
+    for _ in range(60):
+        ids.append(log.sent(QUERY_MODE))
+        log.received(ids[-1], REPORT_MODE)
+    log.close()
+
+    files = frame_log_files(path)
+    assert [f.name for f in files] == ["frames.log.2", "frames.log.1", "frames.log"]
+    assert all(f.stat().st_size <= 1024 for f in files)
+    records = list(read_frame_logs(path))
+    # Older files rotated away; what is left is contiguous and ends with the last write.
+    assert [r.request_id for r in records[-2:]] == [ids[-1], ids[-1]]
+    assert [r.kind for r in records[-2:]] == [SENT, RECEIVED]
+    assert records[-1].raw == REPORT_MODE.raw
+    assert all(a.timestamp <= b.timestamp for a, b in zip(records, records[1:], strict=False))
+
+
+def test_frame_log_drops_torn_record_when_reopened(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path)
+    log.sent(QUERY_MODE)
+    log.close()
+    with path.open("ab") as f:
+        f.write(b"\x01\x02\x03")  # crash mid-record
+
+    log = FrameLog(path)
+    request_id = log.sent(QUERY_MODE)
+    log.close()
+
+    records = list(read_frame_log(path))
+    assert len(records) == 2
+    assert records[-1].request_id == request_id
+
+
+async def test_client_tap_records_round_trips_and_timeouts(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path)
+    async with ICV6Simulator(config=SimulatorConfig(rtt=0.01)) as simulator:
+        client = ICV6Client("127.0.0.1", simulator.port, DEVICE_ID, timeout=0.2, frame_log=log)
+        assert await client.query_mode() == "manual"
+        simulator.config.drop_rate = 1.0
+        try:
+            await client.query_mode()
+        except TimeoutError:
+            pass
+    log.close()
+
+    requests = logged_requests(path)
+    assert [r.outcome for r in requests] == ["ok", "timeout"]
+    assert requests[0].latency is not None and requests[0].latency >= 0.01
+    assert [r.kind for r in read_frame_log(path)] == [SENT, RECEIVED, SENT, TIMED_OUT]
+
+
+async def test_replay_reproduces_recorded_latency_and_timeouts(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path)
+    for cmd_id, timed_out in ((0x01, False), (0x0D, True), (0x0F, False)):
+        request_id = log.sent(build_frame(DEVICE_ID, 0x0F, cmd_id, b""))
+        if timed_out:
+            log.failed(request_id, timed_out=True)
+        else:
+            log.received(request_id, REPORT_MODE)
+    log.close()
+    requests = logged_requests(path)
+    requests[0].latency = 0.05  # the writes above were instant; pretend the lamp was slow
+
+    results = await replay(requests, speed=0, timeout=0.2)
+
+    assert [r.name for r in results] == ["query_mode", "query_intensity", "query_program"]
+    assert [r.replayed_outcome for r in results] == ["ok", "timeout", "ok"]
+    assert results[0].replayed_ms is not None and results[0].replayed_ms >= 50
+    summary = summarize(results)
+    assert summary["replayed"]["outcomes"] == {"ok": 2, "timeout": 1}
+
+
+async def test_replay_to_a_real_device_resends_writes_only_when_allowed(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path)
+    for cmd_id, args in ((0x02, b"\x01"), (0x01, b"")):  # set_mode, query_mode
+        log.received(log.sent(build_frame(DEVICE_ID, 0x0F, cmd_id, args)), REPORT_MODE)
+    log.close()
+    requests = logged_requests(path)
+
+    async with ICV6Simulator([DEVICE_ID]) as lamp:
+        safe = await replay(requests, speed=0, host="127.0.0.1", port=lamp.port)
+        both = await replay(requests, speed=0, host="127.0.0.1", port=lamp.port, allow_writes=True)
+    assert [r.name for r in safe] == ["query_mode"]
+    assert [r.name for r in both] == ["set_mode", "query_mode"]
+
+
+async def test_session_tap_records_unsolicited_frames_for_replay(tmp_path: Path):
+    path = tmp_path / "frames.log"
+    log = FrameLog(path)
+    status = build_frame(DEVICE_ID, 0x55, 0x01, b"\x01")
+    async with ICV6Simulator() as simulator:
+        client = ICV6Client(
+            "127.0.0.1", simulator.port, DEVICE_ID, persistent=True, idle_timeout=0, frame_log=log
+        )
+        assert await client.query_mode() == "manual"
+        assert simulator.push(status) == 1
+        await asyncio.sleep(0.05)
+        await client.close()
+    log.close()
+
+    assert [r.kind for r in read_frame_log(path)] == [SENT, RECEIVED, UNSOLICITED]
+    unsolicited = logged_unsolicited(path)
+    assert [frame.raw for _, frame in unsolicited] == [status]
+    requests = logged_requests(path)
+    assert [r.outcome for r in requests] == ["ok"]
+
+    results = await replay(requests, speed=0, timeout=0.2, unsolicited=unsolicited)
+    assert [r.replayed_outcome for r in results] == ["ok"]
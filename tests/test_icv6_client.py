@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+
 import pytest
 
 from app.models import Program, ProgramPoint
-from app.services.icv6_client import ICV6Client, ParsedFrame
+from app.services import icv6_client
+from app.services.icv6_client import ICV6Client, ICV6Session, ICV6SessionPool, ParsedFrame
 
 
 def test_build_and_parse_frame_roundtrip():
@@ -59,3 +62,187 @@ async def test_query_mode_manual_and_auto(monkeypatch: pytest.MonkeyPatch):
 
     monkeypatch.setattr(client, "_request", fake_request_auto)
     assert await client.query_mode() == "auto"
+
+
+class _FakeDevice:
+    """Minimal ICV6 stand-in answering query_mode with a keepalive + report_mode."""
+
+    def __init__(self, close_after_reply: bool = False) -> None:
+        self.connections = 0
+        self.close_after_reply = close_after_reply
+        self._codec = ICV6Client("127.0.0.1", 0, "R5S2A000188")
+
+    async def handle(self, reader, writer) -> None:
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readexactly(5)
+                rest = await reader.readexactly(header[4])
+                request = self._codec._parse_dd_frame(header + rest)
+                reply = self._codec._build_frame(request.cmd_group + 0x50, request.cmd_id, b"\x02")
+                writer.write(bytes.fromhex("ffeeddcc0000000000") + reply)
+                await writer.drain()
+                if self.close_after_reply:
+                    break
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve(device: _FakeDevice):
+    server = await asyncio.start_server(device.handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def test_persistent_session_reuses_one_connection():
+    device = _FakeDevice()
+    server, port = await _serve(device)
+    client = ICV6Client("127.0.0.1", port, "R5S2A000188", persistent=True)
+    try:
+        for _ in range(3):
+            assert await client.query_mode() == "auto"
+        assert device.connections == 1
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def test_persistent_session_reconnects_after_eof():
+    device = _FakeDevice(close_after_reply=True)
+    server, port = await _serve(device)
+    client = ICV6Client("127.0.0.1", port, "R5S2A000188", persistent=True)
+    try:
+        assert await client.query_mode() == "auto"
+        await asyncio.sleep(0.05)
+        assert await client.query_mode() == "auto"
+        assert device.connections == 2
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def test_persistent_session_closes_when_idle():
+    device = _FakeDevice()
+    server, port = await _serve(device)
+    client = ICV6Client("127.0.0.1", port, "R5S2A000188", persistent=True, idle_timeout=0.05)
+    try:
+        assert await client.query_mode() == "auto"
+        assert client._session is not None and client._session.connected
+        await asyncio.sleep(0.15)
+        assert not client._session.connected
+        idle_close = client._session._idle_close_task
+        assert idle_close is not None and idle_close.done() and idle_close.exception() is None
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def test_pipelined_requests_are_demultiplexed_and_unsolicited_frames_published():
+    codec = ICV6Client("127.0.0.1", 0, "R5S2A000188")
+    connections = 0
+
+    async def handle(reader, writer):
+        nonlocal connections
+        connections += 1
+        requests = []
+        for _ in range(3):
+            header = await reader.readexactly(5)
+            requests.append(codec._parse_dd_frame(header + await reader.readexactly(header[4])))
+        # Answer out of order, with an unsolicited status frame mixed in.
+        writer.write(codec._build_frame(0x55, 0x01, b"\x01"))
+        for req in reversed(requests):
+            args = {0x01: b"\x01", 0x0D: bytes([1, 2, 3, 4]), 0x0F: b"\x00"}[req.cmd_id]
+            writer.write(codec._build_frame(0x5F, req.cmd_id, args))
+        await writer.drain()
+        await reader.read()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = ICV6Client("127.0.0.1", port, "R5S2A000188", persistent=True)
+    unsolicited: list[ParsedFrame] = []
+    client.subscribe(unsolicited.append)
+    try:
+        mode, intensity, program = await asyncio.gather(
+            client.query_mode(), client.query_intensity(), client.query_program()
+        )
+        assert mode == "manual"
+        assert intensity.ch4 == 4
+        assert program.points == []
+        assert connections == 1
+        assert [(f.cmd_group, f.cmd_id) for f in unsolicited] == [(0x55, 0x01)]
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def test_devices_behind_one_icv6_share_a_session_and_route_by_device_id():
+    connections = 0
+
+    async def handle(reader, writer):
+        nonlocal connections
+        connections += 1
+        try:
+            while True:
+                header = await reader.readexactly(5)
+                raw = header + await reader.readexactly(header[4])
+                req = ICV6Client("127.0.0.1", 0, raw[6:17].decode())._parse_dd_frame(raw)
+                if req.device_id == "G2C2A000180":
+                    continue  # this device never answers
+                codec = ICV6Client("127.0.0.1", 0, req.device_id)
+                mode = b"\x01" if req.device_id == "R5S2A000188" else b"\x02"
+                writer.write(codec._build_frame(0x5F, req.cmd_id, mode))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    pool = ICV6SessionPool(timeout=0.2)
+    light = ICV6Client("127.0.0.1", port, "R5S2A000188", session=pool.get("127.0.0.1", port))
+    other = ICV6Client("127.0.0.1", port, "R5S2A000189", session=pool.get("127.0.0.1", port))
+    silent = ICV6Client("127.0.0.1", port, "G2C2A000180", session=pool.get("127.0.0.1", port))
+    try:
+        results = await asyncio.gather(
+            light.query_mode(), other.query_mode(), silent.query_mode(), return_exceptions=True
+        )
+        assert results[0] == "manual"
+        assert results[1] == "auto"
+        assert isinstance(results[2], TimeoutError)
+        assert await light.query_mode() == "manual"
+        assert connections == 1
+    finally:
+        await pool.close()
+        server.close()
+        await server.wait_closed()
+
+
+async def test_concurrent_requests_share_one_failing_connect(monkeypatch: pytest.MonkeyPatch):
+    attempts = 0
+
+    async def unreachable(host, port):
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(icv6_client.asyncio, "open_connection", unreachable)
+    session = ICV6Session("127.0.0.1", 9, timeout=0.1, idle_timeout=0)
+    client = ICV6Client("127.0.0.1", 9, "R5S2A000188", session=session)
+
+    started = asyncio.get_running_loop().time()
+    results = await asyncio.gather(
+        client.query_mode(),
+        client.query_intensity(),
+        client.query_program(),
+        return_exceptions=True,
+    )
+    elapsed = asyncio.get_running_loop().time() - started
+    assert all(isinstance(r, TimeoutError) for r in results)
+    assert attempts == 1
+    assert elapsed < 0.25
+    await session.close()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from app import db
+from app.metrics import DB_QUERY_SECONDS, MetricsRegistry
+from app.tracing import end_trace, start_trace
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Demo requests.", ("status",))
+    latency = registry.histogram("demo_seconds", "Demo latency.", buckets=(0.1, 1.0))
+    registry.add_collector(lambda: [("demo_up", "gauge", "Demo liveness.", [({}, 1.0)])])
+
+    requests.inc("ok")
+    requests.inc("ok")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3.0)
+
+    text = registry.render()
+    assert '# TYPE demo_requests_total counter\ndemo_requests_total{status="ok"} 2\n' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'demo_seconds_bucket{le="1.0"} 2\n' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3\n' in text
+    assert "demo_seconds_sum 3.55\ndemo_seconds_count 3\n" in text
+    assert text.endswith("# TYPE demo_up gauge\ndemo_up 1\n")
+
+
+async def test_db_functions_are_timed(isolated_db_path):
+    await db.init_db()
+    before = DB_QUERY_SECONDS.count("get_active_target")
+    await db.get_active_target()
+    assert DB_QUERY_SECONDS.count("get_active_target") == before + 1
+
+
+async def test_nested_db_calls_are_timed_once(isolated_db_path):
+    await db.init_db()
+    inner = DB_QUERY_SECONDS.count("get_settings") + DB_QUERY_SECONDS.count("set_settings")
+    trace, token = start_trace()
+    try:
+        await db.set_validation_polling_config(True, 5)
+        await db.get_validation_polling_config()
+    finally:
+        end_trace(token)
+    assert trace.db_calls == 2
+    assert DB_QUERY_SECONDS.count("get_settings") + DB_QUERY_SECONDS.count("set_settings") == inner
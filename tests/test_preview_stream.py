@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.models import Intensity
+from app.services.preview_stream import PreviewStreamer
+
+
+class RecordingClient:
+    def __init__(self) -> None:
+        self.sent: list[Intensity] = []
+
+    async def set_preview_intensity(self, intensity: Intensity) -> None:
+        self.sent.append(intensity)
+
+
+async def test_preview_keeps_latest_value_and_limits_rate():
+    client = RecordingClient()
+    streamer = PreviewStreamer(client, max_rate=20)  # type: ignore[arg-type]
+
+    for v in range(50):
+        streamer.submit(Intensity(ch1=v, ch2=0, ch3=0, ch4=0))
+        if v == 0:
+            await asyncio.sleep(0)
+    await asyncio.sleep(0.15)
+    await streamer.stop()
+
+    assert [i.ch1 for i in client.sent] == [0, 49]
+    assert streamer.sent == 2
+    assert streamer.dropped == 48
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import pytest
+
+from app.models import Intensity, Program, ProgramPoint
+from app.services.program_analytics import (
+    intensity_analytics,
+    program_analytics,
+    target_analytics,
+)
+
+
+def _point(index: int, hour: int, level: int) -> ProgramPoint:
+    return ProgramPoint(index=index, hour=hour, minute=0, ch1=level, ch2=0, ch3=0, ch4=0)
+
+
+def test_program_analytics_integrates_the_interpolated_day():
+    # 0 at 06:00, up to 100 at 08:00, held until 18:00, down to 0 at 20:00, dark overnight.
+    program = Program(
+        points=[_point(1, 6, 0), _point(2, 8, 100), _point(3, 18, 100), _point(4, 20, 0)]
+    )
+
+    result = program_analytics(program)
+    ch1 = result["channels"]["ch1"]
+    assert ch1["daily_dose_percent_hours"] == pytest.approx(100 * 10 + 2 * 100, rel=1e-3)
+    assert ch1["peak_percent"] == 100
+    assert ch1["photoperiod_minutes"] == 14 * 60 - 1
+    assert ch1["max_ramp_up_percent_per_hour"] == pytest.approx(50)
+    assert ch1["max_ramp_down_percent_per_hour"] == pytest.approx(50)
+    assert result["channels"]["ch2"]["daily_dose_percent_hours"] == 0
+
+    assert program_analytics(program.model_copy(deep=True)) is result
+
+
+def test_manual_and_stored_targets_use_a_flat_curve():
+    flat = intensity_analytics(Intensity(ch1=50, ch2=0, ch3=0, ch4=100))
+    assert flat["channels"]["ch1"]["daily_dose_percent_hours"] == pytest.approx(1200)
+    assert flat["channels"]["ch4"]["photoperiod_minutes"] == 1440
+    assert flat["channels"]["ch1"]["max_ramp_up_percent_per_hour"] == 0
+
+    assert target_analytics("manual", {"ch1": 50, "ch2": 0, "ch3": 0, "ch4": 100}, None) == flat
+    assert target_analytics("auto", None, None) is None
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from datetime import time
+
+import pytest
+
+from app.models import Program, ProgramPoint
+from app.services.program_curve import program_digest, sample_day, value_at
+
+
+def _point(index: int, hour: int, minute: int, level: int) -> ProgramPoint:
+    return ProgramPoint(index=index, hour=hour, minute=minute, ch1=level, ch2=level, ch3=0, ch4=100)
+
+
+def test_value_at_interpolates_and_wraps_past_midnight():
+    program = Program(points=[_point(1, 8, 0, 0), _point(2, 12, 0, 100), _point(3, 20, 0, 40)])
+
+    assert value_at(program, time(10, 0))["ch1"] == pytest.approx(50)
+    assert value_at(program, 12 * 60)["ch2"] == pytest.approx(100)
+    # 20:00 (40) ramps to 08:00 the next day (0) across midnight: 12h span, 4h in.
+    assert value_at(program, time(0, 0))["ch1"] == pytest.approx(40 - 40 * 4 / 12)
+    assert value_at(program, time(6, 0))["ch4"] == pytest.approx(100)
+    assert value_at(Program(points=[]), 0) == {"ch1": 0, "ch2": 0, "ch3": 0, "ch4": 0}
+
+
+def test_sample_day_matches_single_lookups_and_is_cached_per_content():
+    program = Program(points=[_point(1, 20, 0, 40), _point(2, 8, 0, 0), _point(3, 12, 0, 100)])
+    reordered = Program(points=[_point(7, 8, 0, 0), _point(8, 12, 0, 100), _point(9, 20, 0, 40)])
+
+    curve = sample_day(program, 7)
+    assert curve.minutes[0] == 0 and curve.minutes[-1] < 1440
+    for minute, level in zip(curve.minutes, curve.values["ch1"], strict=True):
+        assert level == pytest.approx(value_at(program, minute)["ch1"])
+
+    assert program_digest(program) == program_digest(reordered)
+    assert sample_day(reordered, 7) is curve
+    with pytest.raises(ValueError):
+        sample_day(program, 0)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.models import Intensity, Program, ProgramPoint
+from app.services.icv6_client import ICV6Client, ICV6SessionPool
+from app.simulator import ICV6Simulator, SimulatorConfig
+
+DEVICE_ID = "R5S2A000188"
+
+
+@pytest.mark.parametrize(
+    "icv6_simulator",
+    [SimulatorConfig(rtt=0.01, jitter=0.005, fragment_size=3, keepalive_interval=0.01, seed=1)],
+    indirect=True,
+)
+async def test_client_round_trips_through_fragmented_replies(icv6_simulator: ICV6Simulator):
+    client = ICV6Client("127.0.0.1", icv6_simulator.port, DEVICE_ID, persistent=True)
+    program = Program(
+        points=[
+            ProgramPoint(index=1, hour=8, minute=0, ch1=0, ch2=0, ch3=0, ch4=0),
+            ProgramPoint(index=2, hour=12, minute=30, ch1=80, ch2=60, ch3=40, ch4=20),
+        ]
+    )
+    try:
+        await client.set_mode("auto")
+        assert await client.set_program(program) == 0x01
+        await client.set_intensity(Intensity(ch1=10, ch2=20, ch3=30, ch4=40))
+        await asyncio.sleep(0.03)  # let a few keepalives interleave with the next replies
+
+        mode, intensity, stored = await asyncio.gather(
+            client.query_mode(), client.query_intensity(), client.query_program()
+        )
+    finally:
+        await client.close()
+
+    assert mode == "auto"
+    assert intensity == Intensity(ch1=10, ch2=20, ch3=30, ch4=40)
+    assert [(p.hour, p.minute, p.ch1) for p in stored.points] == [(8, 0, 0), (12, 30, 80)]
+    assert icv6_simulator.stats.keepalives_sent > 0
+
+
+async def test_devices_behind_one_controller_keep_separate_state():
+    second = "R5S2A000189"
+    async with ICV6Simulator((DEVICE_ID, second)) as simulator:
+        pool = ICV6SessionPool(timeout=1.0)
+        session = pool.get("127.0.0.1", simulator.port)
+        first_client = ICV6Client("127.0.0.1", simulator.port, DEVICE_ID, session=session)
+        second_client = ICV6Client("127.0.0.1", simulator.port, second, session=session)
+        try:
+            await asyncio.gather(first_client.set_mode("auto"), second_client.set_mode("manual"))
+            modes = await asyncio.gather(first_client.query_mode(), second_client.query_mode())
+        finally:
+            await pool.close()
+
+    assert modes == ["auto", "manual"]
+    assert simulator.stats.connections == 1
+
+
+async def test_dropped_replies_time_out():
+    async with ICV6Simulator(config=SimulatorConfig(drop_rate=1.0)) as simulator:
+        client = ICV6Client("127.0.0.1", simulator.port, DEVICE_ID, timeout=0.1)
+        with pytest.raises(TimeoutError):
+            await client.query_mode()
+
+    assert simulator.stats.dropped == 1
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+
+from app import db
+from app.models import DeviceState, Intensity
+from app.services.state_stream import StateBroadcaster
+
+
+class FakeDeviceService:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.state = DeviceState(mode="manual", intensity=Intensity(ch1=1, ch2=2, ch3=3, ch4=4))
+
+    async def get_state(self, max_age: float | None = None) -> DeviceState:
+        self.calls += 1
+        return self.state
+
+
+async def test_many_subscribers_share_one_poller_and_only_see_changes(isolated_db_path):
+    await db.init_db()
+    device = FakeDeviceService()
+    broadcaster = StateBroadcaster(device, interval=60)  # type: ignore[arg-type]
+
+    queues = [broadcaster.subscribe() for _ in range(10)]
+    first = [await asyncio.wait_for(q.get(), timeout=1) for q in queues]
+    assert device.calls == 1
+    assert all(e is not None and e["event"] == "state" for e in first)
+
+    # An unchanged poll publishes nothing; a changed one reaches every subscriber.
+    await broadcaster.poll_once()
+    assert all(q.empty() for q in queues)
+    device.state = DeviceState(mode="auto", program=None)
+    await db.insert_validation_run("ok", {"status": "ok"})
+    await broadcaster.poll_once()
+    events = [q.get_nowait() for q in queues for _ in range(2)]
+    assert {e["event"] for e in events if e is not None} == {"state", "validation"}
+
+    await broadcaster.stop()
+    assert broadcaster.subscriber_count == 0
+
+
+async def test_stream_formats_events_and_ends_on_stop(isolated_db_path):
+    await db.init_db()
+    broadcaster = StateBroadcaster(FakeDeviceService(), interval=60)  # type: ignore[arg-type]
+    stream = broadcaster.stream()
+
+    chunk = await asyncio.wait_for(stream.__anext__(), timeout=1)
+    assert chunk.startswith("event: state\ndata: {")
+    assert chunk.endswith("\n\n")
+
+    await broadcaster.stop()
+    assert [c async for c in stream] == []
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import time
+
 from app import db
 from app.models import Program, ProgramPoint
+from app.services.device_service import DeviceService
 from app.services.validator import ProgramValidator
 
 
@@ -9,13 +13,23 @@ class FakeClient:
     def __init__(self, mode: str, program: Program):
         self._mode = mode
         self._program = program
+        self.mode_queries = 0
+        self.uploads: list[Program] = []
+        self.reject_uploads = False
 
     async def query_mode(self) -> str:
+        self.mode_queries += 1
         return self._mode
 
     async def query_program(self) -> Program:
         return self._program
 
+    async def set_program(self, program: Program) -> int:
+        self.uploads.append(program)
+        if not self.reject_uploads:
+            self._program = program
+        return 1
+
 
 async def test_validator_skips_without_target(isolated_db_path):
     await db.init_db()
@@ -66,6 +80,57 @@ async def test_validator_ok_and_mismatch(isolated_db_path):
     assert mismatch["status"] == "mismatch"
 
 
+async def test_validator_auto_heal_is_verified_and_bounded(isolated_db_path):
+    await db.init_db()
+    expected = {
+        "points": [{"index": 1, "hour": 8, "minute": 0, "ch1": 5, "ch2": 0, "ch3": 0, "ch4": 0}]
+    }
+    await db.upsert_active_target("auto", None, expected)
+    drifted = Program(points=[ProgramPoint(index=1, hour=8, minute=0, ch1=9, ch2=0, ch3=0, ch4=0)])
+    client = FakeClient("auto", drifted)
+    validator = ProgramValidator(client, auto_heal=True, heal_interval=0, heal_max_attempts=2)
+
+    healed = await validator.run_once()
+    assert healed["status"] == "mismatch"
+    assert healed["mismatched"] == [{"index": 1, "field": "ch1", "expected": 5, "reported": 9}]
+    assert healed["heal"]["status"] == "healed"
+    assert (await validator.run_once())["status"] == "ok"
+
+    client._program = drifted
+    client.reject_uploads = True
+    outcomes = [(await validator.run_once())["heal"]["status"] for _ in range(3)]
+    assert outcomes == ["failed", "failed", "gave_up"]
+    assert len(client.uploads) == 3
+
+    validator.heal_interval = 3600
+    validator._heal_attempts = 0
+    assert (await validator.run_once())["heal"]["status"] == "rate_limited"
+    assert len(client.uploads) == 3
+
+
+async def test_validator_heals_through_the_device_service(isolated_db_path):
+    await db.init_db()
+    expected = {
+        "points": [{"index": 1, "hour": 8, "minute": 0, "ch1": 5, "ch2": 0, "ch3": 0, "ch4": 0}]
+    }
+    await db.upsert_active_target("auto", None, expected)
+    client = FakeClient("auto", Program(**expected))
+    service = DeviceService(client, state_ttl=60, sync_programs=True)
+    writes = []
+    service.add_write_listener(lambda: writes.append(1))
+    validator = ProgramValidator(client, service, auto_heal=True, heal_interval=0)
+    assert (await validator.run_once())["status"] == "ok"
+
+    client._program = Program(points=[])
+    healed = await validator.run_once()
+    assert healed["heal"]["status"] == "healed"
+    assert writes == [1]
+
+    # The heal is what the service now remembers, so sync sees the device as up to date.
+    assert await service.set_program(Program(**expected)) is None
+    assert len(client.uploads) == 1
+
+
 async def test_validator_start_stop_idempotent(isolated_db_path, monkeypatch):
     await db.init_db()
     await db.set_validation_polling_config(False, 1)
@@ -78,3 +143,58 @@ async def test_validator_start_stop_idempotent(isolated_db_path, monkeypatch):
 
     await validator.stop()
     assert validator._task is None
+
+
+async def test_validator_backs_off_while_ok_and_speeds_up_after_mismatch():
+    validator = ProgramValidator(FakeClient("auto", Program(points=[])), max_interval=200, jitter=0)
+    validator.update_config({"enabled": True, "interval_minutes": 1})
+
+    delays = []
+    for status in ("ok", "ok", "error", "ok", "mismatch", "ok"):
+        started = time.monotonic()
+        validator._schedule_after(status, started)
+        delays.append(round(validator._next_run_at - started))
+    assert delays == [60, 120, 200, 200, 30, 60]
+
+
+async def test_validator_is_woken_by_config_changes_and_writes(isolated_db_path):
+    await db.init_db()
+    await db.set_validation_polling_config(False, 60)
+    await db.upsert_active_target("auto", None, {"points": []})
+    client = FakeClient("manual", Program(points=[]))
+    validator = ProgramValidator(client, fast_interval=0.05)
+    validator.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert client.mode_queries == 0
+
+        validator.update_config({"enabled": True, "interval_minutes": 60})
+        await asyncio.sleep(0.05)
+        assert client.mode_queries == 1
+
+        validator.notify_write()
+        await asyncio.sleep(0.2)
+        assert client.mode_queries == 2
+    finally:
+        await validator.stop()
+
+
+async def test_validator_compacts_history_while_polling_is_disabled(isolated_db_path, monkeypatch):
+    await db.init_db()
+    await db.set_validation_polling_config(False, 1)
+    compactions = 0
+
+    async def counting_compact():
+        nonlocal compactions
+        compactions += 1
+        return {}
+
+    monkeypatch.setattr(db, "compact_validation_runs", counting_compact)
+    client = FakeClient("auto", Program(points=[]))
+    validator = ProgramValidator(client, compaction_interval=0.02)
+
+    validator.start()
+    await asyncio.sleep(0.1)
+    await validator.stop()
+    assert compactions >= 3
+    assert client.mode_queries == 0